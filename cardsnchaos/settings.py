@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Serve static files
@@ -55,6 +56,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.RoomAffinityHeaderMiddleware',
 ]
 
 ROOT_URLCONF = 'cardsnchaos.urls'
@@ -109,6 +111,12 @@ else:
             'NAME': BASE_DIR / 'db.sqlite3',
         }
     }
+    # For load tests on SQLite: start every transaction with BEGIN IMMEDIATE
+    # (see cardsnchaos/sqlite3) and wait up to 20 s for the write lock, so
+    # concurrent game actions queue instead of failing with "database is locked"
+    if os.environ.get('SQLITE_IMMEDIATE_TRANSACTIONS', 'False') == 'True':
+        DATABASES['default']['ENGINE'] = 'cardsnchaos.sqlite3'
+        DATABASES['default']['OPTIONS'] = {'timeout': 20}
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -165,9 +173,16 @@ CORS_ALLOW_HEADERS = [
     "x-csrftoken",
     "x-requested-with",
     "x-user-id",  # Custom header for user authentication
+    "idempotency-key",  # Safe retries of game actions
     "ngrok-skip-browser-warning",  # Skip ngrok browser warning
 ]
 
+# Response headers the frontend may read
+CORS_EXPOSE_HEADERS = [
+    "idempotent-replayed",
+    "x-room-worker",
+]
+
 # CSRF Configuration - trust origins
 # IMPORTANT: Set CSRF_TRUSTED_ORIGINS environment variable to include your backend URL
 # Example: "https://your-backend.deployra.app,https://cnc-nfndkwav.deployra.app"
@@ -206,8 +221,146 @@ REST_FRAMEWORK = {
 }
 
 # Channels Configuration
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-    },
-}
+# The in-memory layer only reaches sockets in the same process. To run more
+# than one worker, set REDIS_URL (comma-separated URLs shard groups across
+# several Redis servers), or CHANNEL_HUB_HOSTS (comma-separated host:port)
+# to use the in-repo hub started with `python manage.py run_channel_hub`.
+# Groups are per room (room_<CODE>), so both spread rooms across servers.
+REDIS_URL = os.environ.get('REDIS_URL', '')
+CHANNEL_HUB_HOSTS = os.environ.get('CHANNEL_HUB_HOSTS', '')
+CHANNEL_LAYER_CAPACITY = int(os.environ.get('CHANNEL_LAYER_CAPACITY', '100'))
+
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [url.strip() for url in REDIS_URL.split(',') if url.strip()],
+                'capacity': CHANNEL_LAYER_CAPACITY,
+            },
+        },
+    }
+elif CHANNEL_HUB_HOSTS:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'core.channel_hub.HubChannelLayer',
+            'CONFIG': {
+                'hosts': [host.strip() for host in CHANNEL_HUB_HOSTS.split(',') if host.strip()],
+                'capacity': CHANNEL_LAYER_CAPACITY,
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
+
+# Room affinity: CLUSTER_WORKERS lists every worker ID and WORKER_ID names
+# this process. Rooms are consistently hashed onto workers, and with a
+# shared channel layer configured above, group traffic for rooms this worker
+# owns stays in memory. Sockets on the wrong worker still work via the
+# shared layer.
+WORKER_ID = os.environ.get('WORKER_ID', '')
+CLUSTER_WORKERS = [w.strip() for w in os.environ.get('CLUSTER_WORKERS', '').split(',') if w.strip()]
+
+if WORKER_ID and CLUSTER_WORKERS and (REDIS_URL or CHANNEL_HUB_HOSTS):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'core.affinity.AffinityChannelLayer',
+            'CONFIG': {
+                'remote': CHANNEL_LAYERS['default'],
+                'capacity': CHANNEL_LAYER_CAPACITY,
+            },
+        },
+    }
+
+# Lazy authentication: GET/HEAD/OPTIONS requests without an existing session
+# or user run unauthenticated instead of creating both rows.
+LAZY_AUTH = os.environ.get('LAZY_AUTH', 'True') == 'True'
+
+# Authentication cache: user lookups by X-User-ID / session key are kept in a
+# per-process LRU. The TTL (seconds) bounds how long another worker may use a
+# stale session mapping after a user is recovered. 0 disables the cache.
+AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', '10000'))
+AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL', '60'))
+
+# Signed user tokens: AnonymousAuthView also returns a token that clients can
+# send as "Authorization: Bearer <token>" (or ?token= on WebSockets) to
+# authenticate without session or database access. Max age is in seconds.
+AUTH_TOKENS_ENABLED = os.environ.get('AUTH_TOKENS_ENABLED', 'False') == 'True'
+AUTH_TOKEN_MAX_AGE = int(os.environ.get('AUTH_TOKEN_MAX_AGE', str(30 * 24 * 3600)))
+
+# Room broadcasts: build the room snapshot once per state change and ship it
+# through the channel layer, instead of every socket re-querying the room.
+ROOM_BROADCAST_FANOUT = os.environ.get('ROOM_BROADCAST_FANOUT', 'True') == 'True'
+
+# Merge room broadcasts fired within this many milliseconds into one update
+# (keeping the most significant action). 0 broadcasts every change at once.
+ROOM_BROADCAST_COALESCE_MS = int(os.environ.get('ROOM_BROADCAST_COALESCE_MS', '25'))
+
+# Include a short hash of the remaining decks in room state (deck contents
+# themselves are only available from the admin/debug decks endpoint)
+ROOM_STATE_DECK_HASH = os.environ.get('ROOM_STATE_DECK_HASH', 'False') == 'True'
+
+# Game state engine: 'database' applies every action directly to the DB;
+# 'memory' keeps live games in process and persists them write-behind
+# every GAME_STATE_FLUSH_INTERVAL seconds (0 writes through inline). Memory mode needs all sockets and
+# requests for a room to reach the same process.
+GAME_STATE_ENGINE = os.environ.get('GAME_STATE_ENGINE', 'database')
+GAME_STATE_FLUSH_INTERVAL = float(os.environ.get('GAME_STATE_FLUSH_INTERVAL', '0.5'))
+
+# Pack card lists are cached in process for game start. Card and pack writes
+# in this process invalidate them at once; other processes reload after this
+# many seconds.
+CARD_CATALOG_TTL = int(os.environ.get('CARD_CATALOG_TTL', '300'))
+
+# Expire rounds from an asyncio timer in the ASGI process instead of relying
+# on clients to call the /timeout/ endpoint. The timer starts with the
+# worker's first room WebSocket; until then /timeout/ handles expiry itself.
+ROUND_TIMER_ENABLED = os.environ.get('ROUND_TIMER_ENABLED', 'True') == 'True'
+
+# How long game action results are remembered for Idempotency-Key retries
+# (stored in the default cache)
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', '600'))
+
+# Default cache. With REDIS_URL every worker shares the first Redis server,
+# so a retried action is recognised whichever worker it reaches. Otherwise
+# it is Django's per-process LocMemCache and idempotency keys only hold
+# within one worker (with room affinity, route room URLs to their worker).
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL.split(',')[0].strip(),
+        },
+    }
+
+# Reaper for stale data (python manage.py reap_stale_data). REAPER_INTERVAL
+# (seconds) also runs it periodically inside the ASGI server; 0 leaves it to
+# cron. Retention: finished and unfinished rooms in hours since their last
+# activity, video signals in minutes, idle users without games in days.
+REAPER_INTERVAL = int(os.environ.get('REAPER_INTERVAL', '0'))
+REAPER_BATCH_SIZE = int(os.environ.get('REAPER_BATCH_SIZE', '500'))
+REAPER_MAX_BATCHES = int(os.environ.get('REAPER_MAX_BATCHES', '20'))
+REAPER_FINISHED_ROOM_HOURS = int(os.environ.get('REAPER_FINISHED_ROOM_HOURS', '24'))
+REAPER_ABANDONED_ROOM_HOURS = int(os.environ.get('REAPER_ABANDONED_ROOM_HOURS', '48'))
+REAPER_SIGNAL_MINUTES = int(os.environ.get('REAPER_SIGNAL_MINUTES', '10'))
+REAPER_USER_DAYS = int(os.environ.get('REAPER_USER_DAYS', '30'))
+
+# JSON encoder for WebSocket frames: 'orjson', 'json' (standard library) or
+# 'auto', which uses orjson when it is installed
+JSON_ENCODER = os.environ.get('JSON_ENCODER', 'auto')
+
+# Latency, query count and payload histograms for views, game engine
+# methods, socket handlers and broadcasts, served at /metrics. Off by
+# default. Scrapers send "Authorization: Bearer <METRICS_TOKEN>"; without a
+# token the endpoint is only open when DEBUG is on.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'False') == 'True'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Sampling profiler for live workers: GET /api/admin/profile/?seconds=N
+# (staff only) returns collapsed stacks for a flamegraph. Off unless enabled.
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', 'False') == 'True'
+PROFILER_MAX_SECONDS = int(os.environ.get('PROFILER_MAX_SECONDS', '60'))
@@ -0,0 +1,18 @@
+"""
+SQLite backend that starts transactions with BEGIN IMMEDIATE, selected by
+SQLITE_IMMEDIATE_TRANSACTIONS (for load tests on a development database).
+
+SQLite ignores select_for_update(), so two game actions on the same room
+both read under a shared lock and the second to write fails at once with
+"database is locked" instead of waiting. Taking the write lock when the
+transaction starts makes them queue on the busy timeout, which is what the
+row lock does on Postgres. (Django 5.1 offers this as transaction_mode.)
+"""
+
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -1,16 +1,39 @@
 """
 URL configuration for cardsnchaos project.
 """
+import hmac
+
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound, JsonResponse
+
+from core import metrics
 
 def health_check(request):
     """Health check endpoint for deployment platform"""
     return JsonResponse({'status': 'healthy', 'service': 'cardsnchaos-backend'})
 
+def metrics_view(request):
+    """This process's metrics in Prometheus text format"""
+    if not metrics.is_enabled():
+        return HttpResponseNotFound()
+    token = settings.METRICS_TOKEN
+    if not token:
+        # Route names and traffic are not for the public
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    elif not hmac.compare_digest(
+        request.headers.get('Authorization', ''), f'Bearer {token}'
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
 urlpatterns = [
     path('', health_check, name='health_check'),
+    path('metrics', metrics_view, name='metrics'),
     path('admin/', admin.site.urls),
     path('api/', include('core.urls')),
 ]
@@ -0,0 +1,118 @@
+"""
+Game actions shared by the REST views and the room WebSocket.
+
+Each action validates the caller, runs it through the game engine and
+broadcasts the new room state. Failures raise ActionError carrying the
+message and HTTP status the REST API has always returned.
+"""
+
+from .models import Pack, Room, Player
+from .game_logic import get_game_engine
+from .consumers import broadcast_room_update
+from .room_state import room_store
+
+
+class ActionError(Exception):
+    """A game action was rejected."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _get_room(room_code, not_found='Room not found'):
+    try:
+        return Room.objects.get(room_code=room_code.upper())
+    except Room.DoesNotExist:
+        raise ActionError(not_found, status=404)
+
+
+def _get_room_and_player(room_code, user):
+    room = _get_room(room_code, not_found='Not found')
+    try:
+        player = Player.objects.get(user=user, room=room)
+    except Player.DoesNotExist:
+        raise ActionError('Not found', status=404)
+    return room, player
+
+
+def start_game(room_code, user):
+    """Start the game (host only)."""
+    room = _get_room(room_code)
+
+    # Verify host
+    if room.host_id != user.id:
+        raise ActionError('Only host can start', status=403)
+
+    if room.players.filter(is_online=True).count() < 3:
+        raise ActionError('Need at least 3 players')
+
+    try:
+        engine = get_game_engine(room)
+        engine.start_game()
+    except ValueError as e:
+        raise ActionError(str(e))
+
+    broadcast_room_update(room.room_code, action='game_started')
+    return {'message': 'Game started'}
+
+
+def update_settings(room_code, user, pack_id=None, max_rounds=None):
+    """Change pack and round count before the game starts (host only)."""
+    room = _get_room(room_code)
+
+    # Verify host
+    if room.host_id != user.id:
+        raise ActionError('Only host can update settings', status=403)
+
+    if room.status != 'WAITING':
+        raise ActionError('Cannot change settings during game')
+
+    if pack_id is not None:
+        pack = Pack.objects.filter(id=pack_id, enabled=True).first()
+        if pack:
+            room.pack = pack
+
+    if max_rounds is not None:
+        room.max_rounds = max_rounds
+
+    room.save()
+    room_store.discard(room.room_code)
+
+    broadcast_room_update(room.room_code)
+    return {'message': 'Settings updated'}
+
+
+def submit_card(room_code, user, card_text):
+    """Submit a white card for the current round."""
+    room, player = _get_room_and_player(room_code, user)
+
+    try:
+        engine = get_game_engine(room)
+        engine.submit_card(player, card_text)
+    except ValueError as e:
+        raise ActionError(str(e))
+
+    broadcast_room_update(room.room_code)
+    return {'message': 'Card submitted'}
+
+
+def pick_winner(room_code, user, winner_id):
+    """Czar picks the winning card."""
+    room, player = _get_room_and_player(room_code, user)
+
+    # Engine first: it refreshes the room from live state if there is one
+    engine = get_game_engine(room)
+
+    # Verify czar
+    if str(player.user_id) != str(room.czar_id):
+        raise ActionError('Only czar can pick', status=403)
+
+    try:
+        engine.pick_winner(winner_id)
+    except ValueError as e:
+        raise ActionError(str(e))
+
+    broadcast_room_update(room.room_code, action='winner_picked')
+    return {'message': 'Winner picked'}
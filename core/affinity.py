@@ -0,0 +1,243 @@
+"""
+Room affinity: map every room to one worker so its sockets and broadcasts
+stay in a single process.
+
+Workers are listed in CLUSTER_WORKERS and each process knows its own
+WORKER_ID. Room codes are placed on a consistent hash ring, so adding or
+removing a worker only moves the rooms that hashed to it. The load
+balancer learns a room's worker from GET /api/rooms/<code>/affinity/ or
+the X-Room-Worker response header on room URLs.
+
+AffinityChannelLayer keeps group traffic for rooms this worker owns in
+memory and only touches the shared (remote) channel layer for sockets
+that ended up on the wrong worker.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import logging
+
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .channel_hub import shard_key
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes."""
+
+    def __init__(self, workers, replicas=64):
+        self.workers = list(workers)
+        self._points = sorted(
+            (_hash(f'{worker}#{replica}'), worker)
+            for worker in self.workers
+            for replica in range(replicas)
+        )
+        self._keys = [point for point, _ in self._points]
+
+    def get(self, key):
+        if not self._points:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._points)
+        return self._points[index][1]
+
+
+_ring = None
+
+
+def get_ring():
+    global _ring
+    workers = getattr(settings, 'CLUSTER_WORKERS', [])
+    if _ring is None or _ring.workers != workers:
+        _ring = HashRing(workers)
+    return _ring
+
+
+def is_enabled():
+    return bool(getattr(settings, 'WORKER_ID', '') and getattr(settings, 'CLUSTER_WORKERS', []))
+
+
+def worker_for_room(room_code):
+    """Worker ID that owns a room, or None when affinity is off."""
+    return get_ring().get(room_code.upper())
+
+
+def is_local_room(room_code):
+    """True if this process owns the room (always True when affinity is off)."""
+    if not is_enabled():
+        return True
+    return worker_for_room(room_code) == settings.WORKER_ID
+
+
+# ============== Channel Layer ==============
+
+class AffinityChannelLayer(InMemoryChannelLayer):
+    """
+    Channel layer for room-affinity deployments.
+
+    Groups for rooms this worker owns live in memory. Sockets that connect
+    to another worker ("edge" members) join the group on the remote layer
+    and tell the owner how many there are, so the owner only publishes
+    remotely while edges exist. Sends from a non-owner go to the remote
+    group for its edges and are forwarded to the owner for its local
+    members.
+
+    CHANNEL_LAYERS = {'default': {
+        'BACKEND': 'core.affinity.AffinityChannelLayer',
+        'CONFIG': {'remote': {'BACKEND': ..., 'CONFIG': {...}}},
+    }}
+    """
+
+    def __init__(self, remote, worker_id=None, workers=None, **kwargs):
+        super().__init__(**kwargs)
+        remote_class = import_string(remote['BACKEND'])
+        self.remote = remote_class(**remote.get('CONFIG', {}))
+        self.worker_id = worker_id or settings.WORKER_ID
+        self.ring = HashRing(workers or settings.CLUSTER_WORKERS)
+        self.edges = {}        # group -> set of local channels joined remotely
+        self.edge_counts = {}  # owned group -> {worker_id: edge member count}
+        self._pumps = {}       # channel -> task moving remote messages locally
+        self._local_prefixes = set()
+        self._listener = None
+        self._loop = None
+
+    def owner(self, group):
+        return self.ring.get(shard_key(group).upper())
+
+    def _control_group(self, worker_id):
+        return f'affinity_{worker_id}'
+
+    # Background tasks
+
+    async def _ensure_listener(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._listener is not None and not self._listener.done():
+            return
+        self._loop = loop
+        self._pumps = {}
+        channel = await self.remote.new_channel()
+        await self.remote.group_add(self._control_group(self.worker_id), channel)
+        self._listener = loop.create_task(self._listen(channel))
+        # Edge counts sent before we were listening are lost; ask for them again
+        for worker_id in self.ring.workers:
+            if worker_id != self.worker_id:
+                await self.remote.group_send(
+                    self._control_group(worker_id),
+                    {'type': 'affinity.sync', 'worker': self.worker_id}
+                )
+
+    async def _listen(self, channel):
+        while True:
+            message = await self.remote.receive(channel)
+            try:
+                await self._handle_control(message)
+            except Exception:
+                logger.exception('Affinity control message failed: %r', message.get('type'))
+
+    async def _handle_control(self, message):
+        if message['type'] == 'affinity.forward':
+            await super().group_send(message['group'], message['message'])
+
+        elif message['type'] == 'affinity.edges':
+            counts = self.edge_counts.setdefault(message['group'], {})
+            if message['count']:
+                counts[message['worker']] = message['count']
+            else:
+                counts.pop(message['worker'], None)
+                if not counts:
+                    del self.edge_counts[message['group']]
+
+        elif message['type'] == 'affinity.sync':
+            for group in list(self.edges):
+                if self.owner(group) == message['worker']:
+                    await self._report_edges(group)
+
+    async def _report_edges(self, group):
+        await self.remote.group_send(self._control_group(self.owner(group)), {
+            'type': 'affinity.edges',
+            'group': group,
+            'worker': self.worker_id,
+            'count': len(self.edges.get(group, ())),
+        })
+
+    async def _pump(self, channel):
+        while True:
+            message = await self.remote.receive(channel)
+            try:
+                await super().send(channel, message)
+            except ChannelFull:
+                pass
+
+    # Channel layer API
+
+    async def new_channel(self, prefix='specific.'):
+        # Remote-addressable names, in case the socket turns out to be an edge
+        channel = await self.remote.new_channel(prefix)
+        self._local_prefixes.add(channel.split('!', 1)[0])
+        return channel
+
+    async def send(self, channel, message):
+        if channel.split('!', 1)[0] in self._local_prefixes:
+            await super().send(channel, message)
+        else:
+            await self.remote.send(channel, message)
+
+    async def group_add(self, group, channel):
+        await self._ensure_listener()
+        if self.owner(group) == self.worker_id:
+            await super().group_add(group, channel)
+            return
+
+        await self.remote.group_add(group, channel)
+        self.edges.setdefault(group, set()).add(channel)
+        if channel not in self._pumps:
+            self._pumps[channel] = asyncio.get_running_loop().create_task(self._pump(channel))
+        await self._report_edges(group)
+
+    async def group_discard(self, group, channel):
+        if self.owner(group) == self.worker_id:
+            await super().group_discard(group, channel)
+            return
+
+        await self.remote.group_discard(group, channel)
+        members = self.edges.get(group)
+        if members is not None:
+            members.discard(channel)
+            if not members:
+                del self.edges[group]
+        if not any(channel in members for members in self.edges.values()):
+            pump = self._pumps.pop(channel, None)
+            if pump is not None:
+                pump.cancel()
+        await self._report_edges(group)
+
+    async def group_send(self, group, message):
+        # No _ensure_listener() here: sends may come from a short-lived loop
+        # (async_to_sync outside the server), which must not own the listener.
+        owner = self.owner(group)
+        if owner == self.worker_id:
+            await super().group_send(group, message)
+            if self.edge_counts.get(group):
+                await self.remote.group_send(group, message)
+            return
+
+        # Edges (ours included) via the remote group, owner's sockets via the owner
+        await self.remote.group_send(group, message)
+        await self.remote.group_send(self._control_group(owner), {
+            'type': 'affinity.forward', 'group': group, 'message': message
+        })
+
+    async def flush(self):
+        await super().flush()
+        self.edges = {}
+        self.edge_counts = {}
+        await self.remote.flush()
@@ -3,9 +3,45 @@ Custom authentication for anonymous sessions.
 Replaces Firebase Anonymous Auth.
 """
 
+import threading
+
+from django.conf import settings
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
-from .models import AnonymousUser
+from .tokens import token_from_header, user_from_token
+from .user_cache import get_user_by_id, get_user_by_session
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class LazyAuthStats:
+    """
+    Counts read-only requests that lazy authentication served without a
+    session or user. These are requests, not rows saved: a client that
+    never keeps a session cookie is counted on every read, where eager
+    authentication would have created its rows once.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reads_without_session = 0
+        self.reads_without_user = 0
+
+    def record(self, session=False, user=False):
+        with self._lock:
+            self.reads_without_session += int(session)
+            self.reads_without_user += int(user)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'readsWithoutSession': self.reads_without_session,
+                'readsWithoutUser': self.reads_without_user,
+            }
+
+
+lazy_auth_stats = LazyAuthStats()
 
 
 class AnonymousSessionAuthentication(BaseAuthentication):
@@ -14,21 +50,38 @@ class AnonymousSessionAuthentication(BaseAuthentication):
     based on session keys or explicit user ID header.
 
     Priority:
-    1. X-User-ID header (set by frontend after ensureAuth)
-    2. Session-based lookup (fallback)
+    1. Signed token (Authorization: Bearer, when AUTH_TOKENS_ENABLED)
+    2. X-User-ID header (set by frontend after ensureAuth)
+    3. Session-based lookup (fallback)
+
+    With LAZY_AUTH on (the default), read-only requests never create a
+    session or user: they run unauthenticated unless one already exists.
+    Rows are only written on the first state-changing request.
     """
 
     def authenticate(self, request):
+        # Signed tokens need no session or database access at all
+        user = user_from_token(token_from_header(request))
+        if user is not None:
+            return (user, None)
+
         # First, check for explicit user ID header (from frontend after ensureAuth)
         user_id = request.headers.get('X-User-ID')
 
         if user_id:
-            try:
-                user = AnonymousUser.objects.get(id=user_id)
+            user = get_user_by_id(user_id)
+            if user is not None:
                 return (user, None)
-            except AnonymousUser.DoesNotExist:
-                # User ID was invalid, fall through to session-based auth
-                pass
+            # User ID was invalid, fall through to session-based auth
+
+        # Read-only requests only use a session/user that already exists
+        if request.method in SAFE_METHODS and getattr(settings, 'LAZY_AUTH', True):
+            session_key = request.session.session_key
+            user = get_user_by_session(session_key) if session_key else None
+            if user is None:
+                lazy_auth_stats.record(session=not session_key, user=True)
+                return None
+            return (user, None)
 
         # Fallback: session-based authentication
         if not request.session.session_key:
@@ -37,9 +90,7 @@ class AnonymousSessionAuthentication(BaseAuthentication):
         session_key = request.session.session_key
 
         try:
-            user, created = AnonymousUser.objects.get_or_create(
-                session_key=session_key
-            )
+            user = get_user_by_session(session_key, create=True)
             return (user, None)
         except Exception as e:
             raise AuthenticationFailed(f'Authentication failed: {str(e)}')
@@ -0,0 +1,99 @@
+"""
+Coalesced room broadcasts.
+
+Bursts of state changes (a submission that also flips the phase, several
+players joining at once) used to each trigger a snapshot and a push to
+every socket. The coalescer holds a room's broadcast for a short window
+on the server event loop and emits one update for the whole burst,
+labelled with the most significant action seen.
+"""
+
+import contextvars
+import logging
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Higher wins when several actions are merged into one broadcast
+ACTION_PRIORITY = {
+    'update': 0,
+    'player_left': 1,
+    'winner_picked': 2,
+    'game_started': 3,
+}
+
+
+def merge_action(current, new):
+    """Keep the more significant of two broadcast actions."""
+    if current is None:
+        return new
+    if ACTION_PRIORITY.get(new, 0) > ACTION_PRIORITY.get(current, 0):
+        return new
+    return current
+
+
+class BroadcastCoalescer:
+    """
+    Debounces room broadcasts per room on the server event loop.
+    request() is thread-safe; bind() must run on the loop.
+    build_event(room_code, action) returns the channel layer event.
+    """
+
+    def __init__(self, build_event):
+        self.build_event = build_event
+        self._loop = None
+        self._pending = {}  # room_code -> action
+
+    @property
+    def window(self):
+        return getattr(settings, 'ROOM_BROADCAST_COALESCE_MS', 0) / 1000
+
+    @property
+    def is_running(self):
+        return self._loop is not None and not self._loop.is_closed()
+
+    def bind(self, loop):
+        if self._loop is not loop:
+            self._loop = loop
+            self._pending = {}
+
+    def request(self, room_code, action='update'):
+        """
+        Queue a broadcast. Returns False if there is no server loop to
+        coalesce on (or coalescing is off); the caller should send inline.
+        """
+        if self.window <= 0 or not self.is_running:
+            return False
+        try:
+            # Run the timer in a fresh context: the caller's may carry
+            # asgiref's executor state, which would make build_event fail
+            self._loop.call_soon_threadsafe(
+                self._add, room_code, action, context=contextvars.Context()
+            )
+        except RuntimeError:
+            # Loop closed between the check and the call
+            self._loop = None
+            return False
+        return True
+
+    def _add(self, room_code, action):
+        if room_code in self._pending:
+            self._pending[room_code] = merge_action(self._pending[room_code], action)
+            return
+        self._pending[room_code] = action
+        self._loop.call_later(self.window, self._fire, room_code)
+
+    def _fire(self, room_code):
+        action = self._pending.pop(room_code, None)
+        if action is not None:
+            self._loop.create_task(self._send(room_code, action))
+
+    async def _send(self, room_code, action):
+        try:
+            event = await database_sync_to_async(self.build_event)(room_code, action)
+            await get_channel_layer().group_send(f'room_{room_code}', event)
+        except Exception:
+            logger.exception('Room broadcast failed for room %s', room_code)
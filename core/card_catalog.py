@@ -0,0 +1,97 @@
+"""
+In-process catalog of each pack's cards.
+
+Game start used to query every card text of the pack. The catalog loads a
+pack's cards once and serves them from memory until a Card or Pack write
+in this process invalidates it (see core/signals.py).
+Writes made by other processes are picked up after CARD_CATALOG_TTL.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+
+from .models import Card
+
+
+class PackCatalog:
+    """
+    Card texts of one pack, keyed by Card.number and split by type.
+    Decks and hands hold card numbers; texts are resolved through here.
+    """
+
+    __slots__ = ('pack_id', 'black', 'white', 'loaded_at', 'decks')
+
+    def __init__(self, pack_id, black, white):
+        self.pack_id = pack_id
+        self.black = black  # number -> text
+        self.white = white  # number -> text
+        self.loaded_at = time.monotonic()
+        # Deck orders of games on this pack (core/decks.py), dropped with
+        # the catalog when it reloads
+        self.decks = {}
+
+    def black_text(self, number, default=None):
+        return self.black.get(number, default)
+
+    def white_text(self, number, default=None):
+        return self.white.get(number, default)
+
+    @property
+    def max_number(self):
+        """Highest card number in the pack (0 for an empty pack)."""
+        return max(max(self.black, default=0), max(self.white, default=0))
+
+    def white_texts(self, numbers):
+        """Texts for a hand; numbers of since-deleted cards are skipped."""
+        return [self.white[number] for number in numbers if number in self.white]
+
+    def find_white(self, numbers, text):
+        """The number in `numbers` whose card reads `text`, or None."""
+        return next((number for number in numbers if self.white.get(number) == text), None)
+
+
+EMPTY_CATALOG = PackCatalog(None, {}, {})
+
+
+class CardCatalog:
+    """Thread-safe cache of PackCatalog objects keyed by pack id."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._packs = {}
+
+    def get(self, pack_id):
+        """Return the PackCatalog for a pack, loading it if needed."""
+        if pack_id is None:
+            return EMPTY_CATALOG
+        ttl = getattr(settings, 'CARD_CATALOG_TTL', 300)
+        catalog = self._packs.get(pack_id)
+        if catalog is not None and time.monotonic() - catalog.loaded_at < ttl:
+            return catalog
+
+        catalog = self._load(pack_id)
+        with self._lock:
+            self._packs[pack_id] = catalog
+        return catalog
+
+    def _load(self, pack_id):
+        black, white = {}, {}
+        cards = Card.objects.filter(pack_id=pack_id).order_by('number').values_list(
+            'card_type', 'number', 'text'
+        )
+        for card_type, number, text in cards:
+            (black if card_type == 'black' else white)[number] = text
+        return PackCatalog(pack_id, black, white)
+
+    def invalidate(self, pack_id=None):
+        """Forget one pack, or every pack when pack_id is None."""
+        with self._lock:
+            if pack_id is None:
+                self._packs.clear()
+            else:
+                self._packs.pop(pack_id, None)
+
+
+card_catalog = CardCatalog()
@@ -0,0 +1,308 @@
+"""
+Channel hub: a small stand-in for Redis that lets several Daphne workers
+share channel layer groups without any external service.
+
+The hub (`python manage.py run_channel_hub`) is a TCP server speaking JSON
+lines. Each worker's HubChannelLayer keeps its channels' queues in memory
+like InMemoryChannelLayer and forwards group membership and sends to the
+hub, which routes messages to the worker that owns each channel.
+
+Several hubs can run side by side; groups are sharded across them by room
+code, so a room's traffic always goes through a single hub. Messages must
+be JSON serializable.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import string
+import uuid
+
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer
+
+logger = logging.getLogger(__name__)
+
+
+def parse_hosts(hosts):
+    """Accept 'host:port' strings or (host, port) pairs."""
+    parsed = []
+    for host in hosts:
+        if isinstance(host, str):
+            host, _, port = host.rpartition(':')
+        parsed.append((host or '127.0.0.1', int(port)))
+    return parsed
+
+
+def shard_key(group):
+    """Groups are named <kind>_<ROOM_CODE>; shard on the room code."""
+    return group.split('_', 1)[-1]
+
+
+def pick_shard(key, count):
+    """Stable across processes, unlike hash()."""
+    digest = hashlib.md5(key.encode()).digest()
+    return int.from_bytes(digest[:4], 'big') % count
+
+
+def channel_token(channel):
+    """Owner token embedded in channel names: '<prefix>.<token>!<suffix>'."""
+    return channel.split('!', 1)[0].rsplit('.', 1)[-1]
+
+
+def _encode(payload):
+    return json.dumps(payload, separators=(',', ':')).encode() + b'\n'
+
+
+# ============== Server ==============
+
+class ChannelHubServer:
+    """
+    Routes group and channel messages between connected workers.
+    Membership is tied to the connection that registered it and is
+    dropped when that connection goes away.
+
+    Deliveries are written without waiting for the receiving worker, so a
+    worker that stops reading would make the hub buffer without limit.
+    Once a worker has more than `max_buffer` bytes queued, messages for it
+    are dropped, like a full channel in the worker's own layer.
+    """
+
+    def __init__(self, max_buffer=1024 * 1024):
+        self.max_buffer = max_buffer
+        self.owners = {}  # token -> writer
+        self.groups = {}  # group -> set of channels
+        self.dropped = 0
+
+    async def start(self, host, port):
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def serve(self, host, port):
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        tokens = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    self.dispatch(json.loads(line), writer, tokens)
+                except (ValueError, KeyError):
+                    logger.warning('Channel hub: bad message %r', line[:200])
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.drop_tokens(tokens, writer)
+            writer.close()
+
+    def dispatch(self, payload, writer, tokens):
+        op = payload['op']
+
+        if op == 'listen':
+            tokens.add(payload['token'])
+            self.owners[payload['token']] = writer
+
+        elif op == 'group_add':
+            self.groups.setdefault(payload['group'], set()).add(payload['channel'])
+
+        elif op == 'group_discard':
+            members = self.groups.get(payload['group'])
+            if members:
+                members.discard(payload['channel'])
+                if not members:
+                    del self.groups[payload['group']]
+
+        elif op == 'send':
+            self.deliver(payload['channel'], payload['message'])
+
+        elif op == 'group_send':
+            for channel in list(self.groups.get(payload['group'], ())):
+                self.deliver(channel, payload['message'])
+
+        elif op == 'flush':
+            self.groups.clear()
+
+    def deliver(self, channel, message):
+        writer = self.owners.get(channel_token(channel))
+        if writer is None or writer.is_closing():
+            return
+        if writer.transport.get_write_buffer_size() > self.max_buffer:
+            self.dropped += 1
+            logger.warning('Channel hub: dropping message for slow worker, channel %s', channel)
+            return
+        writer.write(_encode({'op': 'deliver', 'channel': channel, 'message': message}))
+
+    def drop_tokens(self, tokens, writer):
+        for token in tokens:
+            if self.owners.get(token) is writer:
+                del self.owners[token]
+        for group, members in list(self.groups.items()):
+            members.difference_update(
+                [channel for channel in members if channel_token(channel) in tokens]
+            )
+            if not members:
+                del self.groups[group]
+
+
+# ============== Client ==============
+
+class _HubConnection:
+    """One worker-side connection to a hub shard, bound to an event loop."""
+
+    def __init__(self, layer, address):
+        self.layer = layer
+        self.address = address
+        self.reader = None
+        self.writer = None
+        self.reader_task = None
+        self.lock = asyncio.Lock()
+        self.listening = False
+        self.memberships = set()  # (group, channel), replayed on reconnect
+
+    @property
+    def connected(self):
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def write(self, payload):
+        async with self.lock:
+            if not self.connected:
+                self.reader, self.writer = await asyncio.open_connection(*self.address)
+                self.reader_task = None
+                if self.listening:
+                    self.writer.write(_encode({'op': 'listen', 'token': self.layer.token}))
+                for group, channel in self.memberships:
+                    self.writer.write(_encode(
+                        {'op': 'group_add', 'group': group, 'channel': channel}
+                    ))
+            self.writer.write(_encode(payload))
+            # Only loops that receive read deliveries; send-only loops
+            # (async_to_sync from plain sync code) just write.
+            if self.listening and self.reader_task is None:
+                self.reader_task = asyncio.get_running_loop().create_task(self.read_loop())
+            await self.writer.drain()
+
+    async def read_loop(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                payload = json.loads(line)
+                if payload.get('op') == 'deliver':
+                    await self.layer.deliver(payload['channel'], payload['message'])
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            if self.writer is not None:
+                self.writer.close()
+
+    async def close(self):
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+
+
+class HubChannelLayer(InMemoryChannelLayer):
+    """
+    Channel layer backed by one or more channel hubs.
+
+    CHANNEL_LAYERS = {'default': {
+        'BACKEND': 'core.channel_hub.HubChannelLayer',
+        'CONFIG': {'hosts': ['127.0.0.1:6380', '127.0.0.1:6381']},
+    }}
+    """
+
+    def __init__(self, hosts=None, **kwargs):
+        super().__init__(**kwargs)
+        self.hosts = parse_hosts(hosts or ['127.0.0.1:6380'])
+        self.token = 'hub' + uuid.uuid4().hex[:12]
+        self._connections = {}  # event loop -> [_HubConnection per shard]
+
+    def _shards(self):
+        loop = asyncio.get_running_loop()
+        for stale in [key for key in self._connections if key.is_closed()]:
+            del self._connections[stale]
+        if loop not in self._connections:
+            self._connections[loop] = [
+                _HubConnection(self, address) for address in self.hosts
+            ]
+        return self._connections[loop]
+
+    def _shard_for(self, key):
+        shards = self._shards()
+        return shards[pick_shard(key, len(shards))]
+
+    async def _listen(self):
+        """Ask every shard to route this process's channels to this loop."""
+        for connection in self._shards():
+            if not connection.listening:
+                connection.listening = True
+                await connection.write({'op': 'listen', 'token': self.token})
+
+    async def deliver(self, channel, message):
+        try:
+            await super().send(channel, message)
+        except ChannelFull:
+            logger.warning('Channel hub: dropping message for full channel %s', channel)
+
+    # Channel layer API
+
+    async def new_channel(self, prefix='specific.'):
+        suffix = ''.join(random.choice(string.ascii_letters) for _ in range(12))
+        return f'{prefix}.{self.token}!{suffix}'
+
+    async def receive(self, channel):
+        await self._listen()
+        return await super().receive(channel)
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_channel_name(channel)
+        token = channel_token(channel)
+        if token == self.token:
+            await super().send(channel, message)
+            return
+        await self._shard_for(token).write(
+            {'op': 'send', 'channel': channel, 'message': message}
+        )
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._listen()
+        connection = self._shard_for(shard_key(group))
+        connection.memberships.add((group, channel))
+        await connection.write({'op': 'group_add', 'group': group, 'channel': channel})
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        connection = self._shard_for(shard_key(group))
+        connection.memberships.discard((group, channel))
+        await connection.write({'op': 'group_discard', 'group': group, 'channel': channel})
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'Message is not a dict'
+        self.require_valid_group_name(group)
+        await self._shard_for(shard_key(group)).write(
+            {'op': 'group_send', 'group': group, 'message': message}
+        )
+
+    async def flush(self):
+        await super().flush()
+        for connection in self._shards():
+            connection.memberships.clear()
+            await connection.write({'op': 'flush'})
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        for connection in self._connections.pop(loop, []):
+            await connection.close()
@@ -3,22 +3,53 @@ WebSocket consumers for real-time game updates.
 Replaces Firestore onSnapshot functionality.
 """
 
+import asyncio
 import json
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from channels.db import database_sync_to_async
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 
 from .models import Room, Player
-from .serializers import RoomDetailSerializer
+from .serializers import (
+    SubmitCardSerializer, PickWinnerSerializer, UpdateSettingsSerializer
+)
+from . import idempotency, json_codec, metrics
+from .json_patch import make_patch
+from .room_state import room_store
+from .snapshots import load_room_snapshot
+from .round_timer import round_timer
+from .broadcast import BroadcastCoalescer
+from .reaper import periodic_reaper
+
+
+# WebSocket game actions: action name -> (payload serializer, function in core.actions)
+GAME_ACTIONS = {
+    'start': (None, 'start_game'),
+    'settings': (UpdateSettingsSerializer, 'update_settings'),
+    'submit': (SubmitCardSerializer, 'submit_card'),
+    'pick_winner': (PickWinnerSerializer, 'pick_winner'),
+}
 
 
-class RoomConsumer(AsyncJsonWebsocketConsumer):
+class RoomConsumer(metrics.MeteredSendMixin, json_codec.JsonCodecMixin, AsyncJsonWebsocketConsumer):
     """
     WebSocket consumer for real-time room updates.
     Replaces Firestore onSnapshot functionality.
+
+    Clients connecting with ?protocol=delta receive a full snapshot first
+    and then JSON Patch diffs against the last revision they acknowledged.
     """
 
+    DELTA_HISTORY = 16  # revisions kept per socket for diffing
+
     async def connect(self):
         self.room_code = self.scope['url_route']['kwargs']['room_code']
         self.room_group_name = f'room_{self.room_code}'
@@ -26,6 +57,17 @@ class RoomConsumer(AsyncJsonWebsocketConsumer):
         # Get user from session (set by middleware)
         self.user = self.scope.get('user')
 
+        # Round expiry, coalesced broadcasts and the reaper run on the server event loop
+        round_timer.start()
+        broadcast_coalescer.bind(asyncio.get_running_loop())
+        periodic_reaper.start()
+
+        # Delta protocol state
+        query_params = parse_qs(self.scope.get('query_string', b'').decode())
+        self.delta_enabled = query_params.get('protocol', [None])[0] == 'delta'
+        self.sent_states = OrderedDict()
+        self.acked_revision = None
+
         # Join room group
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -39,12 +81,9 @@ class RoomConsumer(AsyncJsonWebsocketConsumer):
             await self.set_player_online(True)
 
         # Send initial room state
-        room_data = await self.get_room_data()
+        room_data, revision = await self.get_room_data()
         if room_data:
-            await self.send_json({
-                'type': 'room_state',
-                'data': room_data
-            })
+            await self.send_room_state(room_data, revision, full=True)
         else:
             await self.send_json({
                 'type': 'error',
@@ -63,18 +102,19 @@ class RoomConsumer(AsyncJsonWebsocketConsumer):
         )
 
         # Broadcast player left
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'room_update',
-                'action': 'player_left'
-            }
-        )
+        if not broadcast_coalescer.request(self.room_code, 'player_left'):
+            event = await database_sync_to_async(room_update_event)(
+                self.room_code, action='player_left'
+            )
+            await self.channel_layer.group_send(self.room_group_name, event)
 
+    @metrics.timed('consumer')
     async def receive_json(self, content):
         """
         Handle incoming WebSocket messages.
-        Clients can send actions like ping/heartbeat.
+        Clients can send actions like ping/heartbeat, delta clients
+        ack/resync to manage their revision, and players can run game
+        actions (answered with an action_result carrying their request_id).
         """
         action = content.get('action')
 
@@ -85,32 +125,164 @@ class RoomConsumer(AsyncJsonWebsocketConsumer):
             if self.user:
                 await self.set_player_online(True)
 
+        elif action == 'ack':
+            revision = content.get('revision')
+            if revision in self.sent_states:
+                self.acked_revision = revision
+                while next(iter(self.sent_states)) != revision:
+                    self.sent_states.popitem(last=False)
+            else:
+                # Client is on a revision we no longer know about
+                await self.send_fresh_room_state()
+
+        elif action == 'resync':
+            await self.send_fresh_room_state()
+
+        elif action in GAME_ACTIONS:
+            await self.send_json(
+                await self.run_game_action(action, content)
+            )
+
+    @metrics.timed('consumer')
     async def room_update(self, event):
         """
         Called when room state changes.
         Broadcasts updated room data to all connected clients.
+
+        Fan-out events carry the shared snapshot built once by the sender,
+        so only this socket's private hand has to be filled in here; for
+        full-snapshot sockets that happens in the already encoded frame.
+        Plain pings fall back to a full fetch.
         """
-        room_data = await self.get_room_data()
+        if 'data' in event and not self.delta_enabled and event.get('revision') is not None:
+            await self.send_encoded(room_state_frames.frame(
+                self.room_code, event['data'], event.get('hands', {}), self.user,
+                event['revision'], event.get('action', 'update'),
+            ))
+            return
+
+        if 'data' in event:
+            room_data = personalize_room_data(
+                event['data'], event.get('hands', {}), self.user
+            )
+            revision = event.get('revision')
+        else:
+            room_data, revision = await self.get_room_data()
         if room_data:
-            await self.send_json({
-                'type': 'room_state',
-                'data': room_data,
-                'action': event.get('action', 'update')
-            })
+            await self.send_room_state(
+                room_data, revision, action=event.get('action', 'update')
+            )
+
+    async def send_fresh_room_state(self):
+        """Re-fetch the room and send a full snapshot."""
+        room_data, revision = await self.get_room_data()
+        if room_data:
+            await self.send_room_state(room_data, revision, full=True)
+
+    async def send_room_state(self, room_data, revision, action=None, full=False):
+        """
+        Send room state to this socket.
+        Delta clients get a patch against their acknowledged revision when
+        it is still in history; otherwise (connect, resync, gaps or
+        out-of-order revisions) a full snapshot is sent and becomes the
+        new base.
+        """
+        message = {'type': 'room_state', 'data': room_data, 'revision': revision}
+        if action is not None:
+            message['action'] = action
+
+        if not self.delta_enabled:
+            await self.send_json(message)
+            return
+
+        base = self.sent_states.get(self.acked_revision)
+        latest = next(reversed(self.sent_states), None)
+        if full or base is None or revision is None or revision <= latest:
+            self.sent_states.clear()
+            self.sent_states[revision] = room_data
+            self.acked_revision = revision
+            await self.send_json(message)
+            return
+
+        self.sent_states[revision] = room_data
+        if len(self.sent_states) > self.DELTA_HISTORY:
+            self.sent_states.popitem(last=False)
+
+        await self.send_json({
+            'type': 'room_patch',
+            'action': action or 'update',
+            'baseRevision': self.acked_revision,
+            'revision': revision,
+            'patch': make_patch(base, room_data)
+        })
 
     @database_sync_to_async
-    def get_room_data(self):
-        """Fetch serialized room data."""
+    def run_game_action(self, action, content):
+        """
+        Run a game action for this socket's user and build the
+        action_result reply. A request_id doubles as an idempotency key,
+        so a client retrying after a dropped frame gets the original result.
+        """
+        request_id = content.get('request_id')
+        status, data = 401, {'error': 'Authentication required'}
+
+        if self.user:
+            scope = f'ws:{action}:{self.user.id}:{self.room_code.upper()}'
+            claimed, cached = (True, None)
+            if request_id is not None:
+                claimed, cached = idempotency.begin(scope, request_id)
+
+            if not claimed:
+                if cached is None or cached == idempotency.IN_PROGRESS:
+                    status, data = 409, {'error': 'Request already in progress'}
+                else:
+                    status, data = cached
+            else:
+                try:
+                    status, data = self.perform_game_action(action, content)
+                except Exception:
+                    if request_id is not None:
+                        idempotency.complete(scope, request_id, 500, None)
+                    raise
+                if request_id is not None:
+                    idempotency.complete(scope, request_id, status, data)
+
+        result = {
+            'type': 'action_result',
+            'action': action,
+            'request_id': request_id,
+            'ok': status < 400,
+            'status': status,
+        }
+        if status < 400:
+            result['data'] = data
+        else:
+            result['error'] = data['error']
+        return result
+
+    def perform_game_action(self, action, content):
+        """Validate the payload and run the shared action. Returns (status, data)."""
+        from . import actions
+
+        serializer_class, func = GAME_ACTIONS[action]
+        kwargs = {}
+        if serializer_class is not None:
+            serializer = serializer_class(data=content)
+            if not serializer.is_valid():
+                field, errors = next(iter(serializer.errors.items()))
+                return 400, {'error': f'{field}: {errors[0]}'}
+            kwargs = dict(serializer.validated_data)
+
         try:
-            room = Room.objects.prefetch_related(
-                'players', 'submissions'
-            ).get(room_code=self.room_code)
+            return 200, getattr(actions, func)(self.room_code, self.user, **kwargs)
+        except actions.ActionError as e:
+            return e.status, {'error': e.message}
 
-            return RoomDetailSerializer(room, context={
-                'user': self.user
-            }).data
-        except Room.DoesNotExist:
-            return None
+    @database_sync_to_async
+    def get_room_data(self):
+        """Fetch serialized room data and its revision for this socket."""
+        data, hands, revision = build_room_snapshot(self.room_code)
+        return personalize_room_data(data, hands, self.user), revision
 
     @database_sync_to_async
     def set_player_online(self, is_online):
@@ -122,20 +294,154 @@ class RoomConsumer(AsyncJsonWebsocketConsumer):
             )
             player.is_online = is_online
             player.save(update_fields=['is_online'])
+            room_store.set_player_online(self.room_code, self.user.id, is_online)
         except Player.DoesNotExist:
             pass
 
 
+def build_room_snapshot(room_code):
+    """
+    Serialize the shared room state once for every recipient.
+    Returns (data, hands, revision): data has all hands blanked, hands
+    maps user id -> private hand. Returns (None, {}, None) if the room is gone.
+    """
+    state = room_store.get(room_code)
+    if state is not None:
+        with state.lock:
+            data, hands = state.snapshot()
+            return data, hands, state.state_revision
+
+    return load_room_snapshot(room_code)
+
+
+class RoomStateFrames:
+    """
+    Encoded room_state frames for the sockets in this process.
+
+    The shared snapshot of a room revision is encoded once and kept for
+    the next sockets; each recipient's frame is then spliced together from
+    it and their own hand, giving exactly the text send_json() would.
+    Frames are only built on the event loop, so there is no locking.
+    """
+
+    SIZE = 64  # revisions kept, across rooms
+    EMPTY_HAND = '"hand":[]'
+
+    def __init__(self):
+        # (encoder, room_code, revision) -> (data, encoded data)
+        self._encoded = OrderedDict()
+
+    def encoded_data(self, room_code, revision, data):
+        key = (json_codec.backend(), room_code, revision)
+        entry = self._encoded.get(key)
+        # Comparing is much cheaper than encoding, and guards against a
+        # revision sent with other data (e.g. one read from a database
+        # that lags a live room's write-behind)
+        if entry is None or entry[0] != data:
+            entry = self._encoded[key] = (data, json_codec.dumps(data))
+            self._encoded.move_to_end(key)
+            if len(self._encoded) > self.SIZE:
+                self._encoded.popitem(last=False)
+        return entry[1]
+
+    def frame(self, room_code, data, hands, user, revision, action):
+        """The room_state frame for `user`, as personalize_room_data() + send_json()."""
+        encoded = self.encoded_data(room_code, revision, data)
+        user_id = str(user.id) if user else None
+        if user_id in data['players'] and user_id in hands:
+            # Quotes inside JSON strings are escaped, so these markers can
+            # only match the recipient's own player object
+            start = encoded.find('"id":' + json_codec.dumps(user_id))
+            at = encoded.find(self.EMPTY_HAND, start)
+            encoded = (
+                encoded[:at] + '"hand":' + json_codec.dumps(hands[user_id])
+                + encoded[at + len(self.EMPTY_HAND):]
+            )
+        return (
+            '{"type":"room_state","data":' + encoded
+            + ',"revision":' + json_codec.dumps(revision)
+            + ',"action":' + json_codec.dumps(action) + '}'
+        )
+
+
+room_state_frames = RoomStateFrames()
+
+
+def personalize_room_data(data, hands, user):
+    """
+    Overlay a single recipient's hand onto a shared room snapshot.
+    The shared snapshot is left untouched.
+    """
+    if data is None:
+        return None
+    user_id = str(user.id) if user else None
+    if user_id not in data['players'] or user_id not in hands:
+        return data
+
+    players = dict(data['players'])
+    players[user_id] = {**players[user_id], 'hand': hands[user_id]}
+    return {**data, 'players': players}
+
+
+def bump_room_revision(room_code, snapshot=False):
+    """
+    Bump the room's state revision and, with snapshot=True, read the
+    snapshot it labels in the same step: under the live state's lock, or
+    in one transaction whose UPDATE holds the room row until the snapshot
+    is read. No two broadcasts can then carry the same revision with
+    different data. Returns build_room_snapshot()'s result, or None.
+    """
+    state = room_store.get(room_code)
+    if state is not None:
+        with state.lock:
+            if room_store.bump_revision(room_code):
+                return build_room_snapshot(room_code) if snapshot else None
+
+    with transaction.atomic(savepoint=False):
+        Room.objects.filter(room_code=room_code).update(
+            state_revision=F('state_revision') + 1, last_activity=timezone.now()
+        )
+        return load_room_snapshot(room_code) if snapshot else None
+
+
+@metrics.timed('broadcast')
+def room_update_event(room_code, action='update'):
+    """
+    Build the channel layer event for a room state change.
+    Bumps the room's state revision; in fan-out mode the snapshot is
+    built here, once per broadcast.
+    """
+    event = {
+        'type': 'room_update',
+        'action': action
+    }
+    if getattr(settings, 'ROOM_BROADCAST_FANOUT', True):
+        data, hands, revision = bump_room_revision(room_code, snapshot=True)
+        if data is not None:
+            event['data'] = data
+            event['hands'] = hands
+            event['revision'] = revision
+    else:
+        bump_room_revision(room_code)
+    return event
+
+
+broadcast_coalescer = BroadcastCoalescer(room_update_event)
+
+
+@metrics.timed('broadcast')
 def broadcast_room_update(room_code, action='update'):
     """
     Utility function to broadcast room updates from views.
-    Called after any room state change.
+    Called after any room state change. Within ROOM_BROADCAST_COALESCE_MS
+    a burst of calls for the same room becomes a single broadcast; without
+    a server event loop (management commands, tests) it sends inline.
     """
+    if broadcast_coalescer.request(room_code, action):
+        return
+
     channel_layer = get_channel_layer()
     async_to_sync(channel_layer.group_send)(
         f'room_{room_code}',
-        {
-            'type': 'room_update',
-            'action': action
-        }
+        room_update_event(room_code, action)
     )
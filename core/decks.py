@@ -0,0 +1,93 @@
+"""
+Seeded decks.
+
+A room's decks are not stored as shuffled lists. The room keeps a shuffle
+seed, the highest card number in play when the game started (deck_size)
+and one draw cursor per deck. Each deck is the seeded permutation of card
+numbers 1..deck_size, skipping numbers that are not cards of its type in
+the pack catalog, and the cursor counts the positions already drawn.
+
+Drawing a card only moves a cursor, so a round writes a few integers, and
+a game can be replayed from its seed. Cards added to the pack mid-game are
+not in the deck; deleted cards are skipped.
+
+Each deck's order and running card count are kept on the pack catalog, so
+a room's shuffle is computed once per catalog load and deck sizes in room
+snapshots cost a subtraction.
+"""
+
+import random
+from array import array
+
+from .card_catalog import card_catalog
+
+
+def new_seed():
+    """Random seed that fits a signed 64-bit column."""
+    return random.getrandbits(63)
+
+
+def permutation(seed, card_type, size):
+    """Shuffled card numbers 1..size for one deck of a game."""
+    numbers = list(range(1, size + 1))
+    random.Random(f'{seed}:{card_type}').shuffle(numbers)
+    return tuple(numbers)
+
+
+def deck_order(catalog, card_type, seed, size):
+    """
+    (order, playable) for one deck of a game: its permutation, and for
+    each position how many cards of the deck's type in this catalog come
+    before it. Cached on the catalog.
+    """
+    key = (seed, card_type, size)
+    entry = catalog.decks.get(key)
+    if entry is None:
+        cards = catalog.black if card_type == 'black' else catalog.white
+        order = permutation(seed, card_type, size)
+        playable = array('I', [0])
+        for number in order:
+            playable.append(playable[-1] + (number in cards))
+        entry = catalog.decks[key] = (order, playable)
+    return entry
+
+
+class Deck:
+    """One deck of a room, read from its cursor."""
+
+    def __init__(self, catalog, card_type, seed, size, cursor=0):
+        self.cards = catalog.black if card_type == 'black' else catalog.white
+        if seed is None:
+            self.order, self.playable = (), (0,)
+        else:
+            self.order, self.playable = deck_order(catalog, card_type, seed, size)
+        self.cursor = cursor
+
+    def draw(self):
+        """Next card number, or None when the deck is exhausted."""
+        while self.cursor < len(self.order):
+            number = self.order[self.cursor]
+            self.cursor += 1
+            if number in self.cards:
+                return number
+        return None
+
+    def remaining(self):
+        """Card numbers left to draw, in draw order."""
+        return [number for number in self.order[self.cursor:] if number in self.cards]
+
+    def __len__(self):
+        return self.playable[-1] - self.playable[min(self.cursor, len(self.order))]
+
+
+def room_decks(room, catalog=None):
+    """
+    (black, white) Decks of a Room or RoomState. Write the cursors back
+    to the room after drawing.
+    """
+    if catalog is None:
+        catalog = card_catalog.get(room.pack_id)
+    return (
+        Deck(catalog, 'black', room.deck_seed, room.deck_size, room.black_cursor),
+        Deck(catalog, 'white', room.deck_seed, room.deck_size, room.white_cursor),
+    )
@@ -5,10 +5,15 @@ Replaces game logic from game.js.
 
 import random
 from datetime import timedelta
+from django.conf import settings
 from django.utils import timezone
 from django.db import transaction
 
-from .models import Room, Player, Submission, Card
+from .models import Room, Player, Submission
+from .card_catalog import card_catalog
+from .decks import new_seed, room_decks
+from .round_timer import round_timer
+from . import metrics
 
 
 class GameEngine:
@@ -24,51 +29,60 @@ class GameEngine:
     def __init__(self, room: Room):
         self.room = room
 
+    def _lock_room(self):
+        """
+        Re-read the room under a row lock so concurrent actions on the same
+        room run one after another against fresh state.
+        """
+        self.room = Room.objects.select_for_update().get(pk=self.room.pk)
+
+    def _schedule_round_timer(self):
+        """Arm the server-side round timer once the current transaction commits."""
+        room_code = self.room.room_code
+        expires_at = self.room.round_expires_at if self.room.status == 'PLAYING' else None
+        transaction.on_commit(lambda: round_timer.schedule(room_code, expires_at))
+
+    @metrics.timed('engine')
     @transaction.atomic
     def start_game(self):
         """
         Initialize game state when host starts.
         Replaces startGame() in game.js
         """
-        players = list(self.room.players.filter(is_online=True))
+        self._lock_room()
 
-        # Fetch cards from database
-        pack = self.room.pack
-        black_cards = []
-        white_cards = []
+        players = list(self.room.players.filter(is_online=True))
 
-        if pack:
-            black_cards = list(
-                Card.objects.filter(pack=pack, card_type='black')
-                .values_list('text', flat=True)
-            )
-            white_cards = list(
-                Card.objects.filter(pack=pack, card_type='white')
-                .values_list('text', flat=True)
-            )
+        # Cards come from the in-process pack catalog, not the database.
+        # Decks and hands hold card numbers; texts are resolved on output.
+        catalog = card_catalog.get(self.room.pack_id)
 
         # If no cards in DB, this is an error state
-        if not black_cards or not white_cards:
+        if not catalog.black or not catalog.white:
             raise ValueError("No cards found for the selected pack")
 
-        # Shuffle decks
-        random.shuffle(black_cards)
-        random.shuffle(white_cards)
+        # Shuffle decks: a new seed over every card currently in the pack
+        self.room.deck_seed = new_seed()
+        self.room.deck_size = catalog.max_number
+        self.room.black_cursor = 0
+        self.room.white_cursor = 0
+        black_deck, white_deck = room_decks(self.room, catalog)
 
         # Select random czar
         czar = random.choice(players)
 
-        # Deal initial hands
+        # Deal initial hands in memory, then write them in one statement
         for player in players:
             hand = []
             for _ in range(self.INITIAL_HAND_SIZE):
-                if white_cards:
-                    hand.append(white_cards.pop())
+                card = white_deck.draw()
+                if card is not None:
+                    hand.append(card)
             player.hand = hand
-            player.save()
+        Player.objects.bulk_update(players, ['hand'])
 
         # Draw first black card
-        first_question = black_cards.pop() if black_cards else "No questions available!"
+        first_question = catalog.black_text(black_deck.draw(), "No questions available!")
 
         # Set expiry 60s from now
         expiry = timezone.now() + timedelta(seconds=self.SUBMISSION_TIME)
@@ -76,10 +90,10 @@ class GameEngine:
         # Update room state
         self.room.status = 'PLAYING'
         self.room.current_round = 1
-        self.room.czar_id = czar.user.id
+        self.room.czar_id = czar.user_id
         self.room.current_question = first_question
-        self.room.black_deck = list(black_cards)
-        self.room.white_deck = list(white_cards)
+        self.room.black_cursor = black_deck.cursor
+        self.room.white_cursor = white_deck.cursor
         self.room.phase = 'SUBMISSION'
         self.room.round_expires_at = expiry
         self.room.last_round_winner_id = None
@@ -91,6 +105,8 @@ class GameEngine:
         # Clear any old submissions
         Submission.objects.filter(room=self.room).delete()
 
+        self._schedule_round_timer()
+
     def check_all_submitted(self):
         """
         Check if all non-czar players have submitted.
@@ -108,19 +124,25 @@ class GameEngine:
             self.room.phase = 'PICKING'
             self.room.round_expires_at = timezone.now() + timedelta(seconds=self.PICKING_TIME)
             self.room.save()
+            self._schedule_round_timer()
 
+    @metrics.timed('engine')
     @transaction.atomic
     def submit_card(self, player: Player, card_text: str):
         """
         Handle card submission from a player.
         """
+        self._lock_room()
+        player = Player.objects.get(pk=player.pk)
+
         if self.room.phase != 'SUBMISSION':
             raise ValueError("Not in submission phase")
 
-        if str(player.user.id) == str(self.room.czar_id):
+        if str(player.user_id) == str(self.room.czar_id):
             raise ValueError("Czar cannot submit")
 
-        if card_text not in player.hand:
+        card_number = card_catalog.get(self.room.pack_id).find_white(player.hand, card_text)
+        if card_number is None:
             raise ValueError("Card not in hand")
 
         # Check if already submitted
@@ -143,24 +165,25 @@ class GameEngine:
 
         # Remove card from hand
         hand = player.hand
-        hand.remove(card_text)
+        hand.remove(card_number)
         player.hand = hand
         player.save()
 
         # Check if all submitted
         self.check_all_submitted()
 
+    @metrics.timed('engine')
     @transaction.atomic
     def pick_winner(self, winner_player_id: str):
         """
         Process winner selection by czar.
         Replaces pickWinner() in game.js
         """
-        if self.room.phase == 'TRANSITIONING':
-            return  # Already processing
+        self._lock_room()
 
-        if self.room.phase == 'GAME_OVER':
-            return
+        # A repeated or late pick finds the round already advanced
+        if self.room.phase != 'PICKING':
+            raise ValueError("Not in picking phase")
 
         try:
             winner = Player.objects.get(
@@ -196,6 +219,7 @@ class GameEngine:
             self.room.status = 'GAME_OVER'
             self.room.phase = 'GAME_OVER'
             self.room.save()
+            self._schedule_round_timer()
             return
 
         # Prepare next round
@@ -207,30 +231,37 @@ class GameEngine:
 
         # Rotate czar
         current_czar_index = next(
-            (i for i, p in enumerate(players) if str(p.user.id) == str(self.room.czar_id)),
+            (i for i, p in enumerate(players) if str(p.user_id) == str(self.room.czar_id)),
             0
         )
         next_czar = players[(current_czar_index + 1) % len(players)]
 
         # Draw next black card
-        black_deck = list(self.room.black_deck)
-        next_question = black_deck.pop() if black_deck else "Out of questions!"
+        catalog = card_catalog.get(self.room.pack_id)
+        black_deck, white_deck = room_decks(self.room, catalog)
+        next_question = catalog.black_text(black_deck.draw(), "Out of questions!")
 
-        # Replenish hands
-        white_deck = list(self.room.white_deck)
+        # Replenish hands in memory, then write the changed ones in one statement
+        replenished = []
         for player in players:
             hand = list(player.hand)
-            while len(hand) < self.INITIAL_HAND_SIZE and white_deck:
-                hand.append(white_deck.pop())
-            player.hand = hand
-            player.save()
+            while len(hand) < self.INITIAL_HAND_SIZE:
+                card = white_deck.draw()
+                if card is None:
+                    break
+                hand.append(card)
+            if len(hand) != len(player.hand):
+                player.hand = hand
+                replenished.append(player)
+        if replenished:
+            Player.objects.bulk_update(replenished, ['hand'])
 
         # Update room
         self.room.current_round += 1
-        self.room.czar_id = next_czar.user.id
+        self.room.czar_id = next_czar.user_id
         self.room.current_question = next_question
-        self.room.black_deck = black_deck
-        self.room.white_deck = white_deck
+        self.room.black_cursor = black_deck.cursor
+        self.room.white_cursor = white_deck.cursor
         self.room.phase = 'SUBMISSION'
         self.room.round_expires_at = timezone.now() + timedelta(seconds=self.SUBMISSION_TIME)
         self.room.save()
@@ -241,12 +272,17 @@ class GameEngine:
             round_number__lt=self.room.current_round
         ).delete()
 
+        self._schedule_round_timer()
+
+    @metrics.timed('engine')
     @transaction.atomic
     def handle_timeout(self):
         """
         Handle round timeout - auto-submit/auto-pick.
         Replaces handleRoundTimeout() in game.js
         """
+        self._lock_room()
+
         if self.room.phase == 'TRANSITIONING' or self.room.status == 'GAME_OVER':
             return
 
@@ -255,6 +291,7 @@ class GameEngine:
             return
 
         players = list(self.room.players.filter(is_online=True))
+        catalog = card_catalog.get(self.room.pack_id)
         czar_id = self.room.czar_id
         submission_count = Submission.objects.filter(
             room=self.room,
@@ -281,7 +318,7 @@ class GameEngine:
                         room=self.room,
                         player=player,
                         round_number=self.room.current_round,
-                        card_text=random_card
+                        card_text=catalog.white_text(random_card, '')
                     )
 
                     hand = list(player.hand)
@@ -293,6 +330,7 @@ class GameEngine:
             self.room.phase = 'PICKING'
             self.room.round_expires_at = timezone.now() + timedelta(seconds=self.PICKING_TIME)
             self.room.save()
+            self._schedule_round_timer()
             return
 
         # Phase 2: PICKING - Everyone submitted, but Czar hasn't picked
@@ -305,3 +343,71 @@ class GameEngine:
             if submissions:
                 random_winner = random.choice(submissions)
                 self.pick_winner(str(random_winner.player.user.id))
+
+
+class MemoryGameEngine:
+    """
+    GameEngine backed by the in-memory room state store.
+    Same interface as GameEngine; game actions are applied to the live
+    RoomState and persisted asynchronously by the store's writer.
+    """
+
+    def __init__(self, room: Room):
+        from .room_state import room_store
+
+        self.room = room
+        self.store = room_store
+        self.state = room_store.get(room.room_code)
+        if self.state is not None:
+            with self.state.lock:
+                self.state.apply_to(room)
+
+    def _live_state(self):
+        if self.state is None:
+            self.state = self.store.load(self.room.room_code)
+        return self.state
+
+    @metrics.timed('engine')
+    def start_game(self):
+        # Deal through the database engine, then hold the fresh game in memory
+        self.store.discard(self.room.room_code)
+        GameEngine(self.room).start_game()
+        self.state = self.store.load(self.room.room_code)
+
+    def _apply(self, transition):
+        state = self._live_state()
+        with state.lock:
+            try:
+                return transition(state)
+            finally:
+                state.apply_to(self.room)
+                if self.store.write_through:
+                    self.store.flush([state])
+                round_timer.schedule(
+                    state.room_code,
+                    state.round_expires_at if state.status == 'PLAYING' else None
+                )
+
+    def check_all_submitted(self):
+        self._apply(lambda state: state.check_all_submitted())
+
+    @metrics.timed('engine')
+    def submit_card(self, player: Player, card_text: str):
+        self._apply(lambda state: state.submit_card(str(player.user_id), card_text))
+
+    @metrics.timed('engine')
+    def pick_winner(self, winner_player_id: str):
+        self._apply(lambda state: state.pick_winner(winner_player_id))
+
+    @metrics.timed('engine')
+    def handle_timeout(self):
+        if self.state is None and self.room.status != 'PLAYING':
+            return
+        self._apply(lambda state: state.handle_timeout())
+
+
+def get_game_engine(room: Room):
+    """Return the game engine configured by GAME_STATE_ENGINE."""
+    if getattr(settings, 'GAME_STATE_ENGINE', 'database') == 'memory':
+        return MemoryGameEngine(room)
+    return GameEngine(room)
@@ -0,0 +1,76 @@
+"""
+Idempotency keys for game actions.
+
+Clients may send an `Idempotency-Key` header with a game action. The first
+request with a given key runs normally and its response is cached; retries
+with the same key replay the cached response without touching the room.
+A retry that arrives while the first request is still running gets a 409.
+
+Keys live in the default cache: shared Redis when REDIS_URL is set,
+otherwise per process, so retries are only recognised by the same worker.
+"""
+
+import functools
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+IN_PROGRESS = 'in_progress'
+
+
+def _cache_key(scope, key):
+    return f'idempotency:{scope}:{key}'
+
+
+def begin(scope, key):
+    """
+    Claim an idempotency key. Returns (claimed, cached_result) where
+    cached_result is the stored (status, data) pair, IN_PROGRESS, or None.
+    """
+    cache_key = _cache_key(scope, key)
+    ttl = getattr(settings, 'IDEMPOTENCY_KEY_TTL', 600)
+    if cache.add(cache_key, IN_PROGRESS, ttl):
+        return True, None
+    return False, cache.get(cache_key)
+
+
+def complete(scope, key, status, data):
+    """Store the result of a claimed key. Server errors release the key."""
+    cache_key = _cache_key(scope, key)
+    if status >= 500:
+        cache.delete(cache_key)
+    else:
+        cache.set(cache_key, (status, data), getattr(settings, 'IDEMPOTENCY_KEY_TTL', 600))
+
+
+def idempotent(method):
+    """
+    Decorator for APIView handlers that honours the Idempotency-Key header.
+    Keys are scoped to the view, user and room.
+    """
+    @functools.wraps(method)
+    def wrapper(view, request, room_code, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return method(view, request, room_code, *args, **kwargs)
+
+        scope = f'{view.__class__.__name__}:{request.user.id}:{room_code.upper()}'
+        claimed, cached = begin(scope, key)
+        if not claimed:
+            if cached is None or cached == IN_PROGRESS:
+                return Response({'error': 'Request already in progress'}, status=409)
+            status, data = cached
+            response = Response(data, status=status)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = method(view, request, room_code, *args, **kwargs)
+        except Exception:
+            complete(scope, key, 500, None)
+            raise
+        complete(scope, key, response.status_code, response.data)
+        return response
+
+    return wrapper
@@ -0,0 +1,66 @@
+"""
+JSON encoding for WebSocket frames.
+
+Frames are encoded with orjson when it is installed and with the standard
+library otherwise (JSON_ENCODER picks one explicitly). Both produce the
+same compact text, without spaces and with non-ASCII characters left as
+they are, so an encoded frame can be cut apart and reused (see
+RoomStateFrames in core/consumers.py).
+"""
+
+import json
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def backend():
+    """'orjson' or 'json', per the JSON_ENCODER setting."""
+    choice = getattr(settings, 'JSON_ENCODER', 'auto')
+    if choice == 'auto':
+        return 'orjson' if orjson is not None else 'json'
+    if choice == 'orjson' and orjson is None:
+        raise ImproperlyConfigured('JSON_ENCODER is orjson but orjson is not installed')
+    if choice not in ('orjson', 'json'):
+        raise ImproperlyConfigured(f'Unknown JSON_ENCODER {choice!r}')
+    return choice
+
+
+def dumps(obj):
+    """Encode obj as compact JSON text."""
+    if backend() == 'orjson':
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+
+def loads(text):
+    if backend() == 'orjson':
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+class JsonCodecMixin:
+    """
+    AsyncJsonWebsocketConsumer mixin that encodes frames with dumps() and
+    can send frames that are already encoded.
+    """
+
+    @classmethod
+    async def decode_json(cls, text_data):
+        return loads(text_data)
+
+    @classmethod
+    async def encode_json(cls, content):
+        return dumps(content)
+
+    async def send_json(self, content, close=False):
+        await self.send_encoded(await self.encode_json(content), close=close)
+
+    async def send_encoded(self, text, close=False):
+        """Send an encoded JSON frame."""
+        await self.send(text_data=text, close=close)
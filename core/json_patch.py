@@ -0,0 +1,95 @@
+"""
+Minimal JSON Patch (RFC 6902) support for room state deltas.
+Only the add/remove/replace operations needed by the room WebSocket.
+"""
+
+
+def _escape(key):
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+
+def _unescape(token):
+    return token.replace('~1', '/').replace('~0', '~')
+
+
+def make_patch(old, new, path=''):
+    """
+    Build a list of patch operations turning `old` into `new`.
+    Dicts are diffed key by key; lists are diffed element-wise when the
+    length is unchanged, or as tail pops/appends (how decks and hands
+    change). Anything else is replaced wholesale.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({'op': 'remove', 'path': f'{path}/{_escape(key)}'})
+        for key, value in new.items():
+            key_path = f'{path}/{_escape(key)}'
+            if key not in old:
+                ops.append({'op': 'add', 'path': key_path, 'value': value})
+            elif old[key] != value:
+                ops.extend(make_patch(old[key], value, key_path))
+        return ops
+
+    if isinstance(old, list) and isinstance(new, list):
+        if len(old) == len(new):
+            ops = []
+            for index, (old_item, new_item) in enumerate(zip(old, new)):
+                if old_item != new_item:
+                    ops.extend(make_patch(old_item, new_item, f'{path}/{index}'))
+            return ops
+        if len(new) < len(old) and old[:len(new)] == new:
+            return [
+                {'op': 'remove', 'path': f'{path}/{index}'}
+                for index in range(len(old) - 1, len(new) - 1, -1)
+            ]
+        if len(new) > len(old) and new[:len(old)] == old:
+            return [
+                {'op': 'add', 'path': f'{path}/-', 'value': value}
+                for value in new[len(old):]
+            ]
+
+    if old != new:
+        return [{'op': 'replace', 'path': path, 'value': new}]
+    return []
+
+
+def apply_patch(document, ops):
+    """
+    Apply patch operations produced by make_patch to `document`.
+    Containers along the patched paths are copied, the input is not mutated.
+    """
+    for op in ops:
+        if op['path'] == '':
+            document = op['value']
+            continue
+
+        tokens = [_unescape(token) for token in op['path'].split('/')[1:]]
+        document = _apply_at(document, tokens, op)
+    return document
+
+
+def _apply_at(node, tokens, op):
+    node = dict(node) if isinstance(node, dict) else list(node)
+    token = tokens[0]
+
+    if len(tokens) > 1:
+        key = int(token) if isinstance(node, list) else token
+        node[key] = _apply_at(node[key], tokens[1:], op)
+        return node
+
+    if isinstance(node, list):
+        if op['op'] == 'remove':
+            del node[int(token)]
+        elif token == '-':
+            node.append(op['value'])
+        elif op['op'] == 'add':
+            node.insert(int(token), op['value'])
+        else:
+            node[int(token)] = op['value']
+    elif op['op'] == 'remove':
+        del node[token]
+    else:
+        node[token] = op['value']
+    return node
@@ -0,0 +1,392 @@
+"""
+Load harness: plays many synthetic games against the ASGI application.
+
+The application runs in this process, the way a single Daphne worker
+runs it: REST calls go through Django's ASGI handler and sockets through
+the Channels router, on one event loop, against the configured database
+(SQLite or Postgres). Bots authenticate, create and join rooms, play
+full games over the REST endpoints (or ws/room/ game actions) and
+optionally exchange WebRTC signals on ws/video/.
+
+The bots run on the same event loop as the application, so the numbers
+include their overhead. SQLite runs one write transaction at a time, so
+use a local Postgres for capacity numbers. See the run_load_test
+management command.
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+
+from channels.testing import HttpCommunicator, WebsocketCommunicator
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of already sorted values."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(fraction * len(values) + 0.5) - 1))
+    return values[index]
+
+
+class LatencyStats:
+    """Latency samples (ms) and error counts per action."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = Counter()
+
+    def add(self, name, ms):
+        self.samples[name].append(ms)
+
+    def error(self, name):
+        self.errors[name] += 1
+
+    def summary(self):
+        """Rows of (action, count, errors, p50, p95, p99, max)."""
+        rows = []
+        for name in sorted(set(self.samples) | set(self.errors)):
+            values = sorted(self.samples[name])
+            rows.append((
+                name, len(values), self.errors[name],
+                percentile(values, 0.50), percentile(values, 0.95),
+                percentile(values, 0.99), values[-1] if values else 0.0,
+            ))
+        return rows
+
+
+class QueryCounter:
+    """Counts SQL statements on every database connection while installed."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def _attach(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def install(self):
+        connection_created.connect(self._attach)
+        self._attach(connection=connection)
+
+    def uninstall(self):
+        connection_created.disconnect(self._attach)
+        if self in connection.execute_wrappers:
+            connection.execute_wrappers.remove(self)
+
+
+class LoadTestError(Exception):
+    pass
+
+
+class Bot:
+    """One synthetic player: a REST client plus its room (and video) socket."""
+
+    def __init__(self, harness, game, index):
+        self.harness = harness
+        self.game = game
+        self.index = index
+        self.uid = None
+        self.session_key = None
+        self.socket = None
+        self.video = None
+        self.state = None
+        self.changed = asyncio.Event()
+        self.readers = []
+        self.crashed = None
+
+    # ---------- REST ----------
+
+    async def request(self, action, method, path, data=None):
+        body = json.dumps(data).encode() if data is not None else b''
+        headers = [
+            (b'host', b'localhost'),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ]
+        if self.uid:
+            headers.append((b'x-user-id', self.uid.encode()))
+        communicator = HttpCommunicator(self.harness.application, method, path, body, headers)
+        start = time.perf_counter()
+        try:
+            response = await communicator.get_response(timeout=self.harness.timeout)
+        except asyncio.TimeoutError:
+            self.harness.stats.error(action)
+            raise LoadTestError(f'{action} timed out')
+        self.harness.stats.add(action, (time.perf_counter() - start) * 1000)
+        if response['status'] >= 300:
+            self.harness.stats.error(action)
+            raise LoadTestError(f'{action} returned {response["status"]}: {response["body"][:200]!r}')
+        return json.loads(response['body']) if response['body'] else None
+
+    async def authenticate(self):
+        data = await self.request('POST auth/anonymous', 'POST', '/api/auth/anonymous/', {})
+        self.uid = data['uid']
+        self.session_key = data['session_key']
+        self.harness.users.append(self.uid)
+        self.harness.sessions.append(self.session_key)
+
+    # ---------- sockets ----------
+
+    async def connect(self, path, action):
+        socket = WebsocketCommunicator(self.harness.application, f'{path}?user_id={self.uid}')
+        start = time.perf_counter()
+        connected, _ = await socket.connect(timeout=self.harness.timeout)
+        if not connected:
+            self.harness.stats.error(action)
+            raise LoadTestError(f'{action} was refused')
+        first = await socket.receive_json_from(timeout=self.harness.timeout)
+        self.harness.stats.add(action, (time.perf_counter() - start) * 1000)
+        socket.future.add_done_callback(self.on_socket_done)
+        return socket, first
+
+    def on_socket_done(self, future):
+        # The reader never sees a consumer crash, so catch it here
+        if not future.cancelled() and future.exception() is not None and self.crashed is None:
+            error = future.exception()
+            self.crashed = f'Consumer crashed: {type(error).__name__}: {error}'
+            self.changed.set()
+
+    async def connect_room(self):
+        self.socket, first = await self.connect(f'/ws/room/{self.game.code}/', 'ws/room connect')
+        self.on_room_message(first)
+        self.readers.append(asyncio.ensure_future(self.read(self.socket, self.on_room_message)))
+
+    async def connect_video(self):
+        self.video, _ = await self.connect(f'/ws/video/{self.game.code}/', 'ws/video connect')
+        self.readers.append(asyncio.ensure_future(self.read(self.video, self.on_video_message)))
+        await self.video.send_json_to({'action': 'join', 'video_enabled': True, 'audio_enabled': True})
+
+    async def read(self, socket, handle):
+        # Read the output queue directly: a receive timeout would cancel the app
+        while True:
+            message = await socket.output_queue.get()
+            if message['type'] == 'websocket.close':
+                return
+            handle(json.loads(message['text']))
+
+    def on_room_message(self, message):
+        self.harness.messages += 1
+        if message['type'] == 'room_state':
+            if message.get('action') is not None and self.game.action_started is not None:
+                self.harness.stats.add(
+                    'broadcast fan-out', (time.perf_counter() - self.game.action_started) * 1000
+                )
+            self.state = message['data']
+            self.changed.set()
+        elif message['type'] == 'action_result':
+            self.game.results[message['request_id']] = message
+
+    def on_video_message(self, message):
+        self.harness.messages += 1
+        if message['type'] == 'signal':
+            sent = self.game.signals.pop((message['from_player_id'], self.uid), None)
+            if sent is not None:
+                self.harness.stats.add('ws/video signal relay', (time.perf_counter() - sent) * 1000)
+
+    async def wait_for(self, predicate):
+        """Wait until this socket's latest room state satisfies predicate."""
+        deadline = time.monotonic() + self.harness.timeout
+        while not (self.state and predicate(self.state)):
+            if self.crashed:
+                raise LoadTestError(self.crashed)
+            self.changed.clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LoadTestError('Timed out waiting for room state')
+            try:
+                await asyncio.wait_for(self.changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        return self.state
+
+    async def close(self):
+        for reader in self.readers:
+            reader.cancel()
+        for socket in (self.video, self.socket):
+            if socket is not None:
+                try:
+                    await socket.disconnect(timeout=self.harness.timeout)
+                except Exception:
+                    pass
+
+    # ---------- game actions ----------
+
+    async def think(self):
+        if self.harness.think_ms:
+            await asyncio.sleep(random.uniform(0, self.harness.think_ms) / 1000)
+
+    async def game_action(self, action, rest_path, content):
+        self.game.action_started = time.perf_counter()
+        if not self.harness.ws_actions:
+            return await self.request(f'POST rooms/{rest_path}', 'POST', f'/api/rooms/{self.game.code}/{rest_path}/', content)
+
+        name = f'ws/room {action}'
+        self.harness.request_ids += 1
+        request_id = str(self.harness.request_ids)
+        start = time.perf_counter()
+        await self.socket.send_json_to({'action': action, 'request_id': request_id, **content})
+        deadline = time.monotonic() + self.harness.timeout
+        while request_id not in self.game.results:
+            if self.crashed:
+                self.harness.stats.error(name)
+                raise LoadTestError(self.crashed)
+            if time.monotonic() > deadline:
+                self.harness.stats.error(name)
+                raise LoadTestError(f'{name} timed out')
+            await asyncio.sleep(0.005)
+        result = self.game.results.pop(request_id)
+        self.harness.stats.add(name, (time.perf_counter() - start) * 1000)
+        if not result['ok']:
+            self.harness.stats.error(name)
+            raise LoadTestError(f'{name} failed: {result.get("error")}')
+        return result['data']
+
+    async def submit(self, round_number):
+        state = await self.wait_for(lambda s: s['currentRound'] == round_number)
+        hand = state['players'][self.uid]['hand']
+        if not hand:
+            return
+        await self.think()
+        await self.game_action('submit', 'submit', {'card_text': random.choice(hand)})
+
+    async def send_signal(self, target):
+        await self.think()
+        self.game.signals[(self.uid, target.uid)] = time.perf_counter()
+        await self.video.send_json_to({'action': 'offer', 'target_player_id': target.uid, 'sdp': 'v=0'})
+
+
+class Game:
+    """Drives one room from creation to GAME_OVER."""
+
+    def __init__(self, harness, players):
+        self.harness = harness
+        self.bots = [Bot(harness, self, i) for i in range(players)]
+        self.code = None
+        self.action_started = None
+        self.results = {}
+        self.signals = {}
+
+    async def play(self):
+        try:
+            await self._play()
+            self.harness.games_completed += 1
+        except LoadTestError as e:
+            self.harness.failures[str(e)[:120]] += 1
+        finally:
+            for bot in self.bots:
+                await bot.close()
+
+    async def _play(self):
+        harness = self.harness
+        host, *guests = self.bots
+        for bot in self.bots:
+            await bot.authenticate()
+
+        data = await host.request('POST rooms', 'POST', '/api/rooms/', {
+            'host_name': 'Bot 0', 'avatar': '🤖',
+            'pack_id': harness.pack_id, 'max_rounds': harness.rounds,
+        })
+        self.code = data['room_code']
+        harness.rooms.append(self.code)
+        for bot in guests:
+            await bot.think()
+            await bot.request('POST rooms/join', 'POST', f'/api/rooms/{self.code}/join/', {
+                'player_name': f'Bot {bot.index}', 'avatar': '🤖',
+            })
+
+        for bot in self.bots:
+            await bot.connect_room()
+            if harness.video:
+                await bot.connect_video()
+
+        await host.game_action('start', 'start', {})
+        for round_number in range(1, harness.rounds + 1):
+            state = await host.wait_for(
+                lambda s: s['status'] == 'GAME_OVER'
+                or (s['currentRound'] == round_number and s['gameState']['phase'] == 'SUBMISSION')
+            )
+            if state['status'] == 'GAME_OVER':
+                break
+            czar_id = state['gameState']['czarId']
+            czar = next(bot for bot in self.bots if bot.uid == czar_id)
+            submitters = [bot for bot in self.bots if bot is not czar]
+
+            jobs = [bot.submit(round_number) for bot in submitters]
+            if harness.video:
+                jobs += [bot.send_signal(czar) for bot in submitters]
+            await asyncio.gather(*jobs)
+
+            state = await czar.wait_for(
+                lambda s: s['currentRound'] != round_number or s['gameState']['phase'] != 'SUBMISSION'
+            )
+            submissions = state['gameState']['submissions']
+            if state['currentRound'] == round_number and submissions:
+                await czar.think()
+                await czar.game_action('pick_winner', 'pick-winner', {
+                    'winner_id': random.choice(list(submissions)),
+                })
+
+        await host.wait_for(lambda s: s['status'] == 'GAME_OVER')
+        for bot in guests:
+            await bot.request('POST rooms/leave', 'POST', f'/api/rooms/{self.code}/leave/')
+
+
+class LoadHarness:
+    """Runs `rooms` games concurrently and collects their statistics."""
+
+    def __init__(self, application, rooms, min_players=3, max_players=8, rounds=3,
+                 pack_id='standard', ramp=0.0, think_ms=0, ws_actions=False,
+                 video=False, timeout=30.0):
+        self.application = application
+        self.room_count = rooms
+        self.min_players = min_players
+        self.max_players = max_players
+        self.rounds = rounds
+        self.pack_id = pack_id
+        self.ramp = ramp
+        self.think_ms = think_ms
+        self.ws_actions = ws_actions
+        self.video = video
+        self.timeout = timeout
+
+        self.stats = LatencyStats()
+        self.queries = QueryCounter()
+        self.failures = Counter()
+        self.games_completed = 0
+        self.messages = 0
+        self.request_ids = 0
+        self.elapsed = 0.0
+
+        # Created rows, for cleanup
+        self.rooms = []
+        self.users = []
+        self.sessions = []
+
+    async def _start_game(self, delay):
+        await asyncio.sleep(delay)
+        players = random.randint(self.min_players, self.max_players)
+        await Game(self, players).play()
+
+    async def run(self):
+        self.queries.install()
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*(
+                self._start_game(self.ramp * i / max(1, self.room_count))
+                for i in range(self.room_count)
+            ))
+        finally:
+            self.elapsed = time.perf_counter() - start
+            self.queries.uninstall()
@@ -0,0 +1,105 @@
+"""
+Management command comparing RoomDetailSerializer with the hand-built
+room snapshot (core/snapshots.py). Runs on a throwaway room inside a
+transaction that is rolled back.
+"""
+
+import json
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.card_catalog import card_catalog
+from core.game_logic import GameEngine
+from core.models import AnonymousUser, Pack, Player, Room
+from core.serializers import RoomDetailSerializer
+from core.snapshots import load_room_snapshot
+
+
+def serializer_snapshot(room_code):
+    # The database path of build_room_snapshot before core/snapshots.py
+    room = Room.objects.select_related('host', 'pack').prefetch_related(
+        'players__user', 'submissions__player__user'
+    ).get(room_code=room_code)
+    data = RoomDetailSerializer(room, context={'user': None}).data
+    catalog = card_catalog.get(room.pack_id)
+    hands = {
+        str(player.user_id): catalog.white_texts(player.hand)
+        for player in room.players.all()
+    }
+    return data, hands, room.state_revision
+
+
+class Command(BaseCommand):
+    help = 'Benchmark room snapshots: RoomDetailSerializer vs the hand-built builder'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=8)
+        parser.add_argument('--iterations', type=int, default=500)
+        parser.add_argument('--pack', default='standard', help='Card pack to deal from')
+
+    def handle(self, *args, **options):
+        pack = Pack.objects.filter(id=options['pack']).first()
+        if pack is None or not pack.cards.exists():
+            raise CommandError(f"Pack '{options['pack']}' has no cards (run seed_cards first)")
+        # A game needs 3 players to start
+        if not 3 <= options['players'] <= 8:
+            raise CommandError('--players must be between 3 and 8')
+
+        with transaction.atomic():
+            room_code = self.make_room(pack, options['players'])
+            phase = Room.objects.values_list('phase', flat=True).get(room_code=room_code)
+            if phase != 'SUBMISSION':
+                raise CommandError(f'Benchmark room is in {phase}, not mid-round')
+            old, new = serializer_snapshot(room_code), load_room_snapshot(room_code)
+            if json.dumps(old[:2]) != json.dumps(new[:2]):
+                raise CommandError('Snapshots differ')
+
+            results = [
+                self.measure('RoomDetailSerializer', serializer_snapshot, room_code, options['iterations']),
+                self.measure('load_room_snapshot', load_room_snapshot, room_code, options['iterations']),
+            ]
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'{"builder":<22} {"ms/snapshot":>12} {"queries":>8}')
+        for name, ms, queries in results:
+            self.stdout.write(f'{name:<22} {ms:>12.3f} {queries:>8}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{results[0][1] / results[1][1]:.1f}x faster with {options["players"]} players'
+        ))
+
+    def make_room(self, pack, players):
+        """A room mid-round: dealt hands and all but one card submitted."""
+        users = [
+            AnonymousUser.objects.create(session_key=f'bench-{uuid.uuid4().hex}')
+            for _ in range(players)
+        ]
+        room = Room.objects.create(
+            room_code=Room.generate_room_code(), host=users[0], pack=pack
+        )
+        for i, user in enumerate(users):
+            Player.objects.create(
+                user=user, room=room, name=f'Player {i}', avatar='🙂', is_host=i == 0
+            )
+        GameEngine(room).start_game()
+        room.refresh_from_db()
+
+        catalog = card_catalog.get(pack.id)
+        submitters = Player.objects.filter(room=room).exclude(user_id=room.czar_id)
+        for player in list(submitters)[:-1]:
+            GameEngine(Room.objects.get(pk=room.pk)).submit_card(
+                player, catalog.white_text(player.hand[0])
+            )
+        return room.room_code
+
+    def measure(self, name, build, room_code, iterations):
+        with CaptureQueriesContext(connection) as context:
+            build(room_code)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            build(room_code)
+        elapsed = time.perf_counter() - start
+        return name, elapsed * 1000 / iterations, len(context)
@@ -0,0 +1,25 @@
+"""
+Management command to delete finished rooms, idle anonymous users, old
+WebRTC signals and expired sessions. See core/reaper.py.
+"""
+
+from django.core.management.base import BaseCommand
+
+from core.reaper import reap
+
+
+class Command(BaseCommand):
+    help = 'Delete stale rooms, users, video signals and sessions in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Rows deleted per batch')
+        parser.add_argument('--max-batches', type=int, help='Batches per table per run')
+
+    def handle(self, *args, **options):
+        deleted = reap(batch_size=options['batch_size'], max_batches=options['max_batches'])
+        if not deleted:
+            self.stdout.write('Nothing to reap')
+            return
+        for label, count in sorted(deleted.items()):
+            self.stdout.write(f'{label}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Deleted {sum(deleted.values())} rows'))
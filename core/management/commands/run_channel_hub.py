@@ -0,0 +1,29 @@
+"""
+Management command to run a channel hub for multi-worker deployments
+without Redis. See core/channel_hub.py.
+"""
+
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from core.channel_hub import ChannelHubServer
+
+
+class Command(BaseCommand):
+    help = 'Run a channel hub that relays channel layer messages between workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Interface to bind')
+        parser.add_argument('--port', type=int, default=6380, help='Port to listen on')
+        parser.add_argument(
+            '--max-buffer', type=int, default=1024 * 1024,
+            help='Bytes queued for one worker before its messages are dropped',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Channel hub listening on {options['host']}:{options['port']}")
+        try:
+            asyncio.run(ChannelHubServer(options['max_buffer']).serve(options['host'], options['port']))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,104 @@
+"""
+Management command to load-test one worker with synthetic games.
+See core/loadtest.py.
+"""
+
+import asyncio
+import random
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.models import AnonymousUser, Pack, Room
+
+
+def _chunks(values, size=500):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+class Command(BaseCommand):
+    help = 'Play N synthetic games against the ASGI app in this process and report latencies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=100, help='Concurrent games')
+        parser.add_argument('--min-players', type=int, default=3)
+        parser.add_argument('--max-players', type=int, default=8)
+        parser.add_argument('--rounds', type=int, default=3, help='Rounds per game')
+        parser.add_argument('--pack', default='standard', help='Card pack to play with')
+        parser.add_argument('--ramp', type=float, default=5.0,
+                            help='Seconds over which game starts are spread')
+        parser.add_argument('--think-ms', type=int, default=200,
+                            help='Upper bound of the random delay before each bot action')
+        parser.add_argument('--ws-actions', action='store_true',
+                            help='Send game actions over ws/room/ instead of REST')
+        parser.add_argument('--video', action='store_true',
+                            help='Also connect ws/video/ and exchange signals every round')
+        parser.add_argument('--timeout', type=float, default=30.0,
+                            help='Seconds to wait for any single response')
+        parser.add_argument('--seed', type=int, help='Random seed for bot behaviour')
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep the rooms, users and sessions created by the bots')
+
+    def handle(self, *args, **options):
+        from cardsnchaos.asgi import application
+        from core.loadtest import LoadHarness
+
+        # A game needs 3 online players to start
+        if not 3 <= options['min_players'] <= options['max_players'] <= 8:
+            raise CommandError('Players per room must satisfy 3 <= min <= max <= 8')
+        pack = Pack.objects.filter(id=options['pack'], enabled=True).first()
+        if pack is None or not pack.cards.exists():
+            raise CommandError(f"Pack '{options['pack']}' has no cards (run seed_cards first)")
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+        if connection.vendor == 'sqlite' and connection.settings_dict['ENGINE'] != 'cardsnchaos.sqlite3':
+            self.stderr.write(self.style.WARNING(
+                'Concurrent actions on SQLite fail with "database is locked"; '
+                'set SQLITE_IMMEDIATE_TRANSACTIONS=True to make them wait'
+            ))
+
+        harness = LoadHarness(
+            application,
+            rooms=options['rooms'],
+            min_players=options['min_players'],
+            max_players=options['max_players'],
+            rounds=options['rounds'],
+            pack_id=pack.id,
+            ramp=options['ramp'],
+            think_ms=options['think_ms'],
+            ws_actions=options['ws_actions'],
+            video=options['video'],
+            timeout=options['timeout'],
+        )
+        try:
+            asyncio.run(harness.run())
+        finally:
+            if not options['keep']:
+                self.cleanup(harness)
+
+        self.report(harness)
+
+    def cleanup(self, harness):
+        for codes in _chunks(harness.rooms):
+            Room.objects.filter(room_code__in=codes).delete()
+        for ids in _chunks(harness.users):
+            AnonymousUser.objects.filter(id__in=ids).delete()
+        for keys in _chunks(harness.sessions):
+            Session.objects.filter(session_key__in=keys).delete()
+
+    def report(self, harness):
+        elapsed = harness.elapsed or 1e-9
+        self.stdout.write(f'{"action":<28} {"count":>7} {"errors":>6} {"p50":>8} {"p95":>8} {"p99":>8} {"max":>8}')
+        for name, count, errors, p50, p95, p99, worst in harness.stats.summary():
+            self.stdout.write(
+                f'{name:<28} {count:>7} {errors:>6} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {worst:>8.1f}'
+            )
+        self.stdout.write('(latencies in ms)')
+        self.stdout.write('')
+        self.stdout.write(f'Games completed: {harness.games_completed}/{harness.room_count} in {elapsed:.1f}s')
+        self.stdout.write(f'Socket messages received: {harness.messages} ({harness.messages / elapsed:.0f}/s)')
+        self.stdout.write(f'DB queries: {harness.queries.count} ({harness.queries.count / elapsed:.0f}/s)')
+        for reason, count in harness.failures.most_common():
+            self.stdout.write(self.style.ERROR(f'Failed games: {count} x {reason}'))
@@ -0,0 +1,195 @@
+"""
+In-process metrics for the hot paths, served in Prometheus text format.
+
+Each measured call (a REST view, a GameEngine method, a socket handler or
+a room broadcast) records its latency, the SQL statements it ran and the
+bytes it sent into histograms labelled by kind and name. Nested calls are
+all measured, so a view's numbers include the engine method it ran.
+
+Every process keeps its own registry; GET /metrics returns it.
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+PAYLOAD_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+METRICS = {
+    # name -> (help, buckets)
+    'cardsnchaos_call_duration_seconds': ('Time spent per call', DURATION_BUCKETS),
+    'cardsnchaos_call_queries': ('SQL statements run per call', QUERY_BUCKETS),
+    'cardsnchaos_call_payload_bytes': ('Bytes sent per call', PAYLOAD_BUCKETS),
+}
+
+# Measurements running in the current context, innermost last
+_active = ContextVar('metrics_active', default=())
+
+
+def is_enabled():
+    return getattr(settings, 'METRICS_ENABLED', False)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, Prometheus style."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """(le, count) pairs, ending with +Inf."""
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class Registry:
+    """Histograms keyed by (metric, kind, name). Thread-safe."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, metric, kind, name, value):
+        key = (metric, kind, name)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(METRICS[metric][1])
+            histogram.observe(value)
+
+    def get(self, metric, kind, name):
+        return self._histograms.get((metric, kind, name))
+
+    def clear(self):
+        with self._lock:
+            self._histograms = {}
+
+    def render(self):
+        """The registry in Prometheus text exposition format."""
+        with self._lock:
+            items = sorted(self._histograms.items())
+            lines = []
+            for metric, (help_text, _) in METRICS.items():
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} histogram')
+                for (name_metric, kind, name), histogram in items:
+                    if name_metric != metric:
+                        continue
+                    labels = f'kind="{kind}",name="{name}"'
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f'{metric}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(f'{metric}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class Measurement:
+    __slots__ = ('name', 'queries', 'payload')
+
+    def __init__(self, name):
+        self.name = name
+        self.queries = 0
+        self.payload = None  # stays None if the call sent nothing
+
+
+@contextmanager
+def track(kind, name):
+    """
+    Measure the block as one call of `name`. The block may set the
+    measurement's name late; a call left without a name is not recorded.
+    """
+    if not is_enabled():
+        yield None
+        return
+    measurement = Measurement(name)
+    token = _active.set(_active.get() + (measurement,))
+    start = time.perf_counter()
+    try:
+        yield measurement
+    finally:
+        elapsed = time.perf_counter() - start
+        _active.reset(token)
+        name = measurement.name
+        if name is not None:
+            registry.observe('cardsnchaos_call_duration_seconds', kind, name, elapsed)
+            registry.observe('cardsnchaos_call_queries', kind, name, measurement.queries)
+            if measurement.payload is not None:
+                registry.observe('cardsnchaos_call_payload_bytes', kind, name, measurement.payload)
+
+
+def timed(kind, name=None):
+    """Decorator form of track() for functions and coroutine functions."""
+    def decorator(func):
+        label = name or func.__qualname__
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with track(kind, label):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(kind, label):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def add_payload(size):
+    """Count bytes sent towards every running measurement."""
+    for measurement in _active.get():
+        measurement.payload = (measurement.payload or 0) + size
+
+
+def count_query(execute, sql, params, many, context):
+    # Database execute wrapper. Measurements are shared with the threads
+    # that sync_to_async runs database code in, via the copied context.
+    for measurement in _active.get():
+        measurement.queries += 1
+    return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class MeteredSendMixin:
+    """
+    Counts the frames a consumer sends as payload bytes. Goes before
+    JsonCodecMixin, whose send_json() and pre-encoded sends both end in
+    send_encoded().
+    """
+
+    async def send_encoded(self, text, close=False):
+        add_payload(len(text) if text.isascii() else len(text.encode()))
+        await super().send_encoded(text, close=close)
@@ -1,24 +1,33 @@
 """
-WebSocket authentication middleware.
+WebSocket authentication middleware, HTTP room affinity headers and
+REST view metrics.
 """
 
 from channels.db import database_sync_to_async
 from channels.middleware import BaseMiddleware
 from urllib.parse import parse_qs
 from django.contrib.sessions.models import Session
-from .models import AnonymousUser
+from . import affinity, metrics, user_cache
+from .tokens import user_from_token
 
 
 class WebSocketAuthMiddleware(BaseMiddleware):
     """
-    WebSocket middleware to authenticate anonymous users via session cookie
-    or query parameter (for cross-origin WebSocket connections).
+    WebSocket middleware to authenticate anonymous users via signed token,
+    session cookie or query parameter (for cross-origin WebSocket connections).
     """
 
     async def __call__(self, scope, receive, send):
         session_key = None
         user_id = None
 
+        # Signed token: no database lookup needed
+        query_params = parse_qs(scope.get('query_string', b'').decode())
+        user = user_from_token(query_params.get('token', [None])[0])
+        if user is not None:
+            scope['user'] = user
+            return await super().__call__(scope, receive, send)
+
         # Try to get session from cookies first
         headers = dict(scope.get('headers', []))
         cookie_header = headers.get(b'cookie', b'').decode()
@@ -33,8 +42,6 @@ class WebSocketAuthMiddleware(BaseMiddleware):
 
         # Fallback: try query parameters for cross-origin WebSocket
         if not session_key:
-            query_string = scope.get('query_string', b'').decode()
-            query_params = parse_qs(query_string)
             # Support both session_key and user_id params
             if 'session_key' in query_params:
                 session_key = query_params['session_key'][0]
@@ -52,14 +59,60 @@ class WebSocketAuthMiddleware(BaseMiddleware):
 
     @database_sync_to_async
     def get_user_by_session(self, session_key):
-        try:
-            return AnonymousUser.objects.get(session_key=session_key)
-        except AnonymousUser.DoesNotExist:
-            return None
+        return user_cache.get_user_by_session(session_key)
 
     @database_sync_to_async
     def get_user_by_id(self, user_id):
-        try:
-            return AnonymousUser.objects.get(id=user_id)
-        except AnonymousUser.DoesNotExist:
+        return user_cache.get_user_by_id(user_id)
+
+
+class RoomAffinityHeaderMiddleware:
+    """
+    Adds X-Room-Worker to responses for room URLs when room affinity is
+    configured, so the load balancer can pin the room to that worker.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        room_code = match.kwargs.get('room_code') if match else None
+        if room_code and affinity.is_enabled():
+            response['X-Room-Worker'] = affinity.worker_for_room(room_code)
+        return response
+
+
+# Views measured by MetricsMiddleware
+METERED_VIEW_MODULES = ('core.views', 'core.video_views')
+
+
+class MetricsMiddleware:
+    """
+    Records every request to a core REST view under the view class and
+    method (e.g. SubmitCardView.post, CardViewSet.list). Sits first in the
+    stack, so the other middleware's queries and time count too.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with metrics.track('view', None) as measurement:
+            response = self.get_response(request)
+            if measurement is not None:
+                measurement.name = self.view_name(request)
+                if measurement.name and not response.streaming:
+                    metrics.add_payload(len(response.content))
+        return response
+
+    def view_name(self, request):
+        match = getattr(request, 'resolver_match', None)
+        view_class = getattr(match.func, 'cls', None) if match else None
+        if view_class is None or view_class.__module__ not in METERED_VIEW_MODULES:
             return None
+        method = request.method.lower()
+        # ViewSets route methods to actions (list, retrieve, toggle, ...)
+        action = getattr(match.func, 'actions', None) or {}
+        return f'{view_class.__name__}.{action.get(method, method)}'
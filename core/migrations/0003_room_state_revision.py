@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_videocallsignal_videocallparticipant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='state_revision',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
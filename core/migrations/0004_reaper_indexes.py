@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_room_state_revision'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='anonymoususer',
+            index=models.Index(fields=['last_seen'], name='core_anonym_last_se_b5cf75_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['status', 'created_at'], name='core_room_status_033811_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='videocallsignal',
+            index=models.Index(fields=['created_at'], name='core_videoc_created_06417b_idx'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+from django.db import migrations, models
+
+
+def number_cards_and_compact_games(apps, schema_editor):
+    """Number existing cards, then turn stored decks and hands into numbers."""
+    Card = apps.get_model('core', 'Card')
+    Room = apps.get_model('core', 'Room')
+    Player = apps.get_model('core', 'Player')
+
+    numbers = {}  # pack_id -> {(card_type, text): number}
+    for pack_id in Card.objects.values_list('pack_id', flat=True).distinct():
+        cards = list(Card.objects.filter(pack_id=pack_id).order_by('created_at', 'id'))
+        for number, card in enumerate(cards, start=1):
+            card.number = number
+        Card.objects.bulk_update(cards, ['number'])
+        numbers[pack_id] = {(card.card_type, card.text): card.number for card in cards}
+
+    def compact(pack_id, card_type, texts):
+        lookup = numbers.get(pack_id, {})
+        return [lookup[(card_type, text)] for text in texts if (card_type, text) in lookup]
+
+    for room in Room.objects.all():
+        room.black_deck = compact(room.pack_id, 'black', room.black_deck)
+        room.white_deck = compact(room.pack_id, 'white', room.white_deck)
+        room.save(update_fields=['black_deck', 'white_deck'])
+
+    players = list(Player.objects.select_related('room'))
+    for player in players:
+        player.hand = compact(player.room.pack_id, 'white', player.hand)
+    Player.objects.bulk_update(players, ['hand'])
+
+
+def expand_games(apps, schema_editor):
+    """Reverse: turn numbers back into card texts."""
+    Card = apps.get_model('core', 'Card')
+    Room = apps.get_model('core', 'Room')
+    Player = apps.get_model('core', 'Player')
+
+    texts = {}
+    for pack_id, number, text in Card.objects.values_list('pack_id', 'number', 'text'):
+        texts.setdefault(pack_id, {})[number] = text
+
+    def expand(pack_id, numbers):
+        lookup = texts.get(pack_id, {})
+        return [lookup[number] for number in numbers if number in lookup]
+
+    for room in Room.objects.all():
+        room.black_deck = expand(room.pack_id, room.black_deck)
+        room.white_deck = expand(room.pack_id, room.white_deck)
+        room.save(update_fields=['black_deck', 'white_deck'])
+
+    players = list(Player.objects.select_related('room'))
+    for player in players:
+        player.hand = expand(player.room.pack_id, player.hand)
+    Player.objects.bulk_update(players, ['hand'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_reaper_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='number',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(number_cards_and_compact_games, expand_games),
+        migrations.AlterField(
+            model_name='card',
+            name='number',
+            field=models.PositiveIntegerField(editable=False),
+        ),
+        migrations.AddConstraint(
+            model_name='card',
+            constraint=models.UniqueConstraint(fields=('pack', 'number'), name='unique_card_number_per_pack'),
+        ),
+    ]
@@ -0,0 +1,101 @@
+import random
+
+from django.db import migrations, models
+
+
+def _permutation(seed, card_type, size):
+    # Same order as core.decks.permutation
+    numbers = list(range(1, size + 1))
+    random.Random(f'{seed}:{card_type}').shuffle(numbers)
+    return numbers
+
+
+def seed_existing_decks(apps, schema_editor):
+    """
+    Give every room with cards left a seeded deck. The stored order cannot
+    be expressed as a seed, so games in progress get a fresh shuffle with
+    the same number of cards left in each deck.
+    """
+    Card = apps.get_model('core', 'Card')
+    Room = apps.get_model('core', 'Room')
+
+    cards = {}  # pack_id -> {number: card_type}
+    for pack_id, number, card_type in Card.objects.values_list('pack_id', 'number', 'card_type'):
+        cards.setdefault(pack_id, {})[number] = card_type
+
+    for room in Room.objects.all():
+        if not room.black_deck and not room.white_deck:
+            continue
+        pack_cards = cards.get(room.pack_id, {})
+        room.deck_seed = random.getrandbits(63)
+        room.deck_size = max(pack_cards, default=0)
+        for card_type, old_deck, cursor_field in (
+            ('black', room.black_deck, 'black_cursor'),
+            ('white', room.white_deck, 'white_cursor'),
+        ):
+            order = _permutation(room.deck_seed, card_type, room.deck_size)
+            live = [i for i, number in enumerate(order) if pack_cards.get(number) == card_type]
+            keep = min(len(old_deck), len(live))
+            setattr(room, cursor_field, live[-keep] if keep else len(order))
+        room.save(update_fields=['deck_seed', 'deck_size', 'black_cursor', 'white_cursor'])
+
+
+def materialize_decks(apps, schema_editor):
+    """Reverse: write each room's remaining cards back as lists."""
+    Card = apps.get_model('core', 'Card')
+    Room = apps.get_model('core', 'Room')
+
+    cards = {}
+    for pack_id, number, card_type in Card.objects.values_list('pack_id', 'number', 'card_type'):
+        cards.setdefault(pack_id, {})[number] = card_type
+
+    for room in Room.objects.exclude(deck_seed=None):
+        pack_cards = cards.get(room.pack_id, {})
+        for card_type, cursor, deck_field in (
+            ('black', room.black_cursor, 'black_deck'),
+            ('white', room.white_cursor, 'white_deck'),
+        ):
+            order = _permutation(room.deck_seed, card_type, room.deck_size)
+            remaining = [n for n in order[cursor:] if pack_cards.get(n) == card_type]
+            # Old decks were drawn from the end
+            setattr(room, deck_field, remaining[::-1])
+        room.save(update_fields=['black_deck', 'white_deck'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_card_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='deck_seed',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='deck_size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='black_cursor',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='white_cursor',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(seed_existing_decks, materialize_decks),
+        migrations.RemoveField(
+            model_name='room',
+            name='black_deck',
+        ),
+        migrations.RemoveField(
+            model_name='room',
+            name='white_deck',
+        ),
+    ]
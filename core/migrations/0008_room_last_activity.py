@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:48
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def backfill_last_activity(apps, schema_editor):
+    """Existing rooms have no recorded activity; start from their creation."""
+    Room = apps.get_model('core', 'Room')
+    Room.objects.update(last_activity=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_token_user'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='room',
+            name='core_room_status_033811_idx',
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='last_activity',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_last_activity, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['status', 'last_activity'], name='core_room_status_e02e24_idx'),
+        ),
+    ]
@@ -3,9 +3,70 @@ Database models for CardsNChaos game.
 Replaces Firebase Firestore collections.
 """
 
+import copy
 import uuid
 import random
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+
+
+class DirtyFieldsMixin:
+    """
+    Remembers field values as loaded from the database, so save() on an
+    existing row writes only the columns that changed (plus auto_now
+    fields) instead of every column, and nothing if none changed.
+    Pass update_fields explicitly to override.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_loaded_values()
+        return instance
+
+    def _remember_loaded_values(self, fields=None):
+        loaded = {}
+        for field in self._meta.concrete_fields:
+            if field.attname not in self.__dict__:
+                continue  # deferred
+            if fields is None or field.name in fields or field.attname in fields:
+                value = self.__dict__[field.attname]
+                loaded[field.attname] = copy.deepcopy(value) if isinstance(value, (list, dict)) else value
+        if fields is None or not hasattr(self, '_loaded_values'):
+            self._loaded_values = loaded
+        else:
+            self._loaded_values.update(loaded)
+
+    def get_dirty_fields(self):
+        """Names of fields changed since load or last save, or None if unknown."""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname in loaded
+            and self.__dict__.get(field.attname) != loaded[field.attname]
+        ]
+
+    def save(self, *args, **kwargs):
+        if (
+            not args and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert') and not self._state.adding
+        ):
+            dirty = self.get_dirty_fields()
+            if dirty is not None:
+                if not dirty:
+                    return
+                kwargs['update_fields'] = dirty + [
+                    field.name for field in self._meta.concrete_fields
+                    if getattr(field, 'auto_now', False)
+                ]
+        super().save(*args, **kwargs)
+        self._remember_loaded_values(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._remember_loaded_values(fields)
 
 
 class AnonymousUser(models.Model):
@@ -21,11 +82,38 @@ class AnonymousUser(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=['session_key']),
+            models.Index(fields=['last_seen']),
         ]
 
     def __str__(self):
         return f"AnonymousUser {self.id}"
 
+    def touch(self):
+        """Record activity (the reaper ages idle users by last_seen) in one UPDATE."""
+        self.last_seen = timezone.now()
+        AnonymousUser.objects.filter(pk=self.pk).update(last_seen=self.last_seen)
+
+    # Lets views tell a real player from an unauthenticated read-only request
+    is_authenticated = True
+    is_anonymous = False
+
+
+class TokenUser(AnonymousUser):
+    """
+    An AnonymousUser known only by the id in a signed token (core/tokens.py).
+    Its other columns were never loaded, so it refuses to be saved or
+    deleted rather than overwrite the real row with defaults.
+    """
+
+    class Meta:
+        proxy = True
+
+    def save(self, *args, **kwargs):
+        raise NotImplementedError('TokenUser is read-only; load the AnonymousUser row to save it')
+
+    def delete(self, *args, **kwargs):
+        raise NotImplementedError('TokenUser is read-only; load the AnonymousUser row to delete it')
+
 
 class Pack(models.Model):
     """
@@ -57,16 +145,37 @@ class Card(models.Model):
     pack = models.ForeignKey(Pack, on_delete=models.CASCADE, related_name='cards')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Per-pack sequence number (highest in the pack + 1). Decks and hands
+    # store these instead of card texts.
+    number = models.PositiveIntegerField(editable=False)
+
     class Meta:
         indexes = [
             models.Index(fields=['pack', 'card_type']),
         ]
+        constraints = [
+            models.UniqueConstraint(fields=['pack', 'number'], name='unique_card_number_per_pack'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.number is not None:
+            return super().save(*args, **kwargs)
+        # Touching the pack first takes its row lock (the write lock on
+        # SQLite), so cards added to a pack at the same time queue there and
+        # each one reads the highest number after the previous one's insert
+        with transaction.atomic(savepoint=False):
+            Pack.objects.filter(pk=self.pack_id).update(updated_at=timezone.now())
+            last = Card.objects.filter(pack_id=self.pack_id).aggregate(
+                last=models.Max('number')
+            )['last']
+            self.number = (last or 0) + 1
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.card_type}: {self.text[:50]}..."
 
 
-class Room(models.Model):
+class Room(DirtyFieldsMixin, models.Model):
     """
     Game room/session - replaces Firestore 'rooms' collection.
     """
@@ -98,9 +207,12 @@ class Room(models.Model):
     phase = models.CharField(max_length=15, choices=GAME_PHASES, default='WAITING')
     round_expires_at = models.DateTimeField(null=True, blank=True)
 
-    # Decks stored as JSON arrays (card texts)
-    black_deck = models.JSONField(default=list)
-    white_deck = models.JSONField(default=list)
+    # Decks: seeded permutations of card numbers 1..deck_size, drawn from
+    # a cursor per deck (see core/decks.py)
+    deck_seed = models.BigIntegerField(null=True, blank=True)
+    deck_size = models.PositiveIntegerField(default=0)
+    black_cursor = models.PositiveIntegerField(default=0)
+    white_cursor = models.PositiveIntegerField(default=0)
 
     # Last round result
     last_round_winner_id = models.UUIDField(null=True, blank=True)
@@ -108,6 +220,16 @@ class Room(models.Model):
     last_round_winning_card = models.TextField(null=True, blank=True)
     last_round_number = models.IntegerField(null=True, blank=True)
 
+    # Bumped on every broadcast so clients can track room state revisions
+    state_revision = models.PositiveIntegerField(default=0)
+    # Bumped with state_revision; the reaper ages rooms by it
+    last_activity = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'last_activity']),
+        ]
+
     @classmethod
     def generate_room_code(cls):
         """Generate unique 4-letter room code (excluding I, O for clarity)."""
@@ -121,7 +243,7 @@ class Room(models.Model):
         return f"Room {self.room_code} ({self.status})"
 
 
-class Player(models.Model):
+class Player(DirtyFieldsMixin, models.Model):
     """
     Player in a room - extracted from nested 'players' object in Firestore.
     """
@@ -221,6 +343,7 @@ class VideoCallSignal(models.Model):
         indexes = [
             models.Index(fields=['to_player', 'delivered']),
             models.Index(fields=['room', 'created_at']),
+            models.Index(fields=['created_at']),
         ]
         ordering = ['created_at']
 
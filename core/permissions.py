@@ -0,0 +1,19 @@
+"""
+Custom DRF permissions for CardsNChaos.
+"""
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+
+class IsAdminOrDebug(BasePermission):
+    """
+    Allows access to Django staff users, or to anyone when DEBUG is on.
+    Used for debugging endpoints that expose server-side game state.
+    """
+
+    def has_permission(self, request, view):
+        if settings.DEBUG:
+            return True
+        user = request.user
+        return bool(user and getattr(user, 'is_staff', False))
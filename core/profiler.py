@@ -0,0 +1,88 @@
+"""
+Sampling profiler for a live worker.
+
+Samples the stack of every thread in the process via sys._current_frames()
+at a fixed interval and folds the samples into collapsed stacks
+("thread;outer;...;inner count" per line), the input format of
+flamegraph.pl and speedscope. Pure Python, nothing to install and no
+restart needed; the sampling thread itself is left out.
+
+Only one profile runs at a time per process.
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+_running = threading.Lock()
+
+# Paths shortened in frame labels, longest first
+_PREFIXES = sorted(
+    {os.path.dirname(os.path.dirname(__file__)) + os.sep}
+    | {path + os.sep for path in sys.path if path and os.path.isdir(path)},
+    key=len, reverse=True,
+)
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def thread_group(name):
+    """
+    Thread name with numbers masked, so per-request executor threads
+    (ThreadPoolExecutor-12_0, ...) fold into one root.
+    """
+    return re.sub(r'\d+', 'N', name)
+
+
+def frame_label(code):
+    filename = code.co_filename
+    for prefix in _PREFIXES:
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):]
+            break
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+def collapse(frame):
+    """Stack of `frame` as labels, outermost first."""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def sample(seconds, interval):
+    """
+    Sample all other threads every `interval` seconds for `seconds`.
+    Returns a Counter of collapsed stack -> samples.
+    Raises ProfilerBusy if a profile is already running.
+    """
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        own_id = threading.get_ident()
+        stacks = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                name = thread_group(names.get(thread_id, 'thread'))
+                stacks[';'.join([name] + collapse(frame))] += 1
+            time.sleep(interval)
+        return stacks
+    finally:
+        _running.release()
+
+
+def render(stacks):
+    """Collapsed-stack text, heaviest stacks first."""
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
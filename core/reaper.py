@@ -0,0 +1,157 @@
+"""
+Reaper for stale data.
+
+Finished and abandoned rooms (with their players, submissions and video
+state), anonymous users that no longer belong to any game, old WebRTC
+signals and expired sessions are deleted in bounded batches, so no single
+run holds long locks. Every predicate is a range or prefix on an indexed
+column, or a NOT EXISTS subquery on an indexed foreign key (a user's
+player rows and hosted rooms) rather than a join against those tables.
+
+Run it with `python manage.py reap_stale_data` from cron, or set
+REAPER_INTERVAL to run it periodically on the server event loop.
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import AnonymousUser, Player, Room, VideoCallSignal
+from .room_state import room_store
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def delete_in_batches(queryset, batch_size, max_batches, before_delete=None):
+    """
+    Delete rows matching queryset, batch_size primary keys at a time.
+    Returns a Counter of deleted rows per model label, cascades included.
+    """
+    deleted = Counter()
+    for _ in range(max_batches):
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        if before_delete is not None:
+            before_delete(pks)
+        with transaction.atomic():
+            _, per_model = queryset.model.objects.filter(pk__in=pks).delete()
+        deleted.update(per_model)
+        if len(pks) < batch_size:
+            break
+    return deleted
+
+
+def _forget_live_rooms(room_codes):
+    for room_code in room_codes:
+        room_store.discard(room_code)
+
+
+def _users_without_games():
+    """Users not playing in or hosting any room, as a queryset."""
+    return AnonymousUser.objects.filter(
+        ~Exists(Player.objects.filter(user=OuterRef('pk'))),
+        ~Exists(Room.objects.filter(host=OuterRef('pk'))),
+    )
+
+
+def reap(now=None, batch_size=None, max_batches=None):
+    """Run one reaper pass. Returns a Counter of deleted rows per model."""
+    now = now or timezone.now()
+    batch_size = batch_size or _setting('REAPER_BATCH_SIZE', 500)
+    max_batches = max_batches or _setting('REAPER_MAX_BATCHES', 20)
+    deleted = Counter()
+
+    # Finished games
+    finished_cutoff = now - timedelta(hours=_setting('REAPER_FINISHED_ROOM_HOURS', 24))
+    deleted += delete_in_batches(
+        Room.objects.filter(status='GAME_OVER', last_activity__lt=finished_cutoff),
+        batch_size, max_batches, before_delete=_forget_live_rooms
+    )
+
+    # Games nobody finished (lobbies left open, everybody closed the tab)
+    abandoned_cutoff = now - timedelta(hours=_setting('REAPER_ABANDONED_ROOM_HOURS', 48))
+    deleted += delete_in_batches(
+        Room.objects.filter(status__in=['WAITING', 'PLAYING'], last_activity__lt=abandoned_cutoff),
+        batch_size, max_batches, before_delete=_forget_live_rooms
+    )
+
+    # Signals are only useful for a few minutes after they are sent
+    signal_cutoff = now - timedelta(minutes=_setting('REAPER_SIGNAL_MINUTES', 10))
+    deleted += delete_in_batches(
+        VideoCallSignal.objects.filter(created_at__lt=signal_cutoff),
+        batch_size, max_batches
+    )
+
+    # Users left behind by AnonymousAuthView recovery, once their games are gone
+    deleted += delete_in_batches(
+        _users_without_games().filter(session_key__startswith='orphaned_'),
+        batch_size, max_batches
+    )
+
+    # Idle users with no games. Never reap a user whose signed token may
+    # still be valid, or its next request would point at a missing row.
+    user_retention = max(
+        timedelta(days=_setting('REAPER_USER_DAYS', 30)),
+        timedelta(seconds=_setting('AUTH_TOKEN_MAX_AGE', 0)),
+        timedelta(seconds=_setting('SESSION_COOKIE_AGE', 0)),
+    )
+    deleted += delete_in_batches(
+        _users_without_games().filter(last_seen__lt=now - user_retention),
+        batch_size, max_batches
+    )
+
+    # Expired sessions (what clearsessions does, in batches)
+    deleted += delete_in_batches(
+        Session.objects.filter(expire_date__lt=now),
+        batch_size, max_batches
+    )
+
+    return deleted
+
+
+class PeriodicReaper:
+    """Runs reap() every REAPER_INTERVAL seconds on the server event loop."""
+
+    def __init__(self):
+        self._loop = None
+
+    def start(self):
+        interval = _setting('REAPER_INTERVAL', 0)
+        if interval <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        loop.call_later(interval, self._tick, loop)
+
+    def _tick(self, loop):
+        if loop is self._loop and not loop.is_closed():
+            loop.create_task(self._run(loop))
+
+    async def _run(self, loop):
+        try:
+            deleted = await database_sync_to_async(reap)()
+            if deleted:
+                logger.info('Reaper deleted %s', dict(deleted))
+        except Exception:
+            logger.exception('Reaper pass failed')
+        finally:
+            if loop is self._loop and not loop.is_closed():
+                loop.call_later(_setting('REAPER_INTERVAL', 0) or 3600, self._tick, loop)
+
+
+periodic_reaper = PeriodicReaper()
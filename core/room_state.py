@@ -0,0 +1,458 @@
+"""
+In-memory authoritative room state for live games.
+
+When GAME_STATE_ENGINE is 'memory', rooms are loaded into a RoomState on
+game start and submit/pick/timeout become pure state transitions under a
+per-room lock. Changes are persisted by a background write-behind thread
+that flushes every dirty room in a handful of batched statements.
+"""
+
+import atexit
+import logging
+import random
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .card_catalog import card_catalog
+from .decks import room_decks
+from .models import Room, Player, Submission
+
+logger = logging.getLogger(__name__)
+
+ROOM_FIELDS = [
+    'status', 'max_rounds', 'current_round', 'czar_id', 'current_question',
+    'phase', 'round_expires_at',
+    'deck_seed', 'deck_size', 'black_cursor', 'white_cursor',
+    'last_round_winner_id', 'last_round_winner_name',
+    'last_round_winning_card', 'last_round_number', 'state_revision',
+    'last_activity',
+]
+
+
+class PlayerState:
+    """Live state of a player in a room."""
+
+    __slots__ = [
+        'player_id', 'user_id', 'name', 'avatar', 'score',
+        'is_host', 'is_online', 'hand',
+    ]
+
+    def __init__(self, player):
+        self.player_id = player.id
+        self.user_id = str(player.user_id)
+        self.name = player.name
+        self.avatar = player.avatar
+        self.score = player.score
+        self.is_host = player.is_host
+        self.is_online = player.is_online
+        self.hand = list(player.hand)
+
+
+class RoomState:
+    """
+    Live state of a room. Mirrors the Room row plus its players and
+    current-round submissions, and records what still has to be written.
+    """
+
+    def __init__(self, room, players, submissions):
+        self.lock = threading.RLock()
+        self.room_code = room.room_code
+        self.host_id = str(room.host_id)
+        self.pack_id = room.pack_id
+        self.created_at = room.created_at
+        for field in ROOM_FIELDS:
+            setattr(self, field, getattr(room, field))
+
+        self.players = OrderedDict(
+            (str(player.user_id), PlayerState(player)) for player in players
+        )
+        player_users = {p.player_id: p.user_id for p in self.players.values()}
+        self.submissions = OrderedDict(
+            (player_users[sub.player_id], sub.card_text) for sub in submissions
+        )
+
+        # Write-behind bookkeeping
+        self.dirty_fields = set()
+        self.dirty_players = set()
+        self.new_submissions = []
+        self.purge_before_round = None
+
+    # ---------- helpers ----------
+
+    def set(self, field, value):
+        setattr(self, field, value)
+        self.dirty_fields.add(field)
+
+    def online_players(self):
+        return [p for p in self.players.values() if p.is_online]
+
+    def catalog(self):
+        return card_catalog.get(self.pack_id)
+
+    def add_submission(self, player, card_number, card_text):
+        player.hand.remove(card_number)
+        self.submissions[player.user_id] = card_text
+        self.new_submissions.append((player.player_id, self.current_round, card_text))
+        self.dirty_players.add(player.user_id)
+
+    @property
+    def is_dirty(self):
+        return bool(
+            self.dirty_fields or self.dirty_players
+            or self.new_submissions or self.purge_before_round is not None
+        )
+
+    # ---------- transitions (mirror GameEngine) ----------
+
+    def check_all_submitted(self):
+        non_czar_count = len([
+            p for p in self.online_players() if p.user_id != str(self.czar_id)
+        ])
+        if len(self.submissions) >= non_czar_count and self.phase == 'SUBMISSION':
+            self.set('phase', 'PICKING')
+            self.set('round_expires_at', timezone.now() + timedelta(seconds=engine_constant('PICKING_TIME')))
+
+    def submit_card(self, user_id, card_text):
+        if self.phase != 'SUBMISSION':
+            raise ValueError("Not in submission phase")
+
+        if user_id == str(self.czar_id):
+            raise ValueError("Czar cannot submit")
+
+        player = self.players.get(user_id)
+        card_number = None
+        if player is not None:
+            card_number = self.catalog().find_white(player.hand, card_text)
+        if card_number is None:
+            raise ValueError("Card not in hand")
+
+        if user_id in self.submissions:
+            raise ValueError("Already submitted this round")
+
+        self.add_submission(player, card_number, card_text)
+        self.check_all_submitted()
+
+    def pick_winner(self, winner_user_id):
+        if self.phase != 'PICKING':
+            raise ValueError("Not in picking phase")
+
+        winner = self.players.get(str(winner_user_id))
+        if winner is None:
+            raise ValueError("Winner not found")
+
+        winning_card = self.submissions.get(winner.user_id, "Unknown")
+
+        winner.score += 1
+        self.dirty_players.add(winner.user_id)
+
+        self.set('last_round_winner_id', winner.user_id)
+        self.set('last_round_winner_name', winner.name)
+        self.set('last_round_winning_card', winning_card)
+        self.set('last_round_number', self.current_round)
+
+        if self.max_rounds and self.current_round >= self.max_rounds:
+            self.set('status', 'GAME_OVER')
+            self.set('phase', 'GAME_OVER')
+            return
+
+        self.advance_round()
+
+    def advance_round(self):
+        players = self.online_players()
+
+        current_czar_index = next(
+            (i for i, p in enumerate(players) if p.user_id == str(self.czar_id)),
+            0
+        )
+        next_czar = players[(current_czar_index + 1) % len(players)]
+
+        catalog = self.catalog()
+        black_deck, white_deck = room_decks(self, catalog)
+        next_question = catalog.black_text(black_deck.draw(), "Out of questions!")
+        self.set('black_cursor', black_deck.cursor)
+
+        hand_size = engine_constant('INITIAL_HAND_SIZE')
+        for player in players:
+            while len(player.hand) < hand_size:
+                card = white_deck.draw()
+                if card is None:
+                    break
+                player.hand.append(card)
+                self.dirty_players.add(player.user_id)
+        self.set('white_cursor', white_deck.cursor)
+
+        self.set('current_round', self.current_round + 1)
+        self.set('czar_id', next_czar.user_id)
+        self.set('current_question', next_question)
+        self.set('phase', 'SUBMISSION')
+        self.set('round_expires_at', timezone.now() + timedelta(seconds=engine_constant('SUBMISSION_TIME')))
+
+        self.submissions = OrderedDict()
+        self.purge_before_round = self.current_round
+
+    def handle_timeout(self):
+        if self.phase == 'TRANSITIONING' or self.status == 'GAME_OVER':
+            return
+
+        if self.round_expires_at and timezone.now() < self.round_expires_at:
+            return
+
+        players = self.online_players()
+
+        if self.phase == 'SUBMISSION' and len(self.submissions) < len(players) - 1:
+            catalog = self.catalog()
+            for player in players:
+                if player.user_id == str(self.czar_id):
+                    continue
+                if player.user_id not in self.submissions and player.hand:
+                    card_number = random.choice(player.hand)
+                    self.add_submission(player, card_number, catalog.white_text(card_number, ''))
+
+            self.set('phase', 'PICKING')
+            self.set('round_expires_at', timezone.now() + timedelta(seconds=engine_constant('PICKING_TIME')))
+            return
+
+        if self.phase == 'PICKING' and self.submissions:
+            self.pick_winner(random.choice(list(self.submissions)))
+
+    # ---------- views ----------
+
+    def apply_to(self, room):
+        """Copy live state onto a Room instance so callers see fresh values."""
+        for field in ROOM_FIELDS:
+            setattr(room, field, getattr(self, field))
+
+    def snapshot(self):
+        """
+        Shared room data in RoomDetailSerializer's shape (hands blanked),
+        plus user id -> hand.
+        """
+        from .snapshots import build_room_data
+
+        return build_room_data(self, self.players.values(), self.submissions, self.catalog())
+
+    # ---------- persistence ----------
+
+    def take_changes(self):
+        """Detach pending changes for the write-behind flush."""
+        changes = {
+            'fields': {field: getattr(self, field) for field in self.dirty_fields},
+            'players': [
+                (self.players[user_id].player_id,
+                 list(self.players[user_id].hand),
+                 self.players[user_id].score)
+                for user_id in self.dirty_players
+            ],
+            'submissions': self.new_submissions,
+            'purge_before_round': self.purge_before_round,
+        }
+        self.dirty_fields = set()
+        self.dirty_players = set()
+        self.new_submissions = []
+        self.purge_before_round = None
+        return changes
+
+    def restore_changes(self, changes):
+        """Put back changes taken for a flush that failed."""
+        self.dirty_fields.update(changes['fields'])
+        player_users = {p.player_id: p.user_id for p in self.players.values()}
+        self.dirty_players.update(
+            player_users[player_id] for player_id, _, _ in changes['players']
+            if player_id in player_users
+        )
+        self.new_submissions = changes['submissions'] + self.new_submissions
+        if changes['purge_before_round'] is not None:
+            self.purge_before_round = max(
+                changes['purge_before_round'], self.purge_before_round or 0
+            )
+
+
+def engine_constant(name):
+    """Timing and hand-size constants are shared with GameEngine."""
+    from .game_logic import GameEngine
+    return getattr(GameEngine, name)
+
+
+class RoomStateStore:
+    """
+    Process-local registry of live RoomStates with write-behind persistence.
+    """
+
+    def __init__(self):
+        self._rooms = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    # ---------- registry ----------
+
+    def get(self, room_code):
+        """Live state for a room, or None if it is not held in memory."""
+        return self._rooms.get(room_code)
+
+    def load(self, room_code):
+        """Load (or return) the live state for a room."""
+        state = self._rooms.get(room_code)
+        if state is not None:
+            return state
+
+        room = Room.objects.get(room_code=room_code)
+        players = list(room.players.all())
+        submissions = list(
+            Submission.objects.filter(room=room, round_number=room.current_round)
+        )
+        state = RoomState(room, players, submissions)
+
+        with self._lock:
+            state = self._rooms.setdefault(room_code, state)
+        self._ensure_writer()
+        return state
+
+    def discard(self, room_code):
+        """Flush and drop a room's live state."""
+        state = self._rooms.get(room_code)
+        if state is not None:
+            self.flush([state])
+            with self._lock:
+                self._rooms.pop(room_code, None)
+
+    def bump_revision(self, room_code):
+        """Bump a live room's state revision. Returns False if not live."""
+        state = self._rooms.get(room_code)
+        if state is None:
+            return False
+        with state.lock:
+            state.set('state_revision', state.state_revision + 1)
+            state.set('last_activity', timezone.now())
+            if self.write_through:
+                self.flush([state])
+        return True
+
+    def set_player_online(self, room_code, user_id, is_online):
+        """Keep a live room's online flags in sync with Player rows."""
+        state = self._rooms.get(room_code)
+        if state is None:
+            return
+        with state.lock:
+            player = state.players.get(str(user_id))
+            if player is not None:
+                player.is_online = is_online
+
+    # ---------- write-behind ----------
+
+    @property
+    def write_through(self):
+        """A flush interval of 0 disables the writer thread; callers flush inline."""
+        return getattr(settings, 'GAME_STATE_FLUSH_INTERVAL', 0.5) <= 0
+
+    def _ensure_writer(self):
+        if self._thread is not None or self.write_through:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='room-state-writer', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        interval = getattr(settings, 'GAME_STATE_FLUSH_INTERVAL', 0.5)
+        while True:
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Room state flush failed')
+            finally:
+                close_old_connections()
+
+    def flush(self, states=None):
+        """
+        Persist pending changes for the given (or all) live rooms in batched
+        statements, then evict rooms whose game is over.
+        """
+        with self._flush_lock:
+            if states is None:
+                states = list(self._rooms.values())
+
+            room_updates = []
+            player_updates = []
+            new_submissions = []
+            purges = []
+            finished = []
+            taken = []
+
+            for state in states:
+                with state.lock:
+                    if not state.is_dirty:
+                        continue
+                    changes = state.take_changes()
+                    if state.status == 'GAME_OVER':
+                        finished.append(state.room_code)
+                taken.append((state, changes))
+
+                if changes['fields']:
+                    room_updates.append((state.room_code, changes['fields']))
+                player_updates.extend(changes['players'])
+                new_submissions.extend(
+                    Submission(
+                        room_id=state.room_code, player_id=player_id,
+                        round_number=round_number, card_text=card_text
+                    )
+                    for player_id, round_number, card_text in changes['submissions']
+                )
+                if changes['purge_before_round'] is not None:
+                    purges.append((state.room_code, changes['purge_before_round']))
+
+            if room_updates or player_updates or new_submissions or purges:
+                try:
+                    self._write(room_updates, player_updates, new_submissions, purges)
+                except Exception:
+                    # Keep the changes for the next flush instead of losing them
+                    for state, changes in taken:
+                        with state.lock:
+                            state.restore_changes(changes)
+                    raise
+
+            with self._lock:
+                for room_code in finished:
+                    self._rooms.pop(room_code, None)
+
+    @transaction.atomic
+    def _write(self, room_updates, player_updates, new_submissions, purges):
+        # One UPDATE per distinct set of changed columns
+        by_fields = {}
+        for room_code, changed in room_updates:
+            by_fields.setdefault(frozenset(changed), []).append(
+                Room(room_code=room_code, **changed)
+            )
+        for fields, rooms in by_fields.items():
+            Room.objects.bulk_update(rooms, sorted(fields))
+
+        if player_updates:
+            players = [
+                Player(id=player_id, hand=hand, score=score)
+                for player_id, hand, score in player_updates
+            ]
+            Player.objects.bulk_update(players, ['hand', 'score'])
+
+        if new_submissions:
+            Submission.objects.bulk_create(new_submissions, ignore_conflicts=True)
+
+        if purges:
+            stale = Q()
+            for room_code, before_round in purges:
+                stale |= Q(room_id=room_code, round_number__lt=before_round)
+            Submission.objects.filter(stale).delete()
+
+
+room_store = RoomStateStore()
+atexit.register(room_store.flush)
@@ -0,0 +1,121 @@
+"""
+Server-side round timers.
+
+Instead of every client racing to POST /timeout/, the ASGI process keeps
+one asyncio timer per active room and runs GameEngine.handle_timeout when
+the room's round_expires_at passes. Expiry is claimed under a row lock, so
+it is processed once even if several workers track the same room.
+
+The scheduler binds to the event loop on the first RoomConsumer.connect.
+A worker that has never had a room socket open has no timers, and its
+/timeout/ view handles expiry itself as clients call it.
+"""
+
+import asyncio
+import logging
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Room
+
+logger = logging.getLogger(__name__)
+
+
+class RoundTimerScheduler:
+    """
+    Tracks round_expires_at for active rooms on the server event loop.
+    schedule() is thread-safe and may be called from sync views.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._handles = {}  # room_code -> (expires_at, asyncio.TimerHandle)
+
+    @property
+    def is_running(self):
+        return self._loop is not None and not self._loop.is_closed()
+
+    def start(self):
+        """Bind to the running event loop and pick up rooms already in play."""
+        if not getattr(settings, 'ROUND_TIMER_ENABLED', True):
+            return
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._handles = {}
+        loop.create_task(self._bootstrap())
+
+    async def _bootstrap(self):
+        rooms = await database_sync_to_async(list)(
+            Room.objects.filter(
+                status='PLAYING', round_expires_at__isnull=False
+            ).values_list('room_code', 'round_expires_at')
+        )
+        for room_code, expires_at in rooms:
+            self._schedule(room_code, expires_at)
+
+    def schedule(self, room_code, expires_at):
+        """(Re)arm the timer for a room; expires_at=None cancels it."""
+        if not self.is_running:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._schedule, room_code, expires_at)
+        except RuntimeError:
+            # Loop closed between the check and the call
+            self._loop = None
+
+    def _schedule(self, room_code, expires_at):
+        current = self._handles.get(room_code)
+        if current is not None:
+            if current[0] == expires_at:
+                return
+            current[1].cancel()
+            del self._handles[room_code]
+
+        if expires_at is None:
+            return
+
+        delay = max((expires_at - timezone.now()).total_seconds(), 0)
+        handle = self._loop.call_later(delay, self._fire, room_code, expires_at)
+        self._handles[room_code] = (expires_at, handle)
+
+    def _fire(self, room_code, expires_at):
+        self._handles.pop(room_code, None)
+        self._loop.create_task(self._expire(room_code, expires_at))
+
+    async def _expire(self, room_code, expires_at):
+        try:
+            await database_sync_to_async(expire_round)(room_code, expires_at)
+        except Exception:
+            logger.exception('Round timeout failed for room %s', room_code)
+
+
+def expire_round(room_code, expires_at):
+    """
+    Run the timeout for a room if it is still on the given expiry.
+    Returns True if the timeout was processed here.
+    """
+    from .consumers import broadcast_room_update
+    from .game_logic import get_game_engine
+
+    with transaction.atomic():
+        try:
+            room = Room.objects.select_for_update().get(room_code=room_code)
+        except Room.DoesNotExist:
+            return False
+
+        engine = get_game_engine(room)
+        if room.status != 'PLAYING' or room.round_expires_at != expires_at:
+            # Round already moved on (or another worker got here first)
+            return False
+        engine.handle_timeout()
+
+    broadcast_room_update(room_code)
+    return True
+
+
+round_timer = RoundTimerScheduler()
@@ -2,8 +2,14 @@
 DRF serializers for CardsNChaos models.
 """
 
+import hashlib
+import json
+
+from django.conf import settings
 from rest_framework import serializers
 from .models import Pack, Card, Room, Player, Submission
+from .card_catalog import card_catalog
+from .decks import room_decks
 
 
 class PackSerializer(serializers.ModelSerializer):
@@ -14,6 +20,9 @@ class PackSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'enabled', 'card_count', 'created_at', 'updated_at']
 
     def get_card_count(self, obj):
+        # PackViewSet annotates the counts; single packs fall back to queries
+        if hasattr(obj, 'black_count'):
+            return {'black': obj.black_count, 'white': obj.white_count}
         return {
             'black': obj.cards.filter(card_type='black').count(),
             'white': obj.cards.filter(card_type='white').count()
@@ -21,7 +30,7 @@ class PackSerializer(serializers.ModelSerializer):
 
 
 class CardSerializer(serializers.ModelSerializer):
-    pack_id = serializers.CharField(source='pack.id', read_only=True)
+    pack_id = serializers.CharField(read_only=True)
     type = serializers.CharField(source='card_type')
 
     class Meta:
@@ -48,6 +57,8 @@ class PlayerSerializer(serializers.ModelSerializer):
         request_user = self.context.get('user')
         if request_user and str(instance.user.id) != str(request_user.id):
             data['hand'] = []
+        else:
+            data['hand'] = card_catalog.get(instance.room.pack_id).white_texts(instance.hand)
         return data
 
 
@@ -104,6 +115,7 @@ class RoomDetailSerializer(serializers.ModelSerializer):
         # Return as dictionary keyed by user ID (like Firestore)
         players = {}
         request_user = self.context.get('user')
+        catalog = card_catalog.get(obj.pack_id)
 
         for player in obj.players.all():
             player_data = {
@@ -113,7 +125,7 @@ class RoomDetailSerializer(serializers.ModelSerializer):
                 'score': player.score,
                 'isHost': player.is_host,
                 'isOnline': player.is_online,
-                'hand': player.hand if request_user and str(player.user.id) == str(request_user.id) else []
+                'hand': catalog.white_texts(player.hand) if request_user and str(player.user.id) == str(request_user.id) else []
             }
             players[str(player.user.id)] = player_data
 
@@ -134,16 +146,58 @@ class RoomDetailSerializer(serializers.ModelSerializer):
                 'roundNumber': obj.last_round_number
             }
 
-        return {
+        # Deck contents stay server-side; clients only see how many cards are left
+        black_deck, white_deck = room_decks(obj)
+        game_state = {
             'czarId': str(obj.czar_id) if obj.czar_id else None,
             'currentQuestion': obj.current_question,
             'submissions': submissions,
-            'blackDeck': obj.black_deck,
-            'whiteDeck': obj.white_deck,
+            'blackDeckSize': len(black_deck),
+            'whiteDeckSize': len(white_deck),
             'roundExpiresAt': obj.round_expires_at.isoformat() if obj.round_expires_at else None,
             'phase': obj.phase,
             'lastRoundResult': last_round_result
         }
+        if getattr(settings, 'ROOM_STATE_DECK_HASH', False):
+            game_state['deckHash'] = deck_hash(obj)
+        return game_state
+
+
+def deck_hash(room):
+    """Short fingerprint of a room's remaining decks, for consistency checks."""
+    payload = json.dumps(
+        [room.deck_seed, room.deck_size, room.black_cursor, room.white_cursor],
+        separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+class RoomDecksSerializer(serializers.ModelSerializer):
+    """
+    Full deck contents for the admin/debug endpoint.
+    Never used in player-facing room state.
+    """
+    roomCode = serializers.CharField(source='room_code')
+    blackDeck = serializers.SerializerMethodField()
+    whiteDeck = serializers.SerializerMethodField()
+    deckHash = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Room
+        fields = ['roomCode', 'blackDeck', 'whiteDeck', 'deckHash']
+
+    def get_blackDeck(self, obj):
+        catalog = card_catalog.get(obj.pack_id)
+        black_deck, _ = room_decks(obj, catalog)
+        return [catalog.black_text(number) for number in black_deck.remaining()]
+
+    def get_whiteDeck(self, obj):
+        catalog = card_catalog.get(obj.pack_id)
+        _, white_deck = room_decks(obj, catalog)
+        return catalog.white_texts(white_deck.remaining())
+
+    def get_deckHash(self, obj):
+        return deck_hash(obj)
 
 
 class RoomCreateSerializer(serializers.Serializer):
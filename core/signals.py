@@ -0,0 +1,28 @@
+"""
+Signal handlers keeping in-process caches in step with the database.
+Connected in CoreConfig.ready().
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .card_catalog import card_catalog
+from .models import AnonymousUser, Card, Pack
+from .user_cache import user_cache
+
+
+@receiver(post_delete, sender=AnonymousUser)
+def forget_deleted_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance)
+
+
+@receiver(post_save, sender=Card)
+@receiver(post_delete, sender=Card)
+def forget_card_pack(sender, instance, **kwargs):
+    card_catalog.invalidate(instance.pack_id)
+
+
+@receiver(post_save, sender=Pack)
+@receiver(post_delete, sender=Pack)
+def forget_pack(sender, instance, **kwargs):
+    card_catalog.invalidate(instance.pk)
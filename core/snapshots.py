@@ -0,0 +1,127 @@
+"""
+Room snapshots without DRF.
+
+Room state goes out on every broadcast, so it is built by hand instead of
+through RoomDetailSerializer: build_room_data() produces the serializer's
+exact output from plain attributes, and load_room_snapshot() feeds it
+from three values() queries using raw foreign key ids, so no host, user
+or player model instances are loaded. RoomState.snapshot() uses the same
+builder for rooms held in memory.
+"""
+
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.utils import timezone
+
+from .card_catalog import card_catalog
+from .decks import room_decks
+from .models import Player, Room, Submission
+
+ROOM_COLUMNS = (
+    'room_code', 'host_id', 'status', 'pack_id', 'max_rounds', 'current_round',
+    'created_at', 'czar_id', 'current_question', 'phase', 'round_expires_at',
+    'deck_seed', 'deck_size', 'black_cursor', 'white_cursor',
+    'last_round_winner_id', 'last_round_winner_name',
+    'last_round_winning_card', 'last_round_number', 'state_revision',
+)
+PLAYER_COLUMNS = ('id', 'user_id', 'name', 'avatar', 'score', 'is_host', 'is_online', 'hand')
+
+
+def iso_datetime(value):
+    """Format a datetime the way DRF's DateTimeField does."""
+    if value is None:
+        return None
+    if settings.USE_TZ and timezone.is_aware(value):
+        value = value.astimezone(timezone.get_current_timezone())
+    text = value.isoformat()
+    if text.endswith('+00:00'):
+        text = text[:-6] + 'Z'
+    return text
+
+
+def build_room_data(room, players, submissions, catalog):
+    """
+    Shared room data in RoomDetailSerializer's shape with every hand
+    blanked, plus user id -> hand. `room` is a Room-like object (values
+    row or RoomState), `players` have PLAYER_COLUMNS as attributes and
+    `submissions` maps user id -> card text for the current round.
+    """
+    from .serializers import deck_hash
+
+    players_data = {}
+    hands = {}
+    for player in players:
+        user_id = str(player.user_id)
+        players_data[user_id] = {
+            'id': user_id,
+            'name': player.name,
+            'avatar': player.avatar,
+            'score': player.score,
+            'isHost': player.is_host,
+            'isOnline': player.is_online,
+            'hand': []
+        }
+        hands[user_id] = catalog.white_texts(player.hand)
+
+    last_round_result = None
+    if room.last_round_winner_id:
+        last_round_result = {
+            'winnerId': str(room.last_round_winner_id),
+            'winnerName': room.last_round_winner_name,
+            'winningCard': room.last_round_winning_card,
+            'roundNumber': room.last_round_number
+        }
+
+    black_deck, white_deck = room_decks(room, catalog)
+    game_state = {
+        'czarId': str(room.czar_id) if room.czar_id else None,
+        'currentQuestion': room.current_question,
+        'submissions': dict(submissions),
+        'blackDeckSize': len(black_deck),
+        'whiteDeckSize': len(white_deck),
+        'roundExpiresAt': room.round_expires_at.isoformat() if room.round_expires_at else None,
+        'phase': room.phase,
+        'lastRoundResult': last_round_result
+    }
+    if getattr(settings, 'ROOM_STATE_DECK_HASH', False):
+        game_state['deckHash'] = deck_hash(room)
+
+    data = {
+        'roomCode': room.room_code,
+        'hostId': str(room.host_id),
+        'status': room.status,
+        'packId': room.pack_id,
+        'maxRounds': room.max_rounds,
+        'currentRound': room.current_round,
+        'createdAt': iso_datetime(room.created_at),
+        'players': players_data,
+        'gameState': game_state
+    }
+    return data, hands
+
+
+def load_room_snapshot(room_code):
+    """
+    (data, hands, revision) for a room from the database, as built by
+    build_room_data(). Returns (None, {}, None) if the room is gone.
+    """
+    row = Room.objects.filter(room_code=room_code).values(*ROOM_COLUMNS).first()
+    if row is None:
+        return None, {}, None
+    room = SimpleNamespace(**row)
+
+    players = [
+        SimpleNamespace(**player)
+        for player in Player.objects.filter(room_id=room_code).values(*PLAYER_COLUMNS)
+    ]
+    user_ids = {player.id: str(player.user_id) for player in players}
+    submissions = [
+        (user_ids[player_id], card_text)
+        for player_id, card_text in Submission.objects.filter(
+            room_id=room_code, round_number=room.current_round
+        ).values_list('player_id', 'card_text')
+    ]
+
+    data, hands = build_room_data(room, players, submissions, card_catalog.get(room.pack_id))
+    return data, hands, room.state_revision
@@ -0,0 +1,143 @@
+"""
+Room affinity: two AffinityChannelLayer workers (w1, w2) over a channel
+hub, and the consistent hash ring that assigns rooms to them.
+"""
+
+import asyncio
+import string
+from itertools import product
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from core.affinity import AffinityChannelLayer, HashRing
+from core.channel_hub import ChannelHubServer
+
+from .test_channel_hub import TIMEOUT, wait_for
+
+WORKERS = ['w1', 'w2']
+
+
+def room_codes(count=2000):
+    return [''.join(letters) for letters in product(string.ascii_uppercase, repeat=4)][:count]
+
+
+def room_owned_by(worker_id):
+    ring = HashRing(WORKERS)
+    return next(code for code in room_codes() if ring.get(code) == worker_id)
+
+
+class HashRingTests(SimpleTestCase):
+
+    def test_adding_a_worker_only_moves_rooms_to_it(self):
+        before = HashRing(['w1', 'w2', 'w3'])
+        after = HashRing(['w1', 'w2', 'w3', 'w4'])
+        moved = 0
+        for code in room_codes():
+            if before.get(code) != after.get(code):
+                self.assertEqual(after.get(code), 'w4')
+                moved += 1
+        # Roughly a quarter of the rooms, not a reshuffle
+        self.assertGreater(moved, len(room_codes()) * 0.1)
+        self.assertLess(moved, len(room_codes()) * 0.4)
+
+    def test_order_of_workers_does_not_matter(self):
+        ring, reordered = HashRing(['w1', 'w2', 'w3']), HashRing(['w3', 'w1', 'w2'])
+        for code in room_codes(200):
+            self.assertEqual(ring.get(code), reordered.get(code))
+
+
+class AffinityChannelLayerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.group = f'room_{room_owned_by("w1")}'
+
+    def run_with_workers(self, test):
+        async def run():
+            self.hub = ChannelHubServer()
+            server = await self.hub.start('127.0.0.1', 0)
+            remote = {
+                'BACKEND': 'core.channel_hub.HubChannelLayer',
+                'CONFIG': {'hosts': [f'127.0.0.1:{server.sockets[0].getsockname()[1]}']},
+            }
+            self.w1 = AffinityChannelLayer(remote, worker_id='w1', workers=WORKERS)
+            self.w2 = AffinityChannelLayer(remote, worker_id='w2', workers=WORKERS)
+            try:
+                await test()
+            finally:
+                for layer in (self.w1, self.w2):
+                    await self.stop(layer)
+                await wait_for(lambda: not self.hub.owners)
+                server.close()
+                await server.wait_closed()
+        async_to_sync(run)()
+
+    async def stop(self, layer):
+        tasks = list(layer._pumps.values())
+        if layer._listener is not None:
+            tasks.append(layer._listener)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await layer.remote.close()
+
+    async def receive(self, layer, channel):
+        return await asyncio.wait_for(layer.receive(channel), TIMEOUT)
+
+    async def join(self):
+        """One socket on the owner (w1) and one edge socket on w2."""
+        self.local = await self.w1.new_channel()
+        self.edge = await self.w2.new_channel()
+        await self.w1.group_add(self.group, self.local)
+        await self.w2.group_add(self.group, self.edge)
+        await wait_for(lambda: self.w1.edge_counts.get(self.group) == {'w2': 1})
+
+    def test_owner_to_edge(self):
+        async def test():
+            await self.join()
+            await self.w1.group_send(self.group, {'type': 'room.update', 'n': 1})
+            self.assertEqual(await self.receive(self.w1, self.local), {'type': 'room.update', 'n': 1})
+            self.assertEqual(await self.receive(self.w2, self.edge), {'type': 'room.update', 'n': 1})
+        self.run_with_workers(test)
+
+    def test_edge_to_owner(self):
+        async def test():
+            await self.join()
+            # The edge's own sockets via the remote group, the owner's via affinity.forward
+            await self.w2.group_send(self.group, {'type': 'room.update', 'n': 2})
+            self.assertEqual(await self.receive(self.w2, self.edge), {'type': 'room.update', 'n': 2})
+            self.assertEqual(await self.receive(self.w1, self.local), {'type': 'room.update', 'n': 2})
+        self.run_with_workers(test)
+
+    def test_owner_stops_publishing_without_edges(self):
+        async def test():
+            await self.join()
+            pump = self.w2._pumps[self.edge]
+
+            await self.w2.group_discard(self.group, self.edge)
+            await wait_for(lambda: self.group not in self.w1.edge_counts)
+            self.assertEqual(self.w2._pumps, {})
+            await asyncio.sleep(0)
+            self.assertTrue(pump.cancelled())
+
+            with mock.patch.object(
+                self.w1.remote, 'group_send', wraps=self.w1.remote.group_send
+            ) as remote_send:
+                await self.w1.group_send(self.group, {'type': 'room.update'})
+            remote_send.assert_not_called()
+            self.assertEqual(await self.receive(self.w1, self.local), {'type': 'room.update'})
+        self.run_with_workers(test)
+
+    def test_edge_counts_resynced_after_listener_restart(self):
+        async def test():
+            await self.join()
+
+            # The owner's listener dies and its counts are lost
+            await self.stop(self.w1)
+            self.w1.edge_counts = {}
+
+            # The next group_add restarts the listener, which asks w2 for its edges
+            await self.w1.group_add(self.group, await self.w1.new_channel())
+            await wait_for(lambda: self.w1.edge_counts.get(self.group) == {'w2': 1})
+        self.run_with_workers(test)
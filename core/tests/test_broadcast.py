@@ -0,0 +1,118 @@
+"""
+Coalesced room broadcasts: a burst for one room becomes one event and one
+revision bump, labelled with the most significant action.
+"""
+
+import asyncio
+from itertools import permutations
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.broadcast import ACTION_PRIORITY, BroadcastCoalescer, merge_action
+from core.consumers import broadcast_coalescer, broadcast_room_update, room_update_event
+from core.models import Room
+
+from .utils import make_room
+
+
+def revision():
+    return Room.objects.get(pk='ABCD').state_revision
+
+
+class MergeActionTests(SimpleTestCase):
+
+    def test_priority(self):
+        ranked = sorted(ACTION_PRIORITY, key=ACTION_PRIORITY.get)
+        self.assertEqual(ranked, ['update', 'player_left', 'winner_picked', 'game_started'])
+        for count in range(1, len(ranked) + 1):
+            for actions in permutations(ranked, count):
+                merged = None
+                for action in actions:
+                    merged = merge_action(merged, action)
+                self.assertEqual(merged, max(actions, key=ACTION_PRIORITY.get), actions)
+
+    def test_unknown_actions_rank_lowest(self):
+        self.assertEqual(merge_action('custom', 'player_left'), 'player_left')
+        self.assertEqual(merge_action('player_left', 'custom'), 'player_left')
+
+
+@override_settings(GAME_STATE_ENGINE='database', ROOM_BROADCAST_COALESCE_MS=20)
+class BroadcastCoalescerTests(TestCase):
+
+    def setUp(self):
+        make_room()
+        self.build_event = mock.Mock(wraps=room_update_event)
+        self.coalescer = BroadcastCoalescer(self.build_event)
+
+    async def listen(self):
+        layer = get_channel_layer()
+        channel = await layer.new_channel()
+        await layer.group_add('room_ABCD', channel)
+        return layer, channel
+
+    def test_burst_is_one_broadcast(self):
+        before = revision()
+
+        async def run():
+            layer, channel = await self.listen()
+            self.coalescer.bind(asyncio.get_running_loop())
+            for action in ('update', 'winner_picked', 'player_left', 'update'):
+                self.assertTrue(self.coalescer.request('ABCD', action))
+
+            event = await asyncio.wait_for(layer.receive(channel), 2)
+            self.assertEqual(event['type'], 'room_update')
+            self.assertEqual(event['action'], 'winner_picked')
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(layer.receive(channel), 0.1)
+            await layer.group_discard('room_ABCD', channel)
+
+        async_to_sync(run)()
+        self.build_event.assert_called_once_with('ABCD', 'winner_picked')
+        self.assertEqual(revision(), before + 1)
+
+    def test_rooms_are_coalesced_separately(self):
+        async def run():
+            self.coalescer.bind(asyncio.get_running_loop())
+            self.coalescer.request('ABCD', 'game_started')
+            self.coalescer.request('WXYZ', 'update')
+            self.coalescer.request('ABCD', 'update')
+            await asyncio.sleep(0.2)
+
+        async_to_sync(run)()
+        self.assertEqual(
+            sorted(call.args for call in self.build_event.call_args_list),
+            [('ABCD', 'game_started'), ('WXYZ', 'update')],
+        )
+
+    def test_inline_without_loop(self):
+        self.assertFalse(self.coalescer.request('ABCD'))
+
+        async def closed_loop():
+            return asyncio.get_running_loop()
+        self.coalescer.bind(async_to_sync(closed_loop)())
+        self.assertFalse(self.coalescer.request('ABCD'))
+        self.build_event.assert_not_called()
+
+    @override_settings(ROOM_BROADCAST_COALESCE_MS=0)
+    def test_inline_when_disabled(self):
+        async def run():
+            self.coalescer.bind(asyncio.get_running_loop())
+            return self.coalescer.request('ABCD')
+        self.assertFalse(async_to_sync(run)())
+
+    def test_broadcast_room_update_sends_inline(self):
+        before = revision()
+
+        async def run():
+            layer, channel = await self.listen()
+            with mock.patch.object(broadcast_coalescer, '_loop', None):
+                await sync_to_async(broadcast_room_update)('ABCD', 'game_started')
+            event = await asyncio.wait_for(layer.receive(channel), 2)
+            await layer.group_discard('room_ABCD', channel)
+            return event
+
+        self.assertEqual(async_to_sync(run)()['action'], 'game_started')
+        self.assertEqual(revision(), before + 1)
@@ -0,0 +1,50 @@
+"""
+Card numbers stay unique per pack when cards are added concurrently.
+"""
+
+import threading
+
+from django.db import connection
+from django.test import TransactionTestCase
+
+from core.models import Card, Pack
+
+
+class CardNumberTests(TransactionTestCase):
+
+    def test_numbers_are_sequential(self):
+        pack = Pack.objects.create(id='standard', name='Standard')
+        other = Pack.objects.create(id='other', name='Other')
+        for i in range(3):
+            Card.objects.create(pack=pack, card_type='white', text=f'Answer {i}')
+        Card.objects.create(pack=other, card_type='black', text='Question _.')
+        self.assertEqual(list(pack.cards.order_by('number').values_list('number', flat=True)), [1, 2, 3])
+        self.assertEqual(other.cards.get().number, 1)
+
+    def test_concurrent_creates(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('threads cannot share an in-memory SQLite database')
+        pack = Pack.objects.create(id='standard', name='Standard')
+        threads, per_thread = 8, 5
+        barrier = threading.Barrier(threads)
+        errors = []
+
+        def add_cards(index):
+            try:
+                barrier.wait()
+                for i in range(per_thread):
+                    Card.objects.create(pack=pack, card_type='white', text=f'Answer {index}-{i}')
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=add_cards, args=(i,)) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        numbers = sorted(pack.cards.values_list('number', flat=True))
+        self.assertEqual(numbers, list(range(1, threads * per_thread + 1)))
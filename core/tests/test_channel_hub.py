@@ -0,0 +1,132 @@
+"""
+Channel hub: two HubChannelLayer instances (two "workers") talking through
+one ChannelHubServer on a random port.
+"""
+
+import asyncio
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from core.channel_hub import ChannelHubServer, HubChannelLayer
+
+TIMEOUT = 2
+
+
+async def wait_for(predicate):
+    """Poll until the hub has processed what the layers wrote."""
+    for _ in range(200):
+        if predicate():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError('condition not met')
+
+
+class ChannelHubTests(SimpleTestCase):
+
+    def run_with_hub(self, test):
+        async def run():
+            self.hub = ChannelHubServer()
+            server = await self.hub.start('127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            self.w1 = HubChannelLayer(hosts=[f'127.0.0.1:{port}'])
+            self.w2 = HubChannelLayer(hosts=[f'127.0.0.1:{port}'])
+            try:
+                await test()
+            finally:
+                await self.w1.close()
+                await self.w2.close()
+                # Let the hub see both disconnects before the loop goes away
+                await wait_for(lambda: not self.hub.owners)
+                server.close()
+                await server.wait_closed()
+        async_to_sync(run)()
+
+    async def receive(self, layer, channel):
+        return await asyncio.wait_for(layer.receive(channel), TIMEOUT)
+
+    async def assertNothingReceived(self, layer, channel):
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(layer.receive(channel), 0.2)
+
+    def test_send_and_group_send_across_layers(self):
+        async def test():
+            one = await self.w1.new_channel()
+            two = await self.w2.new_channel()
+            await self.w1.group_add('room_ABCD', one)
+            await self.w2.group_add('room_ABCD', two)
+            await wait_for(lambda: len(self.hub.groups.get('room_ABCD', ())) == 2)
+
+            await self.w1.send(two, {'type': 'direct', 'n': 1})
+            self.assertEqual(await self.receive(self.w2, two), {'type': 'direct', 'n': 1})
+
+            await self.w2.group_send('room_ABCD', {'type': 'room.update'})
+            self.assertEqual(await self.receive(self.w1, one), {'type': 'room.update'})
+            self.assertEqual(await self.receive(self.w2, two), {'type': 'room.update'})
+        self.run_with_hub(test)
+
+    def test_group_discard(self):
+        async def test():
+            one = await self.w1.new_channel()
+            two = await self.w2.new_channel()
+            await self.w1.group_add('room_ABCD', one)
+            await self.w2.group_add('room_ABCD', two)
+            await self.w2.group_discard('room_ABCD', two)
+            await wait_for(lambda: self.hub.groups.get('room_ABCD') == {one})
+
+            await self.w1.group_send('room_ABCD', {'type': 'room.update'})
+            self.assertEqual(await self.receive(self.w1, one), {'type': 'room.update'})
+            await self.assertNothingReceived(self.w2, two)
+        self.run_with_hub(test)
+
+    def test_memberships_replayed_after_reconnect(self):
+        async def test():
+            one = await self.w1.new_channel()
+            two = await self.w2.new_channel()
+            await self.w1.group_add('room_ABCD', one)
+            await self.w2.group_add('room_ABCD', two)
+            await wait_for(lambda: len(self.hub.groups.get('room_ABCD', ())) == 2)
+
+            # Drop w2's connection; the hub forgets its channels
+            connection = self.w2._shards()[0]
+            connection.writer.close()
+            await wait_for(lambda: self.hub.groups.get('room_ABCD') == {one})
+
+            # The next write reconnects and replays listen + group_add
+            await self.w2.group_add('room_WXYZ', two)
+            await wait_for(lambda: len(self.hub.groups.get('room_ABCD', ())) == 2)
+            await self.w1.group_send('room_ABCD', {'type': 'room.update'})
+            self.assertEqual(await self.receive(self.w2, two), {'type': 'room.update'})
+        self.run_with_hub(test)
+
+    def test_worker_disconnect_drops_tokens(self):
+        async def test():
+            one = await self.w1.new_channel()
+            two = await self.w2.new_channel()
+            await self.w1.group_add('room_ABCD', one)
+            await self.w2.group_add('room_ABCD', two)
+            await self.w2.group_add('room_WXYZ', two)
+            await wait_for(lambda: self.w2.token in self.hub.owners and len(self.hub.groups) == 2)
+
+            await self.w2.close()
+            await wait_for(lambda: self.w2.token not in self.hub.owners)
+            self.assertEqual(self.hub.groups, {'room_ABCD': {one}})
+            self.assertIn(self.w1.token, self.hub.owners)
+        self.run_with_hub(test)
+
+    def test_slow_worker_messages_dropped(self):
+        hub = ChannelHubServer(max_buffer=100)
+        writer = mock.Mock()
+        writer.is_closing.return_value = False
+        hub.owners['hubslow'] = writer
+
+        writer.transport.get_write_buffer_size.return_value = 100
+        hub.deliver('specific..hubslow!abc', {'type': 'room.update'})
+        self.assertEqual(writer.write.call_count, 1)
+
+        writer.transport.get_write_buffer_size.return_value = 101
+        with self.assertLogs('core.channel_hub', 'WARNING'):
+            hub.deliver('specific..hubslow!abc', {'type': 'room.update'})
+        self.assertEqual(writer.write.call_count, 1)
+        self.assertEqual(hub.dropped, 1)
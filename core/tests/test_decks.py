@@ -0,0 +1,54 @@
+"""
+Seeded decks: sizes are read from the cached running counts.
+"""
+
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core import decks
+from core.card_catalog import PackCatalog
+from core.decks import Deck
+
+
+def catalog(black, white):
+    return PackCatalog(
+        'standard',
+        {number: f'Question {number} _.' for number in black},
+        {number: f'Answer {number}' for number in white},
+    )
+
+
+class DeckTests(SimpleTestCase):
+
+    def test_len_matches_remaining(self):
+        # Number 7 was deleted, 13 is past deck_size (added mid-game)
+        pack = catalog(black=[1, 2, 3, 4], white=[5, 6, 8, 9, 10, 11, 12, 13])
+        for card_type in ('black', 'white'):
+            deck = Deck(pack, card_type, seed=42, size=12)
+            drawn = []
+            while True:
+                self.assertEqual(len(deck), len(deck.remaining()))
+                number = deck.draw()
+                if number is None:
+                    break
+                drawn.append(number)
+            self.assertEqual(len(deck), 0)
+            expected = [n for n in range(1, 13) if n in deck.cards]
+            self.assertEqual(sorted(drawn), expected)
+
+    def test_shuffled_once_per_catalog(self):
+        pack = catalog(black=[1, 2], white=[3, 4, 5])
+        with mock.patch.object(decks, 'permutation', wraps=decks.permutation) as permutation:
+            for cursor in range(4):
+                len(Deck(pack, 'white', seed=7, size=5, cursor=cursor))
+            self.assertEqual(permutation.call_count, 1)
+
+            # A reloaded catalog (cards changed) recounts
+            len(Deck(catalog(black=[1, 2], white=[3, 4]), 'white', seed=7, size=5))
+            self.assertEqual(permutation.call_count, 2)
+
+    def test_no_seed(self):
+        deck = Deck(catalog(black=[1], white=[2]), 'white', seed=None, size=0)
+        self.assertEqual(len(deck), 0)
+        self.assertIsNone(deck.draw())
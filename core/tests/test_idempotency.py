@@ -0,0 +1,62 @@
+"""
+Idempotency-Key on game action views: retries replay, concurrent
+duplicates get a 409, and neither runs the action again.
+"""
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from core import idempotency
+from core.models import Room
+
+from .utils import client_for, make_room
+
+
+@override_settings(GAME_STATE_ENGINE='database', ROOM_BROADCAST_COALESCE_MS=0)
+class IdempotencyKeyTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.room, self.users = make_room()
+        self.host = self.users[0]
+
+    def start(self, key=None, user=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return client_for(user or self.host).post('/api/rooms/ABCD/start/', **headers)
+
+    def test_retry_is_replayed(self):
+        first = self.start('key-1')
+        self.assertEqual(first.status_code, 200, first.content)
+        revision = Room.objects.get(pk='ABCD').state_revision
+
+        retry = self.start('key-1')
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Room.objects.get(pk='ABCD').state_revision, revision)
+
+        # Without the key the action runs again
+        self.assertEqual(self.start().status_code, 200)
+        self.assertGreater(Room.objects.get(pk='ABCD').state_revision, revision)
+
+    def test_errors_are_replayed(self):
+        first = self.start('key-1', user=self.users[1])
+        self.assertEqual(first.status_code, 403)
+        retry = self.start('key-1', user=self.users[1])
+        self.assertEqual(retry.status_code, 403)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+
+    def test_in_progress_key_is_rejected(self):
+        # The first request with this key is still running
+        claimed, _ = idempotency.begin(f'StartGameView:{self.host.id}:ABCD', 'key-1')
+        self.assertTrue(claimed)
+
+        response = self.start('key-1')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Room.objects.get(pk='ABCD').status, 'WAITING')
+
+    def test_keys_are_scoped_to_the_user(self):
+        self.assertEqual(self.start('key-1', user=self.users[1]).status_code, 403)
+        response = self.start('key-1')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
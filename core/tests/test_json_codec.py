@@ -0,0 +1,88 @@
+"""
+WebSocket frame encoding: both encoders agree, and spliced room_state
+frames match what send_json() would send.
+"""
+
+import json
+from unittest import mock, skipIf
+
+from django.test import TestCase, override_settings
+
+from core import json_codec
+from core.consumers import RoomStateFrames, personalize_room_data
+from core.game_logic import GameEngine
+from core.models import Player
+from core.snapshots import load_room_snapshot
+
+from .utils import make_room, make_user
+
+ENCODERS = ['json'] + (['orjson'] if json_codec.orjson is not None else [])
+
+
+class RoomStateFramesTests(TestCase):
+
+    def setUp(self):
+        self.room, self.users = make_room(4)
+        self.pack = self.room.pack
+        # Names that need escaping
+        for i, user in enumerate(self.users):
+            Player.objects.filter(user=user).update(name=f'Spieler "{i}" ü', avatar='🦄')
+        GameEngine(self.room).start_game()
+        self.data, self.hands, self.revision = load_room_snapshot('ABCD')
+
+    def expected(self, user):
+        return json_codec.dumps({
+            'type': 'room_state',
+            'data': personalize_room_data(self.data, self.hands, user),
+            'revision': self.revision,
+            'action': 'game_started',
+        })
+
+    def test_frames_match_send_json(self):
+        outsider = make_user('outsider')
+        for encoder in ENCODERS:
+            with self.subTest(encoder=encoder), override_settings(JSON_ENCODER=encoder):
+                frames = RoomStateFrames()
+                for user in self.users + [outsider, None]:
+                    frame = frames.frame('ABCD', self.data, self.hands, user, self.revision, 'game_started')
+                    self.assertEqual(frame, self.expected(user))
+
+    def test_snapshot_encoded_once_per_revision(self):
+        frames = RoomStateFrames()
+        with mock.patch.object(json_codec, 'dumps', wraps=json_codec.dumps) as dumps:
+            for user in self.users:
+                frames.frame('ABCD', self.data, self.hands, user, self.revision, 'update')
+        self.assertEqual(sum(1 for call in dumps.call_args_list if call.args[0] is self.data), 1)
+
+    def test_cached_snapshot_checked_against_event(self):
+        frames = RoomStateFrames()
+        user = self.users[1]
+        frames.frame('ABCD', self.data, self.hands, user, self.revision, 'update')
+
+        # Another event with the same revision but different data
+        players = dict(self.data['players'])
+        players[str(user.id)] = {**players[str(user.id)], 'score': 5}
+        changed = {**self.data, 'players': players}
+        frame = frames.frame('ABCD', changed, self.hands, user, self.revision, 'update')
+        self.assertEqual(json_codec.loads(frame)['data']['players'][str(user.id)]['score'], 5)
+
+    def test_cache_keyed_by_encoder(self):
+        frames = RoomStateFrames()
+        with mock.patch.object(json_codec, 'dumps', wraps=json_codec.dumps) as dumps:
+            for encoder in ENCODERS:
+                with override_settings(JSON_ENCODER=encoder):
+                    frames.frame('ABCD', self.data, self.hands, None, self.revision, 'update')
+        self.assertEqual(
+            sum(1 for call in dumps.call_args_list if call.args[0] is self.data), len(ENCODERS)
+        )
+
+    @skipIf(json_codec.orjson is None, 'orjson is not installed')
+    def test_encoders_agree(self):
+        message = {'type': 'room_state', 'data': self.data, 'revision': 3, 'ok': True, 'none': None}
+        with override_settings(JSON_ENCODER='json'):
+            stdlib = json_codec.dumps(message)
+        with override_settings(JSON_ENCODER='orjson'):
+            fast = json_codec.dumps(message)
+            self.assertEqual(json_codec.loads(fast), message)
+        self.assertEqual(fast, stdlib)
+        self.assertEqual(json.loads(stdlib), message)
@@ -0,0 +1,169 @@
+"""
+Room state deltas: JSON Patch round trips, and the room WebSocket's
+?protocol=delta full-frame/patch/ack cycle.
+"""
+
+import copy
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from cardsnchaos.asgi import application
+from core.consumers import RoomConsumer, broadcast_room_update, personalize_room_data
+from core.json_patch import apply_patch, make_patch
+from core.models import Player
+from core.snapshots import load_room_snapshot
+
+from .utils import make_room
+
+ROOM = {
+    'status': 'PLAYING',
+    'players': {
+        'a/b': {'name': 'Ann', 'score': 1, 'hand': ['x', 'y', 'z']},
+        'c~d': {'name': 'Bob', 'score': 0, 'hand': []},
+    },
+    'gameState': {'phase': 'SUBMISSION', 'submissions': [{'id': 1, 'text': 'one'}]},
+    'decks': [3, 4],
+}
+
+
+class JsonPatchTests(SimpleTestCase):
+
+    def assertRoundTrip(self, old, new):
+        before = copy.deepcopy(old)
+        patch = make_patch(old, new)
+        self.assertEqual(apply_patch(old, patch), new)
+        self.assertEqual(old, before)  # input not mutated
+        return patch
+
+    def test_nested_dicts(self):
+        new = copy.deepcopy(ROOM)
+        new['players']['a/b']['score'] = 2
+        new['players']['e'] = {'name': 'Cy', 'score': 0, 'hand': []}
+        del new['players']['c~d']
+        new['gameState']['phase'] = 'PICKING'
+        del new['status']
+        patch = self.assertRoundTrip(ROOM, new)
+        self.assertIn({'op': 'replace', 'path': '/players/a~1b/score', 'value': 2}, patch)
+        self.assertIn({'op': 'remove', 'path': '/players/c~0d'}, patch)
+
+    def test_lists(self):
+        cases = {
+            'popped': ['x'],
+            'appended': ['x', 'y', 'z', 'w', 'v'],
+            'changed element': ['x', 'q', 'z'],
+            'reordered': ['z', 'y', 'x'],
+            'replaced': ['q'],
+            'emptied': [],
+        }
+        for name, hand in cases.items():
+            with self.subTest(name):
+                new = copy.deepcopy(ROOM)
+                new['players']['a/b']['hand'] = hand
+                self.assertRoundTrip(ROOM, new)
+
+    def test_lists_of_dicts(self):
+        new = copy.deepcopy(ROOM)
+        new['gameState']['submissions'][0]['text'] = 'uno'
+        new['gameState']['submissions'].append({'id': 2, 'text': 'two'})
+        self.assertRoundTrip(ROOM, new)
+
+        new['gameState']['submissions'] = [{'id': 2, 'text': 'two'}]
+        self.assertRoundTrip(ROOM, new)
+
+    def test_type_changes_and_no_change(self):
+        self.assertEqual(make_patch(ROOM, copy.deepcopy(ROOM)), [])
+        new = {**ROOM, 'decks': {'black': 3}, 'gameState': None}
+        self.assertRoundTrip(ROOM, new)
+        self.assertEqual(apply_patch(ROOM, make_patch(ROOM, [1])), [1])
+
+
+@override_settings(GAME_STATE_ENGINE='database', ROOM_BROADCAST_COALESCE_MS=0)
+class DeltaProtocolTests(TestCase):
+
+    def setUp(self):
+        self.room, self.users = make_room()
+        self.scores = 0
+
+    async def connect(self, protocol='delta'):
+        socket = WebsocketCommunicator(
+            application, f'/ws/room/ABCD/?user_id={self.users[0].id}&protocol={protocol}'
+        )
+        connected, _ = await socket.connect()
+        self.assertTrue(connected)
+        return socket
+
+    async def change_room(self):
+        """Bump a score and broadcast; return the state and revision now current."""
+        self.scores += 1
+        await sync_to_async(Player.objects.filter(user=self.users[1]).update)(score=self.scores)
+        await sync_to_async(broadcast_room_update)('ABCD')
+        data, hands, revision = await sync_to_async(load_room_snapshot)('ABCD')
+        return personalize_room_data(data, hands, self.users[0]), revision
+
+    def test_patches_against_acked_revision(self):
+        async def run():
+            socket = await self.connect()
+            first = await socket.receive_json_from()
+            self.assertEqual(first['type'], 'room_state')
+            base = first['data']
+
+            expected, revision = await self.change_room()
+            patch = await socket.receive_json_from()
+            self.assertEqual(patch['type'], 'room_patch')
+            self.assertEqual(patch['baseRevision'], first['revision'])
+            self.assertEqual(patch['revision'], revision)
+            self.assertEqual(apply_patch(base, patch['patch']), expected)
+
+            # Not acked yet: the next patch is still against the first frame
+            expected, revision = await self.change_room()
+            patch = await socket.receive_json_from()
+            self.assertEqual(patch['baseRevision'], first['revision'])
+            self.assertEqual(apply_patch(base, patch['patch']), expected)
+
+            # After an ack, patches are against the acked revision
+            await socket.send_json_to({'action': 'ack', 'revision': revision})
+            await socket.send_json_to({'action': 'ping'})
+            self.assertEqual(await socket.receive_json_from(), {'type': 'pong'})
+            base, acked = expected, revision
+            expected, revision = await self.change_room()
+            patch = await socket.receive_json_from()
+            self.assertEqual(patch['baseRevision'], acked)
+            self.assertEqual(patch['revision'], revision)
+            self.assertEqual(apply_patch(base, patch['patch']), expected)
+            await socket.disconnect()
+
+        async_to_sync(run)()
+
+    def test_full_frame_after_acked_revision_is_evicted(self):
+        async def run():
+            socket = await self.connect()
+            first = await socket.receive_json_from()
+            received = []
+            for _ in range(3):
+                await sync_to_async(broadcast_room_update)('ABCD')
+                received.append(await socket.receive_json_from())
+            await socket.disconnect()
+            return first, received
+
+        with mock.patch.object(RoomConsumer, 'DELTA_HISTORY', 2):
+            first, received = async_to_sync(run)()
+        # History keeps 2 revisions: the acked first frame is evicted by the
+        # third update, so the client gets a full frame it can rebase on
+        self.assertEqual(
+            [message['type'] for message in received], ['room_patch', 'room_patch', 'room_state']
+        )
+        self.assertTrue(all(message['baseRevision'] == first['revision'] for message in received[:2]))
+
+    def test_unknown_ack_gets_full_frame(self):
+        async def run():
+            socket = await self.connect()
+            first = await socket.receive_json_from()
+            await socket.send_json_to({'action': 'ack', 'revision': first['revision'] + 100})
+            message = await socket.receive_json_from()
+            await socket.disconnect()
+            return message
+
+        self.assertEqual(async_to_sync(run)()['type'], 'room_state')
@@ -0,0 +1,70 @@
+"""
+Lazy authentication: reads without a session create no rows, reads with
+one still resolve the user, and the stats count what was served.
+"""
+
+from unittest import mock
+
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core import authentication
+from core.authentication import LazyAuthStats
+from core.models import AnonymousUser
+from core.user_cache import user_cache
+
+
+@override_settings(LAZY_AUTH=True)
+class LazyAuthTests(TestCase):
+
+    def setUp(self):
+        user_cache.clear()
+        self.client = APIClient()
+        patcher = mock.patch.object(authentication, 'lazy_auth_stats', LazyAuthStats())
+        self.stats = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def session_status(self):
+        response = self.client.get('/api/auth/session/')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_get_without_session_creates_nothing(self):
+        for _ in range(2):
+            response = self.session_status()
+            self.assertEqual(response.json(), {'uid': None, 'authenticated': False})
+            self.assertNotIn('sessionid', response.cookies)
+        self.assertEqual(Session.objects.count(), 0)
+        self.assertEqual(AnonymousUser.objects.count(), 0)
+        # Both reads are counted: they are requests, not rows
+        self.assertEqual(self.stats.as_dict(), {'readsWithoutSession': 2, 'readsWithoutUser': 2})
+
+    def test_existing_session_resolves_on_get(self):
+        uid = self.client.post('/api/auth/anonymous/', {}, format='json').json()['uid']
+        user_cache.clear()
+        self.assertEqual(self.session_status().json(), {'uid': uid, 'authenticated': True})
+        self.assertEqual(AnonymousUser.objects.count(), 1)
+        self.assertEqual(self.stats.as_dict(), {'readsWithoutSession': 0, 'readsWithoutUser': 0})
+
+    def test_session_without_user(self):
+        session = SessionStore()
+        session.create()
+        self.client.cookies['sessionid'] = session.session_key
+
+        self.assertEqual(self.session_status().json()['uid'], None)
+        self.assertEqual(AnonymousUser.objects.count(), 0)
+        self.assertEqual(self.stats.as_dict(), {'readsWithoutSession': 0, 'readsWithoutUser': 1})
+
+    def test_writes_create_session_and_user(self):
+        self.client.post('/api/auth/anonymous/', {}, format='json')
+        self.assertEqual(Session.objects.count(), 1)
+        self.assertEqual(AnonymousUser.objects.count(), 1)
+
+    @override_settings(LAZY_AUTH=False)
+    def test_disabled(self):
+        self.assertTrue(self.session_status().json()['authenticated'])
+        self.assertEqual(Session.objects.count(), 1)
+        self.assertEqual(AnonymousUser.objects.count(), 1)
+        self.assertEqual(self.stats.as_dict(), {'readsWithoutSession': 0, 'readsWithoutUser': 0})
@@ -0,0 +1,100 @@
+"""
+Metrics histograms and the /metrics endpoint.
+"""
+
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.test import Client, TestCase, override_settings
+
+from cardsnchaos.asgi import application
+from core import json_codec, metrics
+
+from .utils import client_for, make_room
+
+
+def count(metric, kind, name):
+    histogram = metrics.registry.get(metric, kind, name)
+    return histogram.count if histogram else 0
+
+
+@override_settings(
+    GAME_STATE_ENGINE='database', ROOM_BROADCAST_COALESCE_MS=0,
+    METRICS_ENABLED=True, METRICS_TOKEN='secret',
+)
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        metrics.registry.clear()
+        self.room, self.users = make_room()
+        self.pack = self.room.pack
+
+    def test_histogram_buckets_are_cumulative(self):
+        for value in (0, 1, 4, 500):
+            metrics.registry.observe('cardsnchaos_call_queries', 'engine', 'test', value)
+        text = metrics.registry.render()
+        labels = 'kind="engine",name="test"'
+        self.assertIn(f'cardsnchaos_call_queries_bucket{{{labels},le="0"}} 1', text)
+        self.assertIn(f'cardsnchaos_call_queries_bucket{{{labels},le="5"}} 3', text)
+        self.assertIn(f'cardsnchaos_call_queries_bucket{{{labels},le="100"}} 3', text)
+        self.assertIn(f'cardsnchaos_call_queries_bucket{{{labels},le="+Inf"}} 4', text)
+        self.assertIn(f'cardsnchaos_call_queries_sum{{{labels}}} 505', text)
+        self.assertIn(f'cardsnchaos_call_queries_count{{{labels}}} 4', text)
+
+    def test_rest_action_records_view_and_engine(self):
+        response = client_for(self.users[0]).post('/api/rooms/ABCD/start/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        view = metrics.registry.get('cardsnchaos_call_queries', 'view', 'StartGameView.post')
+        engine = metrics.registry.get('cardsnchaos_call_queries', 'engine', 'GameEngine.start_game')
+        self.assertEqual(view.count, 1)
+        self.assertEqual(engine.count, 1)
+        self.assertGreater(engine.sum, 0)
+        self.assertGreater(view.sum, engine.sum)
+        payload = metrics.registry.get('cardsnchaos_call_payload_bytes', 'view', 'StartGameView.post')
+        self.assertEqual(payload.sum, len(response.content))
+        self.assertEqual(count('cardsnchaos_call_duration_seconds', 'broadcast', 'broadcast_room_update'), 1)
+
+    def test_viewset_actions_are_named(self):
+        Client().get('/api/packs/')
+        self.assertEqual(count('cardsnchaos_call_duration_seconds', 'view', 'PackViewSet.list'), 1)
+
+    def test_consumer_records_sent_bytes(self):
+        async_to_sync(self._ping)()
+        payload = metrics.registry.get(
+            'cardsnchaos_call_payload_bytes', 'consumer', 'RoomConsumer.receive_json'
+        )
+        self.assertEqual(payload.count, 1)
+        self.assertEqual(payload.sum, len(json_codec.dumps({'type': 'pong'})))
+
+    async def _ping(self):
+        socket = WebsocketCommunicator(application, f'/ws/room/ABCD/?user_id={self.users[0].id}')
+        connected, _ = await socket.connect()
+        self.assertTrue(connected)
+        await socket.receive_json_from()
+        await socket.send_json_to({'action': 'ping'})
+        self.assertEqual(await socket.receive_json_from(), {'type': 'pong'})
+        await socket.disconnect()
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        client_for(self.users[0]).post('/api/rooms/ABCD/start/', {}, format='json')
+        self.assertEqual(metrics.registry.render().count('_count{'), 0)
+
+    def test_endpoint(self):
+        Client().get('/api/packs/')
+        response = Client().get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn(b'name="PackViewSet.list"', response.content)
+
+        self.assertEqual(Client().get('/metrics').status_code, 403)
+        self.assertEqual(Client().get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+
+    def test_endpoint_without_token(self):
+        with self.settings(METRICS_TOKEN=''):
+            self.assertEqual(Client().get('/metrics').status_code, 403)
+            with self.settings(DEBUG=True):
+                self.assertEqual(Client().get('/metrics').status_code, 200)
+        with self.settings(METRICS_ENABLED=False):
+            response = Client().get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 404)
@@ -0,0 +1,74 @@
+"""
+Picking a winner only counts in the PICKING phase, for both game engines.
+"""
+
+from django.test import TestCase, override_settings
+
+from core.card_catalog import card_catalog
+from core.models import Player
+from core.room_state import room_store
+
+from .utils import client_for, make_room
+
+
+class PickWinnerTests(TestCase):
+
+    def setUp(self):
+        self.room, self.users = make_room(4, max_rounds=1)
+        self.pack = self.room.pack
+
+    def tearDown(self):
+        room_store.discard('ABCD')
+
+    def post(self, user, path, data=None):
+        return client_for(user).post(f'/api/rooms/ABCD/{path}', data or {}, format='json')
+
+    def room_data(self):
+        return client_for(self.users[0]).get('/api/rooms/ABCD/').json()
+
+    def submit(self, user):
+        state = room_store.get('ABCD')
+        if state is not None:
+            hand = state.players[str(user.id)].hand
+        else:
+            hand = Player.objects.get(user=user, room=self.room).hand
+        card_text = card_catalog.get(self.pack.id).white_text(hand[0])
+        response = self.post(user, 'submit/', {'card_text': card_text})
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def assertPickRejected(self, czar, winner):
+        response = self.post(czar, 'pick-winner/', {'winner_id': str(winner.id)})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Not in picking phase'})
+
+    def assert_pick_counts_once(self):
+        self.assertEqual(self.post(self.users[0], 'start/').status_code, 200)
+        czar_id = self.room_data()['gameState']['czarId']
+        czar = next(user for user in self.users if str(user.id) == czar_id)
+        submitters = [user for user in self.users if user is not czar]
+        winner = submitters[0]
+
+        # Too early: the round is still collecting cards
+        self.assertPickRejected(czar, winner)
+
+        for user in submitters:
+            self.submit(user)
+        self.assertEqual(self.room_data()['gameState']['phase'], 'PICKING')
+
+        response = self.post(czar, 'pick-winner/', {'winner_id': str(winner.id)})
+        self.assertEqual(response.status_code, 200, response.content)
+
+        # Duplicate: the game is over and the czar has not rotated
+        self.assertPickRejected(czar, winner)
+
+        data = self.room_data()
+        self.assertEqual(data['players'][str(winner.id)]['score'], 1)
+        self.assertEqual(data['status'], 'GAME_OVER')
+
+    @override_settings(GAME_STATE_ENGINE='database')
+    def test_database_engine(self):
+        self.assert_pick_counts_once()
+
+    @override_settings(GAME_STATE_ENGINE='memory', GAME_STATE_FLUSH_INTERVAL=0)
+    def test_memory_engine(self):
+        self.assert_pick_counts_once()
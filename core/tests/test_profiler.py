@@ -0,0 +1,73 @@
+"""
+Sampling profiler endpoint.
+"""
+
+import threading
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core import profiler
+
+
+def spin_until(event):
+    while not event.is_set():
+        sum(range(1000))
+
+
+@override_settings(PROFILER_ENABLED=True, DEBUG=False)
+class ProfileViewTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+
+    def test_samples_other_threads(self):
+        stop = threading.Event()
+        worker = threading.Thread(target=spin_until, args=(stop,), name='Spinner-7')
+        worker.start()
+        try:
+            response = self.client.get('/api/admin/profile/?seconds=0.2&interval_ms=5')
+        finally:
+            stop.set()
+            worker.join()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('.folded"', response['Content-Disposition'])
+        lines = response.content.decode().splitlines()
+        spinner = [line for line in lines if line.startswith('Spinner-N;')]
+        self.assertTrue(spinner)
+        stack, count = spinner[0].rsplit(' ', 1)
+        self.assertIn('spin_until (core/tests/test_profiler.py:', stack)
+        self.assertGreater(int(count), 0)
+        # The sampling thread leaves itself out
+        self.assertFalse(any('(core/profiler.py:' in line for line in lines))
+
+    def test_staff_only(self):
+        response = APIClient().get('/api/admin/profile/?seconds=0.1')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(DEBUG=True)
+    def test_staff_only_with_debug(self):
+        player = APIClient()
+        player.force_login(User.objects.create_user('player'))
+        for client in (player, APIClient()):
+            response = client.get('/api/admin/profile/?seconds=0.1')
+            self.assertEqual(response.status_code, 403)
+
+    @override_settings(PROFILER_ENABLED=False)
+    def test_disabled(self):
+        response = self.client.get('/api/admin/profile/?seconds=0.1')
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(PROFILER_MAX_SECONDS=5)
+    def test_rejects_bad_parameters(self):
+        for query in ('seconds=abc', 'seconds=0', 'seconds=6', 'interval_ms=0'):
+            response = self.client.get(f'/api/admin/profile/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_one_profile_at_a_time(self):
+        with profiler._running:
+            response = self.client.get('/api/admin/profile/?seconds=0.1')
+        self.assertEqual(response.status_code, 409)
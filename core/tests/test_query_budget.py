@@ -0,0 +1,396 @@
+"""
+Query and time budget for every endpoint and consumer action.
+
+Plays a full 8-player game over the REST API and over both WebSockets
+against SQLite, measuring the SQL queries and wall time of each action
+(the worst of all its calls). A test fails when an action goes over its
+query budget in query_budget.json, or has no entry.
+
+After an intended change, rewrite the budget with
+
+    QUERY_BUDGET_UPDATE=1 python manage.py test core.tests.test_query_budget
+
+Wall time depends on the machine, so time budgets are only checked with
+QUERY_BUDGET_CHECK_TIME=1 (for comparing runs on one machine).
+"""
+
+import json
+import math
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import timedelta
+from pathlib import Path
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from cardsnchaos.asgi import application
+from core.card_catalog import card_catalog
+from core.models import Player, Room
+from core.user_cache import user_cache
+
+from .utils import client_for, make_pack, make_room
+
+BUDGET_PATH = Path(__file__).with_name('query_budget.json')
+UPDATE_BUDGET = os.environ.get('QUERY_BUDGET_UPDATE') == '1'
+CHECK_TIME = os.environ.get('QUERY_BUDGET_CHECK_TIME') == '1'
+
+# Written budgets allow this much over the measured time
+TIME_HEADROOM = 5
+MIN_TIME_BUDGET_MS = 100
+
+PLAYERS = 8
+
+measured = {}  # action -> {'queries': int, 'ms': float}, across all tests
+
+
+def load_budget():
+    with open(BUDGET_PATH) as f:
+        return json.load(f)
+
+
+def tearDownModule():
+    if not UPDATE_BUDGET:
+        return
+    budget = load_budget() if BUDGET_PATH.exists() else {}
+    for name, result in measured.items():
+        budget[name] = {
+            'queries': result['queries'],
+            'ms': max(MIN_TIME_BUDGET_MS, math.ceil(result['ms'] * TIME_HEADROOM)),
+        }
+    with open(BUDGET_PATH, 'w') as f:
+        json.dump(dict(sorted(budget.items())), f, indent=2)
+        f.write('\n')
+
+
+@override_settings(
+    GAME_STATE_ENGINE='database',
+    ROOM_BROADCAST_COALESCE_MS=0,  # broadcasts are built inside the action being measured
+    REAPER_INTERVAL=0,
+    AUTH_TOKENS_ENABLED=False,
+)
+class QueryBudgetTestCase(TestCase):
+
+    def setUp(self):
+        card_catalog.invalidate()
+        user_cache.clear()
+        self.results = {}
+        self.request_ids = 0
+
+    def tearDown(self):
+        for name, result in self.results.items():
+            previous = measured.get(name)
+            if previous is None:
+                measured[name] = dict(result)
+            else:
+                previous['queries'] = max(previous['queries'], result['queries'])
+                previous['ms'] = max(previous['ms'], result['ms'])
+
+    def record(self, name, queries, ms):
+        result = self.results.setdefault(name, {'queries': 0, 'ms': 0.0})
+        result['queries'] = max(result['queries'], queries)
+        result['ms'] = max(result['ms'], ms)
+
+    @contextmanager
+    def measure(self, name):
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            yield
+            elapsed = (time.perf_counter() - start) * 1000
+        self.record(name, len(context), elapsed)
+
+    @asynccontextmanager
+    async def measure_async(self, name):
+        # Consumers run their database work on the test's thread, so the
+        # capture has to be entered, left and read there too
+        context = CaptureQueriesContext(connection)
+        await sync_to_async(context.__enter__)()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            await sync_to_async(context.__exit__)(None, None, None)
+        self.record(name, await sync_to_async(len)(context), elapsed)
+
+    def assertWithinBudget(self):
+        if UPDATE_BUDGET:
+            return
+        budget = load_budget()
+        problems = []
+        for name, result in sorted(self.results.items()):
+            limit = budget.get(name)
+            if limit is None:
+                problems.append(f'{name}: no budget (measured {result["queries"]} queries)')
+                continue
+            if result['queries'] > limit['queries']:
+                problems.append(f'{name}: {result["queries"]} queries, budget {limit["queries"]}')
+            if CHECK_TIME and result['ms'] > limit['ms']:
+                problems.append(f'{name}: {result["ms"]:.0f} ms, budget {limit["ms"]} ms')
+        if problems:
+            self.fail('Over budget:\n' + '\n'.join(problems))
+
+    # ---------- REST helpers ----------
+
+    def call(self, name, client, method, url, data=None, expect=None):
+        with self.measure(name):
+            response = getattr(client, method)(url, data, format='json')
+        if expect is not None:
+            self.assertEqual(response.status_code, expect, response.content)
+        else:
+            self.assertLess(response.status_code, 300, response.content)
+        return response
+
+    def make_room(self):
+        """Waiting room with PLAYERS players, set up without the API."""
+        return make_room(PLAYERS)[1]
+
+
+class RestBudgetTests(QueryBudgetTestCase):
+
+    def test_full_game(self):
+        make_pack()
+
+        users = []
+        for i in range(PLAYERS):
+            response = self.call('POST /api/auth/anonymous/', APIClient(), 'post', '/api/auth/anonymous/', {})
+            users.append(response.json()['uid'])
+        clients = [APIClient() for _ in users]
+        for client, uid in zip(clients, users):
+            client.credentials(HTTP_X_USER_ID=uid)
+        host = clients[0]
+
+        self.call('GET /api/auth/session/', host, 'get', '/api/auth/session/')
+        with override_settings(DEBUG=True):
+            self.call('GET /api/auth/lazy-stats/', APIClient(), 'get', '/api/auth/lazy-stats/')
+
+        response = self.call('POST /api/rooms/', host, 'post', '/api/rooms/', {
+            'host_name': 'Host', 'avatar': '🙂', 'pack_id': 'standard', 'max_rounds': 3,
+        }, expect=201)
+        code = response.json()['room_code']
+        room_url = f'/api/rooms/{code}'
+
+        for i, client in enumerate(clients[1:], start=1):
+            self.call('POST /api/rooms/<code>/join/', client, 'post', f'{room_url}/join/', {
+                'player_name': f'Player {i}', 'avatar': '🙂',
+            })
+        self.call('PATCH /api/rooms/<code>/settings/', host, 'patch', f'{room_url}/settings/', {
+            'max_rounds': 3,
+        })
+        self.call('GET /api/rooms/<code>/affinity/', APIClient(), 'get', f'{room_url}/affinity/')
+
+        self.call('POST /api/rooms/<code>/start/', host, 'post', f'{room_url}/start/')
+        for client in clients:
+            self.call('GET /api/rooms/<code>/', client, 'get', f'{room_url}/')
+        with override_settings(DEBUG=True):
+            self.call('GET /api/rooms/<code>/decks/', host, 'get', f'{room_url}/decks/')
+
+        catalog = card_catalog.get('standard')
+        by_uid = dict(zip(users, clients))
+        for _ in range(2):
+            room = Room.objects.get(pk=code)
+            czar = str(room.czar_id)
+            for player in Player.objects.filter(room=room).exclude(user_id=room.czar_id):
+                self.call('POST /api/rooms/<code>/submit/', by_uid[str(player.user_id)], 'post',
+                          f'{room_url}/submit/', {'card_text': catalog.white_text(player.hand[0])})
+            winner = next(uid for uid in users if uid != czar)
+            self.call('POST /api/rooms/<code>/pick-winner/', by_uid[czar], 'post',
+                      f'{room_url}/pick-winner/', {'winner_id': winner})
+
+        # Last round runs out the clock: auto-submit, then auto-pick
+        for _ in range(2):
+            Room.objects.filter(pk=code).update(round_expires_at=timezone.now() - timedelta(seconds=1))
+            self.call('POST /api/rooms/<code>/timeout/', host, 'post', f'{room_url}/timeout/')
+        self.assertEqual(Room.objects.get(pk=code).status, 'GAME_OVER')
+
+        self.call('POST /api/rooms/<code>/leave/', clients[-1], 'post', f'{room_url}/leave/')
+
+        self.assertWithinBudget()
+
+    def test_video_call(self):
+        users = self.make_room()
+        clients = [client_for(user) for user in users]
+        video_url = '/api/rooms/ABCD/video'
+
+        for client in clients:
+            self.call('POST /api/rooms/<code>/video/join/', client, 'post', f'{video_url}/join/', {
+                'video_enabled': True, 'audio_enabled': True,
+            })
+        self.call('GET /api/rooms/<code>/video/participants/', clients[0], 'get', f'{video_url}/participants/')
+        self.call('PATCH /api/rooms/<code>/video/media-state/', clients[0], 'patch', f'{video_url}/media-state/', {
+            'video_enabled': False,
+        })
+        for user in users[1:]:
+            self.call('POST /api/rooms/<code>/video/signals/', clients[0], 'post', f'{video_url}/signals/', {
+                'target_player_id': str(user.id), 'signal_type': 'offer', 'data': {'sdp': 'v=0'},
+            })
+        for client in clients[1:]:
+            self.call('GET /api/rooms/<code>/video/signals/', client, 'get', f'{video_url}/signals/')
+        self.call('GET /api/video/ice-servers/', clients[0], 'get', '/api/video/ice-servers/')
+        self.call('POST /api/rooms/<code>/video/leave/', clients[0], 'post', f'{video_url}/leave/')
+        self.call('POST /api/rooms/<code>/video/cleanup/', clients[0], 'post', f'{video_url}/cleanup/')
+        self.call('POST /api/video/cleanup/', clients[0], 'post', '/api/video/cleanup/')
+
+        self.assertWithinBudget()
+
+    def test_packs_and_cards(self):
+        make_pack()
+        make_pack('extra', black=5, white=10)
+        client = APIClient()
+
+        self.call('GET /api/packs/', client, 'get', '/api/packs/')
+        self.call('GET /api/packs/<id>/', client, 'get', '/api/packs/standard/')
+        self.call('POST /api/packs/', client, 'post', '/api/packs/', {
+            'id': 'custom', 'name': 'Custom', 'description': '',
+        }, expect=201)
+        self.call('PATCH /api/packs/<id>/toggle/', client, 'patch', '/api/packs/custom/toggle/')
+
+        self.call('GET /api/cards/', client, 'get', '/api/cards/?pack_id=standard')
+        response = self.call('POST /api/cards/', client, 'post', '/api/cards/', {
+            'text': 'A new answer', 'type': 'white', 'pack_id': 'custom',
+        }, expect=201)
+        card_url = f'/api/cards/{response.json()["id"]}/'
+        self.call('GET /api/cards/<id>/', client, 'get', card_url)
+        self.call('PATCH /api/cards/<id>/', client, 'patch', card_url, {'text': 'An edited answer'})
+        self.call('DELETE /api/cards/<id>/', client, 'delete', card_url, expect=204)
+        self.call('DELETE /api/packs/<id>/', client, 'delete', '/api/packs/custom/', expect=204)
+
+        self.call('POST /api/admin/import/', client, 'post', '/api/admin/import/', {
+            'pack_id': 'extra',
+            'cards': {'black': [f'Imported {i} _.' for i in range(5)], 'white': [f'Imported {i}' for i in range(20)]},
+        })
+        self.call('POST /api/admin/sync/', client, 'post', '/api/admin/sync/')
+
+        self.assertWithinBudget()
+
+
+class WebSocketBudgetTests(QueryBudgetTestCase):
+
+    def test_room_consumer(self):
+        users = self.make_room()
+        async_to_sync(self._room_game)(users)
+        self.assertWithinBudget()
+
+    async def _room_game(self, users):
+        sockets = {}
+        for user in users:
+            socket = WebsocketCommunicator(application, f'/ws/room/ABCD/?user_id={user.id}')
+            async with self.measure_async('ws room connect'):
+                connected, _ = await socket.connect()
+                self.assertTrue(connected)
+                await socket.receive_json_from()
+            sockets[str(user.id)] = socket
+        host = sockets[str(users[0].id)]
+
+        async with self.measure_async('ws room ping'):
+            await host.send_json_to({'action': 'ping'})
+            await host.receive_json_from()
+        async with self.measure_async('ws room heartbeat'):
+            await host.send_json_to({'action': 'heartbeat'})
+            await host.send_json_to({'action': 'ping'})
+            await host.receive_json_from()
+        async with self.measure_async('ws room resync'):
+            await host.send_json_to({'action': 'resync'})
+            await host.receive_json_from()
+
+        await self._action(sockets, host, 'ws room settings', {'action': 'settings', 'max_rounds': 2})
+        await self._action(sockets, host, 'ws room start', {'action': 'start'})
+
+        catalog = card_catalog.get('standard')
+        for _ in range(2):
+            room = await sync_to_async(Room.objects.get)(pk='ABCD')
+            players = await sync_to_async(list)(
+                Player.objects.filter(room_id='ABCD').exclude(user_id=room.czar_id)
+            )
+            for player in players:
+                await self._action(sockets, sockets[str(player.user_id)], 'ws room submit', {
+                    'action': 'submit', 'card_text': catalog.white_text(player.hand[0]),
+                })
+            await self._action(sockets, sockets[str(room.czar_id)], 'ws room pick_winner', {
+                'action': 'pick_winner', 'winner_id': str(players[0].user_id),
+            })
+
+        for user_id in list(sockets):
+            socket = sockets.pop(user_id)
+            async with self.measure_async('ws room disconnect'):
+                await socket.disconnect()
+                await self._drain(sockets.values())
+
+    async def _action(self, sockets, actor, name, content):
+        """Run a game action and wait for its result and every socket's update."""
+        async with self.measure_async(name):
+            self.request_ids += 1
+            await actor.send_json_to({**content, 'request_id': str(self.request_ids)})
+            others = [socket for socket in sockets.values() if socket is not actor]
+            received = [await actor.receive_json_from(), await actor.receive_json_from()]
+            await self._drain(others)
+        result = next(message for message in received if message['type'] == 'action_result')
+        self.assertTrue(result['ok'], result)
+
+    async def _drain(self, sockets, count=1):
+        for socket in sockets:
+            for _ in range(count):
+                await socket.receive_json_from()
+
+    def test_video_consumer(self):
+        users = self.make_room()
+        async_to_sync(self._video_call)(users)
+        self.assertWithinBudget()
+
+    async def _video_call(self, users):
+        sockets = {}
+        for user in users:
+            socket = WebsocketCommunicator(application, f'/ws/video/ABCD/?user_id={user.id}')
+            async with self.measure_async('ws video connect'):
+                connected, _ = await socket.connect()
+                self.assertTrue(connected)
+                await socket.receive_json_from()
+            sockets[str(user.id)] = socket
+
+        for user_id, socket in sockets.items():
+            others = [other for other in sockets.values() if other is not socket]
+            async with self.measure_async('ws video join'):
+                await socket.send_json_to({'action': 'join', 'video_enabled': True, 'audio_enabled': True})
+                await self._drain(others)
+
+        first_id, first = next(iter(sockets.items()))
+        others = [socket for socket in sockets.values() if socket is not first]
+        for action in ('toggle_video', 'toggle_audio', 'toggle_screen_share'):
+            async with self.measure_async(f'ws video {action}'):
+                await first.send_json_to({'action': action, 'enabled': False})
+                await self._drain(others)
+
+        for user_id, socket in list(sockets.items())[1:]:
+            async with self.measure_async('ws video offer'):
+                await first.send_json_to({'action': 'offer', 'target_player_id': user_id, 'sdp': 'v=0'})
+                await socket.receive_json_from()
+                # The target marks the signal delivered after relaying it
+                await socket.receive_nothing(0.01)
+            async with self.measure_async('ws video answer'):
+                await socket.send_json_to({'action': 'answer', 'target_player_id': first_id, 'sdp': 'v=0'})
+                await first.receive_json_from()
+                await first.receive_nothing(0.01)
+            async with self.measure_async('ws video ice_candidate'):
+                await socket.send_json_to({'action': 'ice_candidate', 'target_player_id': first_id, 'candidate': {}})
+                await first.receive_json_from()
+                await first.receive_nothing(0.01)
+
+        async with self.measure_async('ws video heartbeat'):
+            await first.send_json_to({'action': 'heartbeat'})
+            await first.receive_nothing(0.01)
+
+        async with self.measure_async('ws video leave'):
+            await first.send_json_to({'action': 'leave'})
+            await self._drain(others)
+
+        for user_id in list(sockets):
+            socket = sockets.pop(user_id)
+            async with self.measure_async('ws video disconnect'):
+                await socket.disconnect()
+                await self._drain(sockets.values())
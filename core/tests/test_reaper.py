@@ -0,0 +1,81 @@
+"""
+The reaper ages rooms and users by their last activity, not their creation.
+"""
+
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.consumers import broadcast_room_update
+from core.models import AnonymousUser, Player, Room
+from core.reaper import reap
+
+from .utils import make_pack, make_user
+
+
+@override_settings(ROOM_BROADCAST_COALESCE_MS=0)
+class ReaperTests(TestCase):
+
+    def setUp(self):
+        self.pack = make_pack(black=2, white=2)
+        self.long_ago = timezone.now() - timedelta(days=90)
+
+    def make_room(self, room_code, status):
+        user = make_user(f'session-{room_code}')
+        room = Room.objects.create(room_code=room_code, host=user, pack=self.pack, status=status)
+        Player.objects.create(user=user, room=room, name='Player', avatar='🙂', is_host=True)
+        Room.objects.filter(pk=room_code).update(
+            created_at=self.long_ago, last_activity=self.long_ago
+        )
+        return room
+
+    def test_rooms_with_recent_activity_are_kept(self):
+        for status, room_code in (('PLAYING', 'PLAY'), ('GAME_OVER', 'OVER'), ('WAITING', 'WAIT')):
+            self.make_room(room_code, status)
+            self.make_room(room_code[::-1], status)
+            broadcast_room_update(room_code)
+
+        reap()
+        self.assertEqual(set(Room.objects.values_list('pk', flat=True)), {'PLAY', 'OVER', 'WAIT'})
+
+    def test_users_seen_recently_are_kept(self):
+        active, idle = make_user('active'), make_user('idle')
+        AnonymousUser.objects.update(last_seen=self.long_ago)
+
+        response = self.client.post(
+            '/api/auth/anonymous/', {'stored_uid': str(active.id)}, content_type='application/json'
+        )
+        self.assertEqual(response.json()['uid'], str(active.id))
+
+        reap()
+        self.assertTrue(AnonymousUser.objects.filter(pk=active.pk).exists())
+        self.assertFalse(AnonymousUser.objects.filter(pk=idle.pk).exists())
+
+    def test_users_with_games_are_kept(self):
+        self.make_room('PLAY', 'PLAYING')  # recent activity; hosted by session-PLAY
+        player, orphan, idle = make_user('player'), make_user('orphaned_1'), make_user('idle')
+        Player.objects.create(user=player, room_id='PLAY', name='Player', avatar='🙂')
+        Room.objects.update(last_activity=timezone.now())
+        AnonymousUser.objects.update(last_seen=self.long_ago)
+
+        with CaptureQueriesContext(connection) as context:
+            reap()
+        self.assertEqual(
+            set(AnonymousUser.objects.values_list('session_key', flat=True)),
+            {'session-PLAY', 'player'},
+        )
+        self.assertFalse(AnonymousUser.objects.filter(pk__in=[orphan.pk, idle.pk]).exists())
+
+        # Game membership is checked with NOT EXISTS, not joins
+        user_selects = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT "core_anonymoususer"."id"')
+            and ('"last_seen" <' in query['sql'] or 'orphaned' in query['sql'])
+        ]
+        self.assertEqual(len(user_selects), 2)
+        for sql in user_selects:
+            self.assertNotIn('JOIN', sql)
+            self.assertEqual(sql.count('NOT EXISTS('), 2)
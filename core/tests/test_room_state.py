@@ -0,0 +1,56 @@
+"""
+Write-behind persistence of in-memory room state.
+"""
+
+from unittest import mock
+
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+
+from core.game_logic import get_game_engine
+from core.models import Player, Room
+from core.room_state import room_store
+
+from .utils import client_for, make_room
+
+
+@override_settings(GAME_STATE_ENGINE='memory', GAME_STATE_FLUSH_INTERVAL=0.5)
+class RoomStateStoreTests(TestCase):
+
+    def setUp(self):
+        self.room, self.users = make_room(4)
+        self.pack = self.room.pack
+
+    def tearDown(self):
+        room_store.discard('ABCD')
+
+    def test_failed_flush_keeps_changes(self):
+        with mock.patch.object(room_store, '_ensure_writer'):
+            get_game_engine(self.room).start_game()
+            state = room_store.get('ABCD')
+            submitter = next(p for p in state.players.values() if p.user_id != str(state.czar_id))
+            card_text = state.catalog().white_text(submitter.hand[0])
+            player = Player.objects.get(pk=submitter.player_id)
+            get_game_engine(Room.objects.get(pk='ABCD')).submit_card(player, card_text)
+
+            with mock.patch.object(room_store, '_write', side_effect=OperationalError('locked')):
+                with self.assertRaises(OperationalError):
+                    room_store.flush()
+            self.assertTrue(state.is_dirty)
+
+            room_store.flush()
+        self.assertFalse(state.is_dirty)
+        self.assertEqual(
+            list(self.room.submissions.values_list('card_text', flat=True)), [card_text]
+        )
+        self.assertEqual(Player.objects.get(pk=submitter.player_id).hand, submitter.hand)
+
+    def test_settings_change_drops_live_state(self):
+        with mock.patch.object(room_store, '_ensure_writer'):
+            room_store.load('ABCD')
+        response = client_for(self.users[0]).patch(
+            '/api/rooms/ABCD/settings/', {'max_rounds': 3}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIsNone(room_store.get('ABCD'))
+        self.assertEqual(Room.objects.get(pk='ABCD').max_rounds, 3)
@@ -0,0 +1,141 @@
+"""
+Server-side round timers: arming, re-arming and cancelling, expiring a
+round exactly once, and the /timeout/ view deferring to a running timer.
+"""
+
+import asyncio
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import round_timer as round_timer_module
+from core.game_logic import GameEngine
+from core.models import Room
+from core.round_timer import RoundTimerScheduler, expire_round, round_timer
+
+from .utils import client_for, make_room
+
+
+def soon(seconds):
+    return timezone.now() + timedelta(seconds=seconds)
+
+
+@override_settings(ROUND_TIMER_ENABLED=True)
+class RoundTimerSchedulerTests(TestCase):
+
+    def setUp(self):
+        self.scheduler = RoundTimerScheduler()
+        patcher = mock.patch.object(round_timer_module, 'expire_round')
+        self.expire_round = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_scheduler(self, steps):
+        async def run():
+            self.scheduler.start()
+            await steps()
+        async_to_sync(run)()
+
+    def test_not_running_until_started(self):
+        self.assertFalse(self.scheduler.is_running)
+        self.scheduler.schedule('ABCD', soon(0))
+        self.assertEqual(self.scheduler._handles, {})
+
+    @override_settings(ROUND_TIMER_ENABLED=False)
+    def test_disabled(self):
+        async def steps():
+            self.assertFalse(self.scheduler.is_running)
+        self.run_scheduler(steps)
+
+    def test_fires_once_at_expiry(self):
+        expires_at = soon(0.05)
+
+        async def steps():
+            self.scheduler.schedule('ABCD', expires_at)
+            self.scheduler.schedule('ABCD', expires_at)  # same expiry: kept as is
+            await asyncio.sleep(0.2)
+
+        self.run_scheduler(steps)
+        self.expire_round.assert_called_once_with('ABCD', expires_at)
+
+    def test_rearm_replaces_timer(self):
+        first, second = soon(0.05), soon(0.2)
+
+        async def steps():
+            self.scheduler.schedule('ABCD', first)
+            self.scheduler.schedule('ABCD', second)
+            await asyncio.sleep(0.1)
+            self.expire_round.assert_not_called()
+            await asyncio.sleep(0.25)
+
+        self.run_scheduler(steps)
+        self.expire_round.assert_called_once_with('ABCD', second)
+
+    def test_cancel(self):
+        async def steps():
+            self.scheduler.schedule('ABCD', soon(0.05))
+            self.scheduler.schedule('ABCD', None)
+            await asyncio.sleep(0.15)
+            self.assertEqual(self.scheduler._handles, {})
+
+        self.run_scheduler(steps)
+        self.expire_round.assert_not_called()
+
+    def test_start_picks_up_rooms_in_play(self):
+        room, _ = make_room()
+        GameEngine(room).start_game()
+        expires_at = soon(0.05)
+        Room.objects.filter(pk='ABCD').update(round_expires_at=expires_at)
+
+        async def steps():
+            await asyncio.sleep(0.3)
+        self.run_scheduler(steps)
+        self.expire_round.assert_called_once_with('ABCD', expires_at)
+
+
+@override_settings(GAME_STATE_ENGINE='database', ROOM_BROADCAST_COALESCE_MS=0)
+class ExpireRoundTests(TestCase):
+
+    def setUp(self):
+        self.room, self.users = make_room()
+        GameEngine(self.room).start_game()
+        self.expired = timezone.now() - timedelta(seconds=1)
+        Room.objects.filter(pk='ABCD').update(round_expires_at=self.expired)
+
+    def phase(self):
+        return Room.objects.get(pk='ABCD').phase
+
+    def test_expires_exactly_once(self):
+        self.assertTrue(expire_round('ABCD', self.expired))
+        self.assertEqual(self.phase(), 'PICKING')
+
+        # A second timer (or worker) for the same expiry does nothing
+        self.assertFalse(expire_round('ABCD', self.expired))
+        self.assertEqual(self.phase(), 'PICKING')
+
+    def test_stale_expiry_is_ignored(self):
+        self.assertFalse(expire_round('ABCD', self.expired - timedelta(seconds=60)))
+        self.assertEqual(self.phase(), 'SUBMISSION')
+
+    def test_missing_room(self):
+        self.assertFalse(expire_round('WXYZ', self.expired))
+
+    def post_timeout(self):
+        response = client_for(self.users[1]).post('/api/rooms/ABCD/timeout/')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['message']
+
+    def test_view_defers_to_running_timer(self):
+        with mock.patch.object(
+            RoundTimerScheduler, 'is_running', new_callable=mock.PropertyMock, return_value=True
+        ), mock.patch.object(round_timer, 'schedule') as schedule:
+            self.assertEqual(self.post_timeout(), 'Timeout scheduled')
+        schedule.assert_called_once_with('ABCD', self.expired)
+        self.assertEqual(self.phase(), 'SUBMISSION')
+
+    def test_view_handles_timeout_without_timer(self):
+        self.assertFalse(round_timer.is_running)
+        self.assertEqual(self.post_timeout(), 'Timeout handled')
+        self.assertEqual(self.phase(), 'PICKING')
@@ -0,0 +1,80 @@
+"""
+The hand-built room snapshot must match RoomDetailSerializer byte for byte.
+"""
+
+import json
+
+from django.test import TestCase, override_settings
+
+from core.card_catalog import card_catalog
+from core.consumers import personalize_room_data
+from core.game_logic import GameEngine
+from core.models import Player, Room, Submission
+from core.room_state import RoomState
+from core.serializers import RoomDetailSerializer
+from core.snapshots import load_room_snapshot
+
+from .utils import make_room
+
+
+class RoomSnapshotTests(TestCase):
+
+    def setUp(self):
+        self.room, self.users = make_room(4)
+        self.pack = self.room.pack
+
+    def serialized(self, user=None):
+        room = Room.objects.get(pk='ABCD')
+        return json.dumps(RoomDetailSerializer(room, context={'user': user}).data)
+
+    def assertMatchesSerializer(self, user=None):
+        data, hands, revision = load_room_snapshot('ABCD')
+        self.assertEqual(json.dumps(personalize_room_data(data, hands, user)), self.serialized(user))
+        self.assertEqual(revision, Room.objects.get(pk='ABCD').state_revision)
+
+        # Rooms held in memory share the builder
+        room = Room.objects.get(pk='ABCD')
+        state = RoomState(
+            room, list(room.players.all()),
+            list(Submission.objects.filter(room=room, round_number=room.current_round)),
+        )
+        data, hands = state.snapshot()
+        self.assertEqual(json.dumps(personalize_room_data(data, hands, user)), self.serialized(user))
+
+    def start(self):
+        GameEngine(Room.objects.get(pk='ABCD')).start_game()
+        self.room.refresh_from_db()
+
+    def submit_all(self):
+        catalog = card_catalog.get(self.pack.id)
+        for player in Player.objects.filter(room=self.room).exclude(user_id=self.room.czar_id):
+            GameEngine(Room.objects.get(pk='ABCD')).submit_card(player, catalog.white_text(player.hand[0]))
+
+    def test_lobby(self):
+        self.assertMatchesSerializer()
+        self.assertMatchesSerializer(self.users[1])
+
+    def test_submission_phase(self):
+        self.start()
+        player = Player.objects.filter(room=self.room).exclude(user_id=self.room.czar_id).first()
+        GameEngine(self.room).submit_card(player, card_catalog.get(self.pack.id).white_text(player.hand[0]))
+        for user in [None] + self.users:
+            self.assertMatchesSerializer(user)
+
+    @override_settings(ROOM_STATE_DECK_HASH=True)
+    def test_after_round(self):
+        self.start()
+        self.submit_all()
+        winner = Player.objects.filter(room=self.room).exclude(user_id=self.room.czar_id).first()
+        GameEngine(Room.objects.get(pk='ABCD')).pick_winner(str(winner.user_id))
+        self.assertIsNotNone(Room.objects.get(pk='ABCD').last_round_winner_id)
+        self.assertMatchesSerializer(self.users[2])
+
+    def test_query_count_does_not_grow_with_players(self):
+        self.start()
+        self.submit_all()
+        with self.assertNumQueries(3):
+            load_room_snapshot('ABCD')
+
+    def test_missing_room(self):
+        self.assertEqual(load_room_snapshot('ZZZZ'), (None, {}, None))
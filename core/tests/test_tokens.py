@@ -0,0 +1,49 @@
+"""
+Signed user tokens authenticate without queries and never write the user row.
+"""
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core.models import AnonymousUser, Player, Room, TokenUser
+from core.tokens import issue_token, user_from_token
+
+from .utils import make_pack, make_user
+
+
+@override_settings(AUTH_TOKENS_ENABLED=True)
+class TokenTests(TestCase):
+
+    def setUp(self):
+        self.user = make_user('session-0')
+        self.token = issue_token(self.user)
+
+    def test_token_user_is_read_only(self):
+        with self.assertNumQueries(0):
+            user = user_from_token(self.token)
+        self.assertIsInstance(user, TokenUser)
+        self.assertEqual(user.id, self.user.id)
+
+        with self.assertRaises(NotImplementedError):
+            user.save()
+        with self.assertRaises(NotImplementedError):
+            user.delete()
+        self.assertEqual(AnonymousUser.objects.get(pk=self.user.pk).session_key, 'session-0')
+
+    def test_token_user_creates_rooms(self):
+        make_pack()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        response = client.post('/api/rooms/', {
+            'host_name': 'Host', 'avatar': '🙂', 'pack_id': 'standard',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        room = Room.objects.get(pk=response.json()['room_code'])
+        self.assertEqual(room.host_id, self.user.id)
+        self.assertTrue(Player.objects.filter(room=room, user_id=self.user.id).exists())
+        self.assertEqual(AnonymousUser.objects.get(pk=self.user.pk).session_key, 'session-0')
+
+    def test_invalid_token(self):
+        self.assertIsNone(user_from_token(self.token + 'x'))
+        with self.settings(AUTH_TOKENS_ENABLED=False):
+            self.assertIsNone(user_from_token(self.token))
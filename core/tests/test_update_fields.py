@@ -0,0 +1,123 @@
+"""
+Every game action must only write the columns it changes.
+"""
+
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from core.card_catalog import card_catalog
+from core.models import Player, Room
+
+from .utils import ColumnsWrittenMixin, client_for, make_room
+
+ROUND_COLUMNS = {
+    'current_round', 'czar_id', 'current_question', 'phase', 'round_expires_at',
+    'black_cursor', 'white_cursor', 'state_revision', 'last_activity',
+    'last_round_winner_id', 'last_round_winner_name', 'last_round_winning_card',
+    'last_round_number',
+}
+
+
+class UpdateFieldsTests(ColumnsWrittenMixin, TestCase):
+
+    def setUp(self):
+        self.room, self.users = make_room(4)
+        self.pack = self.room.pack
+
+    def call(self, user, path, data=None, method='post'):
+        client = client_for(user)
+        response = getattr(client, method)(f'/api/rooms/ABCD/{path}', data or {}, format='json')
+        self.assertLess(response.status_code, 300, response.content)
+        return response
+
+    def start(self):
+        self.call(self.users[0], 'start/')
+        self.room.refresh_from_db()
+
+    def submitters(self):
+        return [user for user in self.users if user.id != self.room.czar_id]
+
+    def submit(self, user):
+        player = Player.objects.get(user=user, room=self.room)
+        card_text = card_catalog.get(self.pack.id).white_text(player.hand[0])
+        self.call(user, 'submit/', {'card_text': card_text})
+
+    def test_unchanged_save_writes_nothing(self):
+        room = Room.objects.get(pk='ABCD')
+        with self.assertColumnsWritten({}):
+            room.save()
+        room.max_rounds = 5
+        with self.assertColumnsWritten({'core_room': ['max_rounds']}):
+            room.save()
+        with self.assertColumnsWritten({}):
+            room.save()
+
+    def test_leave(self):
+        with self.assertColumnsWritten({
+            'core_player': ['is_online'],
+            'core_room': ['state_revision', 'last_activity'],
+        }):
+            self.call(self.users[1], 'leave/')
+
+    def test_rejoin(self):
+        self.call(self.users[1], 'leave/')
+        with self.assertColumnsWritten({
+            'core_anonymoususer': ['last_seen'],
+            'core_player': ['is_online'],
+            'core_room': ['state_revision', 'last_activity'],
+        }):
+            self.call(self.users[1], 'join/', {'player_name': 'Player 1', 'avatar': '🙂'})
+
+    def test_update_settings(self):
+        with self.assertColumnsWritten({'core_room': ['max_rounds', 'state_revision', 'last_activity']}):
+            self.call(self.users[0], 'settings/', {'max_rounds': 5}, method='patch')
+
+    def test_start_game(self):
+        with self.assertColumnsWritten({
+            'core_player': ['hand'],
+            'core_room': [
+                'status', 'current_round', 'czar_id', 'current_question', 'phase',
+                'round_expires_at', 'deck_seed', 'deck_size', 'black_cursor',
+                'white_cursor', 'state_revision', 'last_activity',
+            ],
+        }):
+            self.call(self.users[0], 'start/')
+
+    def test_submit(self):
+        self.start()
+        first, *rest = self.submitters()
+        with self.assertColumnsWritten({
+            'core_player': ['hand'],
+            'core_room': ['state_revision', 'last_activity'],
+        }):
+            self.submit(first)
+
+        for user in rest[:-1]:
+            self.submit(user)
+        with self.assertColumnsWritten({
+            'core_player': ['hand'],
+            'core_room': ['phase', 'round_expires_at', 'state_revision', 'last_activity'],
+        }):
+            self.submit(rest[-1])
+
+    def test_pick_winner(self):
+        self.start()
+        for user in self.submitters():
+            self.submit(user)
+        czar = next(user for user in self.users if user.id == self.room.czar_id)
+        with self.assertColumnsWritten({
+            'core_player': ['score', 'hand'],
+            'core_room': ROUND_COLUMNS,
+        }):
+            self.call(czar, 'pick-winner/', {'winner_id': str(self.submitters()[0].id)})
+
+    def test_timeout_auto_submits(self):
+        self.start()
+        Room.objects.filter(pk='ABCD').update(round_expires_at=timezone.now() - timedelta(seconds=1))
+        with self.assertColumnsWritten({
+            'core_player': ['hand'],
+            'core_room': ['phase', 'round_expires_at', 'state_revision', 'last_activity'],
+        }):
+            self.call(self.users[0], 'timeout/')
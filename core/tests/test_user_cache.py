@@ -0,0 +1,120 @@
+"""
+Cached user lookups: LRU eviction, TTL expiry, and invalidation when a
+user is deleted or recovered onto another session.
+"""
+
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core import user_cache as user_cache_module
+from core.models import AnonymousUser, Player
+from core.user_cache import get_user_by_id, get_user_by_session, user_cache
+
+from .utils import make_room, make_user
+
+
+@override_settings(AUTH_CACHE_SIZE=100, AUTH_CACHE_TTL=60)
+class UserCacheTests(TestCase):
+
+    def setUp(self):
+        user_cache.clear()
+        self.users = [make_user(f'session-{i}') for i in range(3)]
+
+    def cached(self, user):
+        return user_cache.get(('id', str(user.id))) is not None
+
+    def test_lookups_are_cached(self):
+        user = self.users[0]
+        self.assertEqual(get_user_by_id(user.id), user)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_by_id(user.id), user)
+            self.assertEqual(get_user_by_session('session-0'), user)
+
+        # Callers get copies they may modify
+        get_user_by_id(user.id).session_key = 'changed'
+        self.assertEqual(get_user_by_id(user.id).session_key, 'session-0')
+
+    @override_settings(AUTH_CACHE_SIZE=4)
+    def test_least_recently_used_evicted(self):
+        first, second, third = self.users
+        get_user_by_id(first.id)
+        get_user_by_id(second.id)
+        get_user_by_id(first.id)  # now more recent than second
+        get_user_by_id(third.id)
+
+        self.assertTrue(self.cached(first))
+        self.assertFalse(self.cached(second))
+        self.assertTrue(self.cached(third))
+        self.assertEqual(len(user_cache._entries), 4)
+
+    def test_entries_expire(self):
+        user = self.users[0]
+        with mock.patch.object(user_cache_module.time, 'monotonic', return_value=1000):
+            get_user_by_id(user.id)
+        with mock.patch.object(user_cache_module.time, 'monotonic', return_value=1060):
+            self.assertTrue(self.cached(user))
+        with mock.patch.object(user_cache_module.time, 'monotonic', return_value=1061):
+            self.assertFalse(self.cached(user))
+            with self.assertNumQueries(1):
+                self.assertEqual(get_user_by_id(user.id), user)
+
+    @override_settings(AUTH_CACHE_TTL=0)
+    def test_disabled(self):
+        get_user_by_id(self.users[0].id)
+        self.assertEqual(user_cache._entries, {})
+
+    def test_deleted_user_is_forgotten(self):
+        user = self.users[0]
+        get_user_by_id(user.id)
+        user.delete()
+        self.assertFalse(self.cached(user))
+        self.assertIsNone(get_user_by_id(user.id))
+        self.assertIsNone(get_user_by_session('session-0'))
+
+
+@override_settings(AUTH_CACHE_SIZE=100, AUTH_CACHE_TTL=60)
+class RecoveryInvalidationTests(TestCase):
+
+    def setUp(self):
+        self.room, self.users = make_room()
+        self.real = self.users[1]  # has game history, recovered via stored_uid
+        self.client = APIClient()
+
+    def auth(self, **data):
+        response = self.client.post('/api/auth/anonymous/', data, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def session_uid(self):
+        return self.client.get('/api/auth/session/').json()['uid']
+
+    def test_recovered_session_does_not_resolve_to_orphaned_user(self):
+        # A new browser session gets its own user, who also joins a game
+        session_user = AnonymousUser.objects.get(pk=self.auth()['uid'])
+        Player.objects.create(user=session_user, room=self.room, name='Other', avatar='🙂')
+        self.assertEqual(self.session_uid(), str(session_user.id))  # now cached
+
+        body = self.auth(stored_uid=str(self.real.id))
+        self.assertTrue(body['recovered'])
+        self.assertEqual(self.session_uid(), str(self.real.id))
+
+        session_user.refresh_from_db()
+        self.assertTrue(session_user.session_key.startswith('orphaned_'))
+        self.assertEqual(get_user_by_id(session_user.id).session_key, session_user.session_key)
+        self.assertEqual(get_user_by_id(self.real.id).session_key, body['session_key'])
+
+    def test_recovered_session_drops_deleted_session_user(self):
+        session_user_id = self.auth()['uid']
+        self.assertEqual(self.session_uid(), session_user_id)
+
+        self.auth(stored_uid=str(self.real.id))
+        self.assertFalse(AnonymousUser.objects.filter(pk=session_user_id).exists())
+        self.assertIsNone(get_user_by_id(session_user_id))
+        self.assertEqual(self.session_uid(), str(self.real.id))
+
+    def test_old_session_key_is_forgotten(self):
+        self.assertEqual(get_user_by_session('session-1'), self.real)
+        self.auth(stored_uid=str(self.real.id))
+        self.assertIsNone(get_user_by_session('session-1'))
@@ -0,0 +1,83 @@
+"""
+Shared helpers for core tests.
+"""
+
+import re
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from core.card_catalog import card_catalog
+from core.models import AnonymousUser, Card, Pack, Player, Room
+from core.user_cache import user_cache
+
+UPDATE_RE = re.compile(r'^UPDATE "(\w+)" SET (.*) WHERE ', re.DOTALL)
+COLUMN_RE = re.compile(r'(?:^|, )"(\w+)" = ')
+
+
+def columns_written(queries):
+    """Map table -> set of columns set by the UPDATE statements in queries."""
+    written = {}
+    for query in queries:
+        match = UPDATE_RE.match(query['sql'])
+        if match:
+            table, assignments = match.groups()
+            written.setdefault(table, set()).update(COLUMN_RE.findall(assignments))
+    return written
+
+
+class ColumnsWrittenMixin:
+    """TestCase mixin asserting which columns a block of code updates."""
+
+    @contextmanager
+    def assertColumnsWritten(self, expected):
+        """
+        Fail unless the block's UPDATEs write exactly `expected`,
+        a dict of table -> iterable of columns. Tables left out must not
+        be updated at all.
+        """
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        expected = {table: set(columns) for table, columns in expected.items() if columns}
+        self.assertEqual(columns_written(context.captured_queries), expected)
+
+
+def make_pack(pack_id='standard', black=20, white=80):
+    pack = Pack.objects.create(id=pack_id, name=pack_id.title())
+    for i in range(black):
+        Card.objects.create(pack=pack, card_type='black', text=f'Question {i} _.')
+    for i in range(white):
+        Card.objects.create(pack=pack, card_type='white', text=f'Answer {i}')
+    return pack
+
+
+def make_user(session_key):
+    return AnonymousUser.objects.create(session_key=session_key)
+
+
+def make_room(players=3, **room_fields):
+    """
+    Waiting room 'ABCD' on a new 'standard' pack with `players` players,
+    the first one hosting. Starts from empty card and user caches.
+    Returns (room, users).
+    """
+    card_catalog.invalidate()
+    user_cache.clear()
+    room_fields.setdefault('room_code', 'ABCD')
+    if 'pack' not in room_fields:
+        room_fields['pack'] = make_pack()
+    users = [make_user(f'session-{i}') for i in range(players)]
+    room = Room.objects.create(host=users[0], **room_fields)
+    for i, user in enumerate(users):
+        Player.objects.create(
+            user=user, room=room, name=f'Player {i}', avatar='🙂', is_host=i == 0
+        )
+    return room, users
+
+
+def client_for(user):
+    client = APIClient()
+    client.credentials(HTTP_X_USER_ID=str(user.id))
+    return client
@@ -0,0 +1,54 @@
+"""
+Signed, stateless user tokens.
+
+When AUTH_TOKENS_ENABLED is on, AnonymousAuthView also returns a token:
+the anonymous user id and issue time, HMAC-signed with SECRET_KEY. Clients
+send it as `Authorization: Bearer <token>` (or `?token=` on WebSockets)
+and are authenticated without touching sessions or the database.
+"""
+
+import uuid
+
+from django.conf import settings
+from django.core import signing
+
+from .models import TokenUser
+
+SALT = 'core.tokens.user'
+
+
+def tokens_enabled():
+    return getattr(settings, 'AUTH_TOKENS_ENABLED', False)
+
+
+def issue_token(user):
+    return signing.TimestampSigner(salt=SALT).sign(str(user.id))
+
+
+def user_from_token(token):
+    """
+    Return a TokenUser for a valid token, or None. The user is built from
+    the token alone (no query), so only its id is populated and it cannot
+    be saved.
+    """
+    if not token or not tokens_enabled():
+        return None
+    try:
+        user_id = signing.TimestampSigner(salt=SALT).unsign(
+            token, max_age=getattr(settings, 'AUTH_TOKEN_MAX_AGE', 30 * 24 * 3600)
+        )
+        user = TokenUser(id=uuid.UUID(user_id))
+    except (signing.BadSignature, ValueError):
+        return None
+    # An existing row as far as related objects are concerned
+    user._state.adding = False
+    user._state.db = 'default'
+    return user
+
+
+def token_from_header(request):
+    header = request.headers.get('Authorization', '')
+    scheme, _, token = header.partition(' ')
+    if scheme.lower() != 'bearer':
+        return None
+    return token.strip()
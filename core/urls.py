@@ -15,6 +15,7 @@ urlpatterns = [
     # Authentication
     path('auth/anonymous/', views.AnonymousAuthView.as_view(), name='anonymous-auth'),
     path('auth/session/', views.SessionStatusView.as_view(), name='session-status'),
+    path('auth/lazy-stats/', views.LazyAuthStatsView.as_view(), name='lazy-auth-stats'),
 
     # Room Management
     path('rooms/', views.RoomListCreateView.as_view(), name='room-list-create'),
@@ -23,6 +24,8 @@ urlpatterns = [
     path('rooms/<str:room_code>/leave/', views.LeaveRoomView.as_view(), name='room-leave'),
     path('rooms/<str:room_code>/start/', views.StartGameView.as_view(), name='room-start'),
     path('rooms/<str:room_code>/settings/', views.UpdateRoomSettingsView.as_view(), name='room-settings'),
+    path('rooms/<str:room_code>/decks/', views.RoomDecksView.as_view(), name='room-decks'),
+    path('rooms/<str:room_code>/affinity/', views.RoomAffinityView.as_view(), name='room-affinity'),
 
     # Game Actions
     path('rooms/<str:room_code>/submit/', views.SubmitCardView.as_view(), name='submit-card'),
@@ -44,6 +47,7 @@ urlpatterns = [
     # Admin
     path('admin/sync/', views.SyncDatabaseView.as_view(), name='admin-sync'),
     path('admin/import/', views.ImportCardsView.as_view(), name='admin-import'),
+    path('admin/profile/', views.ProfileView.as_view(), name='admin-profile'),
 
     # Router URLs
     path('', include(router.urls)),
@@ -0,0 +1,106 @@
+"""
+In-process cache of AnonymousUser lookups for authentication.
+
+Every REST request and WebSocket connection resolves a user by id or by
+session key. Those rows only change when AnonymousAuthView recovers a
+user onto a new session, so lookups are cached here in a bounded LRU
+with a TTL. The TTL bounds how long another process can serve a stale
+mapping after a recovery; this process invalidates immediately.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+from .models import AnonymousUser
+
+
+class UserCache:
+    """Thread-safe LRU of key -> AnonymousUser with a per-entry TTL."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, user)
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'AUTH_CACHE_SIZE', 10000)
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'AUTH_CACHE_TTL', 60)
+
+    @property
+    def enabled(self):
+        return self.max_size > 0 and self.ttl > 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            # Callers may modify their copy (e.g. save()), never the cached one
+            return copy.copy(entry[1])
+
+    def set(self, user):
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for key in (('id', str(user.id)), ('session', user.session_key)):
+                self._entries[key] = (expires_at, copy.copy(user))
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user, session_key=None):
+        """Drop a user's entries, plus an old session key it moved away from."""
+        with self._lock:
+            self._entries.pop(('id', str(user.id)), None)
+            self._entries.pop(('session', user.session_key), None)
+            if session_key:
+                self._entries.pop(('session', session_key), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+def get_user_by_id(user_id):
+    """Resolve a user id (as sent in X-User-ID). Returns None if unknown."""
+    user = user_cache.get(('id', str(user_id)))
+    if user is not None:
+        return user
+    try:
+        user = AnonymousUser.objects.get(id=user_id)
+    except (AnonymousUser.DoesNotExist, ValidationError):
+        # Unknown or malformed id
+        return None
+    user_cache.set(user)
+    return user
+
+
+def get_user_by_session(session_key, create=False):
+    """Resolve a session key, optionally creating the user. Returns None if unknown."""
+    user = user_cache.get(('session', session_key))
+    if user is not None:
+        return user
+    if create:
+        user, _ = AnonymousUser.objects.get_or_create(session_key=session_key)
+    else:
+        user = AnonymousUser.objects.filter(session_key=session_key).first()
+        if user is None:
+            return None
+    user_cache.set(user)
+    return user
@@ -11,9 +11,10 @@ from channels.layers import get_channel_layer
 from django.utils import timezone
 
 from .models import Room, Player, VideoCallParticipant, VideoCallSignal
+from . import json_codec, metrics
 
 
-class VideoCallConsumer(AsyncJsonWebsocketConsumer):
+class VideoCallConsumer(metrics.MeteredSendMixin, json_codec.JsonCodecMixin, AsyncJsonWebsocketConsumer):
     """
     WebSocket consumer for WebRTC signaling.
     Handles offer/answer/ICE candidate exchange for video calls.
@@ -83,6 +84,7 @@ class VideoCallConsumer(AsyncJsonWebsocketConsumer):
             self.channel_name
         )
 
+    @metrics.timed('consumer')
     async def receive_json(self, content):
         """
         Handle incoming WebSocket messages for video signaling.
@@ -242,6 +244,7 @@ class VideoCallConsumer(AsyncJsonWebsocketConsumer):
                 'player_name': event['player_name']
             })
 
+    @metrics.timed('consumer')
     async def relay_signal(self, event):
         """Relay WebRTC signal to target peer."""
         # Only send to the intended target
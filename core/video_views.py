@@ -239,6 +239,9 @@ class VideoCallSignalView(views.APIView):
 
     def get(self, request, room_code):
         """Get pending signals for this user."""
+        if not request.user.is_authenticated:
+            return Response({'error': 'You are not in this room'}, status=403)
+
         try:
             room = Room.objects.get(room_code=room_code.upper())
             player = Player.objects.get(user=request.user, room=room)
@@ -2,24 +2,38 @@
 REST API views for CardsNChaos.
 """
 
+import os
+import socket
 import uuid
 
 from rest_framework import views, viewsets, status
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.decorators import action
+from rest_framework.authentication import SessionAuthentication
+from django.conf import settings
+from django.db.models import Count, Q
+from django.http import HttpResponse
 from django.utils import timezone
 
 from .models import AnonymousUser, Pack, Card, Room, Player, Submission
 from .serializers import (
     PackSerializer, CardSerializer, CardCreateSerializer,
-    RoomSerializer, RoomDetailSerializer, RoomCreateSerializer,
+    RoomSerializer, RoomDecksSerializer, RoomCreateSerializer,
     JoinRoomSerializer, SubmitCardSerializer, PickWinnerSerializer,
     UpdateSettingsSerializer, ImportCardsSerializer
 )
-from .authentication import AnonymousSessionAuthentication
-from .game_logic import GameEngine
-from .consumers import broadcast_room_update
+from .authentication import AnonymousSessionAuthentication, lazy_auth_stats
+from .permissions import IsAdminOrDebug
+from . import actions, affinity, profiler
+from .idempotency import idempotent
+from .user_cache import user_cache
+from .tokens import issue_token, tokens_enabled
+from .game_logic import get_game_engine
+from .room_state import room_store
+from .snapshots import load_room_snapshot
+from .round_timer import round_timer
+from .consumers import broadcast_room_update, personalize_room_data
 
 
 # ============== Authentication ==============
@@ -60,6 +74,7 @@ class AnonymousAuthView(views.APIView):
                     ).exclude(id=stored_uid).first()
 
                     if existing_session_user:
+                        user_cache.invalidate(existing_session_user)
                         # Delete the session-based user if they have no game data
                         # (the stored_uid user is the "real" one with game history)
                         if not existing_session_user.players.exists():
@@ -70,6 +85,7 @@ class AnonymousAuthView(views.APIView):
                             existing_session_user.session_key = f"orphaned_{uuid.uuid4()}"
                             existing_session_user.save(update_fields=['session_key'])
 
+                    user_cache.invalidate(user)
                     user.session_key = session_key
                     user.save(update_fields=['session_key'])
                     recovered = True
@@ -82,13 +98,18 @@ class AnonymousAuthView(views.APIView):
             user, created = AnonymousUser.objects.get_or_create(
                 session_key=session_key
             )
+        if not created:
+            user.touch()
 
-        return Response({
+        data = {
             'uid': str(user.id),
             'session_key': session_key,
             'created': created,
             'recovered': recovered
-        })
+        }
+        if tokens_enabled():
+            data['token'] = issue_token(user)
+        return Response(data)
 
 
 class SessionStatusView(views.APIView):
@@ -98,12 +119,25 @@ class SessionStatusView(views.APIView):
     authentication_classes = [AnonymousSessionAuthentication]
 
     def get(self, request):
+        if not request.user.is_authenticated:
+            return Response({'uid': None, 'authenticated': False})
         return Response({
             'uid': str(request.user.id),
             'authenticated': True
         })
 
 
+class LazyAuthStatsView(views.APIView):
+    """
+    GET: Read requests lazy authentication served without a session or user.
+    """
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAdminOrDebug]
+
+    def get(self, request):
+        return Response(lazy_auth_stats.as_dict())
+
+
 # ============== Room Management ==============
 
 class RoomListCreateView(views.APIView):
@@ -135,6 +169,8 @@ class RoomListCreateView(views.APIView):
             phase='WAITING'
         )
 
+        user.touch()
+
         # Create host as first player
         Player.objects.create(
             user=user,
@@ -157,20 +193,58 @@ class RoomDetailView(views.APIView):
     """
     authentication_classes = [AnonymousSessionAuthentication]
 
+    def get(self, request, room_code):
+        # Live games held in memory are served from their in-memory state
+        state = room_store.get(room_code.upper())
+        if state is not None:
+            with state.lock:
+                data, hands = state.snapshot()
+            return Response(personalize_room_data(data, hands, request.user))
+
+        data, hands, _ = load_room_snapshot(room_code.upper())
+        if data is None:
+            return Response(
+                {'error': 'Room not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response(personalize_room_data(data, hands, request.user))
+
+
+class RoomDecksView(views.APIView):
+    """
+    GET: Full remaining deck contents (admin/debug only).
+    Room state sent to players only carries deck sizes.
+    """
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAdminOrDebug]
+
     def get(self, request, room_code):
         try:
-            room = Room.objects.prefetch_related(
-                'players', 'submissions'
-            ).get(room_code=room_code.upper())
+            room = Room.objects.get(room_code=room_code.upper())
         except Room.DoesNotExist:
             return Response(
                 {'error': 'Room not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        return Response(RoomDetailSerializer(room, context={
-            'user': request.user
-        }).data)
+        return Response(RoomDecksSerializer(room).data)
+
+
+class RoomAffinityView(views.APIView):
+    """
+    GET: Which worker owns this room (for load balancer routing).
+    Pure hash lookup, no database access.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, room_code):
+        return Response({
+            'roomCode': room_code.upper(),
+            'workerId': affinity.worker_for_room(room_code),
+            'local': affinity.is_local_room(room_code),
+        })
 
 
 class JoinRoomView(views.APIView):
@@ -204,6 +278,7 @@ class JoinRoomView(views.APIView):
             )
 
         user = request.user
+        user.touch()
 
         # Check if already in room
         existing_player = Player.objects.filter(user=user, room=room).first()
@@ -212,6 +287,7 @@ class JoinRoomView(views.APIView):
             existing_player.name = serializer.validated_data['player_name']
             existing_player.avatar = serializer.validated_data['avatar']
             existing_player.save()
+            room_store.discard(room.room_code)
             broadcast_room_update(room_code.upper())
             return Response({'message': 'Rejoined room'})
 
@@ -225,6 +301,9 @@ class JoinRoomView(views.APIView):
             is_online=True
         )
 
+        # A live state would not know about the new player; reload it from the rows
+        room_store.discard(room.room_code)
+
         # Broadcast update via WebSocket
         broadcast_room_update(room_code.upper())
 
@@ -246,6 +325,7 @@ class LeaveRoomView(views.APIView):
 
         player.is_online = False
         player.save()
+        room_store.set_player_online(room.room_code, request.user.id, False)
 
         broadcast_room_update(room_code.upper())
 
@@ -258,34 +338,12 @@ class StartGameView(views.APIView):
     """
     authentication_classes = [AnonymousSessionAuthentication]
 
+    @idempotent
     def post(self, request, room_code):
         try:
-            room = Room.objects.get(room_code=room_code.upper())
-        except Room.DoesNotExist:
-            return Response({'error': 'Room not found'}, status=404)
-
-        # Verify host
-        if room.host != request.user:
-            return Response({'error': 'Only host can start'}, status=403)
-
-        players = room.players.filter(is_online=True)
-        if players.count() < 3:
-            return Response(
-                {'error': 'Need at least 3 players'},
-                status=400
-            )
-
-        try:
-            # Initialize game using GameEngine
-            engine = GameEngine(room)
-            engine.start_game()
-        except ValueError as e:
-            return Response({'error': str(e)}, status=400)
-
-        # Broadcast update
-        broadcast_room_update(room_code.upper(), action='game_started')
-
-        return Response({'message': 'Game started'})
+            return Response(actions.start_game(room_code, request.user))
+        except actions.ActionError as e:
+            return Response({'error': e.message}, status=e.status)
 
 
 class UpdateRoomSettingsView(views.APIView):
@@ -299,34 +357,11 @@ class UpdateRoomSettingsView(views.APIView):
         serializer.is_valid(raise_exception=True)
 
         try:
-            room = Room.objects.get(room_code=room_code.upper())
-        except Room.DoesNotExist:
-            return Response({'error': 'Room not found'}, status=404)
-
-        # Verify host
-        if room.host != request.user:
-            return Response({'error': 'Only host can update settings'}, status=403)
-
-        if room.status != 'WAITING':
-            return Response({'error': 'Cannot change settings during game'}, status=400)
-
-        # Update settings
-        if 'pack_id' in serializer.validated_data:
-            pack = Pack.objects.filter(
-                id=serializer.validated_data['pack_id'],
-                enabled=True
-            ).first()
-            if pack:
-                room.pack = pack
-
-        if 'max_rounds' in serializer.validated_data:
-            room.max_rounds = serializer.validated_data['max_rounds']
-
-        room.save()
-
-        broadcast_room_update(room_code.upper())
-
-        return Response({'message': 'Settings updated'})
+            return Response(actions.update_settings(
+                room_code, request.user, **serializer.validated_data
+            ))
+        except actions.ActionError as e:
+            return Response({'error': e.message}, status=e.status)
 
 
 # ============== Game Actions ==============
@@ -337,26 +372,17 @@ class SubmitCardView(views.APIView):
     """
     authentication_classes = [AnonymousSessionAuthentication]
 
+    @idempotent
     def post(self, request, room_code):
         serializer = SubmitCardSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
         try:
-            room = Room.objects.get(room_code=room_code.upper())
-            player = Player.objects.get(user=request.user, room=room)
-        except (Room.DoesNotExist, Player.DoesNotExist):
-            return Response({'error': 'Not found'}, status=404)
-
-        try:
-            engine = GameEngine(room)
-            engine.submit_card(player, serializer.validated_data['card_text'])
-        except ValueError as e:
-            return Response({'error': str(e)}, status=400)
-
-        # Broadcast update
-        broadcast_room_update(room_code.upper())
-
-        return Response({'message': 'Card submitted'})
+            return Response(actions.submit_card(
+                room_code, request.user, serializer.validated_data['card_text']
+            ))
+        except actions.ActionError as e:
+            return Response({'error': e.message}, status=e.status)
 
 
 class PickWinnerView(views.APIView):
@@ -365,30 +391,17 @@ class PickWinnerView(views.APIView):
     """
     authentication_classes = [AnonymousSessionAuthentication]
 
+    @idempotent
     def post(self, request, room_code):
         serializer = PickWinnerSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
         try:
-            room = Room.objects.get(room_code=room_code.upper())
-            player = Player.objects.get(user=request.user, room=room)
-        except (Room.DoesNotExist, Player.DoesNotExist):
-            return Response({'error': 'Not found'}, status=404)
-
-        # Verify czar
-        if str(player.user.id) != str(room.czar_id):
-            return Response({'error': 'Only czar can pick'}, status=403)
-
-        try:
-            engine = GameEngine(room)
-            engine.pick_winner(serializer.validated_data['winner_id'])
-        except ValueError as e:
-            return Response({'error': str(e)}, status=400)
-
-        # Broadcast update
-        broadcast_room_update(room_code.upper(), action='winner_picked')
-
-        return Response({'message': 'Winner picked'})
+            return Response(actions.pick_winner(
+                room_code, request.user, serializer.validated_data['winner_id']
+            ))
+        except actions.ActionError as e:
+            return Response({'error': e.message}, status=e.status)
 
 
 class HandleTimeoutView(views.APIView):
@@ -403,7 +416,17 @@ class HandleTimeoutView(views.APIView):
         except Room.DoesNotExist:
             return Response({'error': 'Room not found'}, status=404)
 
-        engine = GameEngine(room)
+        engine = get_game_engine(room)
+
+        # The server-side round timer owns expiry; make sure it tracks this
+        # room instead of racing other clients for the room transaction
+        if round_timer.is_running:
+            round_timer.schedule(
+                room.room_code,
+                room.round_expires_at if room.status == 'PLAYING' else None
+            )
+            return Response({'message': 'Timeout scheduled'})
+
         engine.handle_timeout()
 
         broadcast_room_update(room_code.upper())
@@ -422,7 +445,10 @@ class PackViewSet(viewsets.ModelViewSet):
     permission_classes = [AllowAny]
 
     def get_queryset(self):
-        queryset = Pack.objects.all()
+        queryset = Pack.objects.annotate(
+            black_count=Count('cards', filter=Q(cards__card_type='black')),
+            white_count=Count('cards', filter=Q(cards__card_type='white')),
+        )
         enabled_only = self.request.query_params.get('enabled', None)
         if enabled_only == 'true':
             queryset = queryset.filter(enabled=True)
@@ -528,3 +554,39 @@ class ImportCardsView(views.APIView):
             count += 1
 
         return Response({'imported': count})
+
+
+class ProfileView(views.APIView):
+    """
+    GET: Sample this worker's thread stacks for ?seconds= (default 10)
+    every ?interval_ms= (default 10) and download them as collapsed
+    stacks for flamegraph.pl or speedscope. Needs PROFILER_ENABLED and a
+    staff user, even with DEBUG on.
+    """
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        if not getattr(settings, 'PROFILER_ENABLED', False):
+            return Response({'error': 'Profiler is disabled'}, status=404)
+
+        max_seconds = getattr(settings, 'PROFILER_MAX_SECONDS', 60)
+        try:
+            seconds = float(request.query_params.get('seconds', 10))
+            interval_ms = float(request.query_params.get('interval_ms', 10))
+        except ValueError:
+            return Response({'error': 'seconds and interval_ms must be numbers'}, status=400)
+        if not 0 < seconds <= max_seconds:
+            return Response({'error': f'seconds must be between 0 and {max_seconds}'}, status=400)
+        if not 1 <= interval_ms <= 1000:
+            return Response({'error': 'interval_ms must be between 1 and 1000'}, status=400)
+
+        try:
+            stacks = profiler.sample(seconds, interval_ms / 1000)
+        except profiler.ProfilerBusy:
+            return Response({'error': 'A profile is already running'}, status=409)
+
+        filename = f'profile-{socket.gethostname()}-{os.getpid()}-{timezone.now():%Y%m%d%H%M%S}.folded'
+        response = HttpResponse(profiler.render(stacks), content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response